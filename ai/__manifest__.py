@@ -12,6 +12,7 @@
         'security/ir.model.access.csv',
         'views/res_config_settings_views.xml',
         'views/ir_actions_server_views.xml',
+        'views/ai_metric_views.xml',
         'views/mail_scheduled_message_views.xml',
         'views/mail_template_views.xml',
         'views/templates.xml',
@@ -1,6 +1,7 @@
-from werkzeug.exceptions import NotFound
+from werkzeug.exceptions import Forbidden, NotFound
 
 from odoo import http
+from odoo.http import request
 from odoo.addons.mail.tools.discuss import add_guest_to_context
 from odoo.addons.mail.controllers.thread import ThreadController
 
@@ -25,6 +26,17 @@ class AIController(ThreadController):
         if channel and self._should_unlink_on_close(channel):
             channel.sudo().unlink()
 
+    # auth=bearer so the endpoint can be scraped with an API key of an administrator
+    @http.route('/ai/metrics', methods=["GET"], type="http", auth="bearer", readonly=True)
+    def ai_metrics(self):
+        if not request.env.user.has_group('base.group_system'):
+            raise Forbidden()
+        request.env['ai.metric']._flush_metrics()
+        return request.make_response(
+            request.env['ai.metric'].sudo()._get_prometheus_metrics(),
+            headers=[('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')],
+        )
+
     def _should_unlink_on_close(self, channel):
         return channel.is_member
 
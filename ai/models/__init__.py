@@ -3,6 +3,7 @@ from . import ai_topic
 from . import ai_agent
 from . import ai_agent_source
 from . import ai_embedding
+from . import ai_metric
 from . import ir_attachment
 from . import ir_http
 from . import mail_composer_mixin
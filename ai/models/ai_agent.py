@@ -23,6 +23,7 @@ from odoo.tools.mail import html_to_inner_content
 from odoo.tools.misc import mute_logger, submap
 
 from odoo.addons.ai.utils.ai_citation import apply_numeric_citations, get_attachment_ids_from_text
+from odoo.addons.ai.utils.ai_logging import record_cache_lookup, record_cache_miss
 from odoo.addons.ai.utils.llm_api_service import LLMApiService
 from odoo.addons.ai.utils.llm_providers import PROVIDERS, get_provider
 
@@ -349,6 +350,11 @@ class AIAgent(models.Model):
             if agent.sources_ids:
                 agent.sources_ids.unlink()
 
+    @api.ondelete(at_uninstall=False)
+    def _unlink_merge_metrics(self):
+        """Keep the usage metrics of the deleted agents, without agent."""
+        self.env['ai.metric'].sudo()._merge_agent_metrics(self.ids)
+
     @api.ondelete(at_uninstall=False)
     def _unlink_except_system_agent(self):
         """Prevent deletion of system agents."""
@@ -529,7 +535,7 @@ class AIAgent(models.Model):
         system_messages = self._build_system_context(extra_system_context=extra_system_context)
         if rag_context := self._build_rag_context(prompt):
             system_messages.extend(rag_context)
-        llm_response = LLMApiService(env=self.env, provider=self._get_provider()).request_llm(
+        llm_response = LLMApiService(env=self.with_context(ai_agent_id=self.id).env, provider=self._get_provider()).request_llm(
             self.llm_model,
             system_messages,
             [],
@@ -1172,6 +1178,17 @@ class AIAgent(models.Model):
         if model_name not in self.env:
             raise ValueError(f"Model '{model_name}' not found.")
 
+        record_cache_lookup()
+        return self._ai_get_fields_csv(model_name, bool(include_description), self._ai_tool_cache_key())
+
+    def _ai_tool_cache_key(self):
+        """Part of the cache key of the read-only tools that depends on the user
+        (the output of `fields_get` and of the views depends on the groups and the lang)."""
+        return (self.env.su, self.env.user.all_group_ids._ids, self.env.lang)
+
+    @ormcache('model_name', 'include_description', 'user_key')
+    def _ai_get_fields_csv(self, model_name, include_description, user_key):
+        record_cache_miss()
         model = self.env[model_name]
         model_fields = model.fields_get()
         results = []
@@ -1432,6 +1449,16 @@ class AIAgent(models.Model):
         if action_dict.get("res_model") != model:
             raise ValueError(f"The model '{model}' does not match the model of the action associated with menu ID {action_id}.")
 
+        record_cache_lookup()
+        return self._ai_compute_report_measures_csv(action.id, str(action.write_date), model, self._ai_tool_cache_key())
+
+    @ormcache('action_id', 'action_write_date', 'model', 'user_key', cache='templates')
+    def _ai_compute_report_measures_csv(self, action_id, action_write_date, model, user_key):
+        """Cached in `templates`, to be invalidated when the views change."""
+        record_cache_miss()
+        action = self.env["ir.actions.act_window"].browse(action_id)
+        action_dict = action._get_action_dict()
+
         # Get field definitions
         model_obj = self.env[model]
         fields = model_obj.fields_get()
@@ -1507,12 +1534,8 @@ class AIAgent(models.Model):
             context_str = str(action.context or {})
             domain_str = str(action.domain or [])
 
-            search_view = self.env[action.res_model].get_view(action.search_view_id.id, 'search')
-            search_view_xml = clean_search_view_xml(search_view['arch']) if search_view else ""
-
-            # Escape the XML for CSV - replace quotes and newlines
-            if search_view_xml:
-                search_view_xml = search_view_xml.replace('\n', ' ').replace('\r', '')
+            record_cache_lookup()
+            search_view_xml = self._ai_get_search_view_csv(action.res_model, action.search_view_id.id, self._ai_tool_cache_key())
 
             csv_result += (
                 f"{menu_id}|"
@@ -1524,6 +1547,21 @@ class AIAgent(models.Model):
 
         return csv_result.strip()
 
+    @ormcache('model_name', 'search_view_id', 'user_key', cache='templates')
+    def _ai_get_search_view_csv(self, model_name, search_view_id, user_key):
+        """Return the cleaned search view, escaped for CSV.
+
+        Cached in `templates`, to be invalidated when the views change.
+        """
+        record_cache_miss()
+        search_view = self.env[model_name].get_view(search_view_id, 'search')
+        search_view_xml = clean_search_view_xml(search_view['arch']) if search_view else ""
+
+        # Escape the XML for CSV - replace quotes and newlines
+        if search_view_xml:
+            search_view_xml = search_view_xml.replace('\n', ' ').replace('\r', '')
+        return search_view_xml
+
     def _ai_tool_search(self, model_name, domain="", fields: list[str] | None = None, offset: int = 0, limit: int | None = None, order: str | None = None):
         try:
             parsed_domain = json.loads(domain)
@@ -7,7 +7,7 @@ from requests.exceptions import RequestException
 from odoo.tools import SQL
 from odoo.exceptions import UserError
 
-from odoo.addons.ai.orm.field_vector import Vector
+from odoo.addons.ai.orm.field_vector import Vector, encode_vector
 from odoo.addons.ai.utils.llm_api_service import LLMApiService
 from odoo.addons.ai.utils.llm_providers import (
     EMBEDDING_MODELS_SELECTION,
@@ -43,28 +43,77 @@ class AIEmbedding(models.Model):
 
     @api.model
     def _get_similar_chunks(self, query_embedding, sources, embedding_model, top_n=5):
+        """Return the `top_n` chunks of the given sources closest to the query.
+
+        With the system parameter `ai.embedding_search_mode` set to `binary_rerank`
+        (pgvector >= 0.7), the candidates are first selected on the binary
+        quantization of the vectors (hamming distance, `ai.embedding_rerank_factor`
+        times more candidates than needed), then re-ranked with the exact
+        cosine distance. It trades a bit of recall for a much cheaper scan.
+        """
         active_sources = sources.filtered(lambda s: s.is_active)
         if not active_sources:
             return self
 
         attachment_ids = active_sources.mapped('attachment_id').ids
         target_checksums = self.env['ir.attachment'].browse(attachment_ids).mapped('checksum')
+        query_vector = SQL("%s::%s", encode_vector(query_embedding), SQL(self._fields['embedding_vector'].column_type[1]))
+        candidates = SQL(
+            '''
+                SELECT ai_embedding.id, ai_embedding.embedding_vector
+                FROM ai_embedding
+                INNER JOIN ir_attachment ON ir_attachment.id = ai_embedding.attachment_id
+                WHERE ir_attachment.checksum = ANY(%s) AND ai_embedding.embedding_model = %s
+            ''',
+            target_checksums, embedding_model,
+        )
+        ICP = self.env['ir.config_parameter'].sudo()
+        if ICP.get_param('ai.embedding_search_mode') == 'binary_rerank':
+            size = self._get_dimensions()
+            candidates = SQL(
+                '''
+                    %s
+                    ORDER BY binary_quantize(ai_embedding.embedding_vector)::bit(%s) <~> binary_quantize(%s)
+                    LIMIT %s
+                ''',
+                candidates, size, query_vector, top_n * int(ICP.get_param('ai.embedding_rerank_factor', '10')),
+            )
         # Execute the SQL query to find similar embeddings of the same sources' attachments checksum
         return self.browse(id_ for id_, *_ in self.env.execute_query(SQL(
                 '''
                     SELECT
-                        ai_embedding.id,
-                        1 - (embedding_vector <=> %s::vector) AS similarity
-                    FROM ai_embedding
-                    INNER JOIN ir_attachment ON ir_attachment.id = ai_embedding.attachment_id
-                    WHERE ir_attachment.checksum = ANY(%s) AND ai_embedding.embedding_model = %s
+                        candidate.id,
+                        1 - (candidate.embedding_vector <=> %s) AS similarity
+                    FROM (%s) AS candidate
                     ORDER BY similarity DESC
                     LIMIT %s;
                 ''',
-                query_embedding, target_checksums, embedding_model, top_n)
+                query_vector, candidates, top_n)
             )
         )
 
+    def _write_embedding_vectors(self, vectors):
+        """Write many vectors with a single query.
+
+        The ORM would issue one UPDATE per record as the values all differ.
+
+        :param vectors: dict `{embedding_id: vector}`
+        """
+        if not vectors:
+            return
+        self.flush_model(['embedding_vector'])
+        column_type = self._fields['embedding_vector'].column_type[1]
+        self.env.cr.execute(SQL(
+            '''
+                UPDATE ai_embedding
+                   SET embedding_vector = v.vector::%s
+                  FROM unnest(%s::int[], %s::text[]) AS v(id, vector)
+                 WHERE ai_embedding.id = v.id
+            ''',
+            SQL(column_type), list(vectors), [encode_vector(vector) for vector in vectors.values()],
+        ))
+        self.browse(vectors).invalidate_recordset(['embedding_vector'])
+
     @api.model
     def _cron_generate_embedding(self, batch_size=100):
         """
@@ -123,15 +172,17 @@ class AIEmbedding(models.Model):
                         model=model,
                     )
                     # Update each embedding record with its corresponding vector
+                    vectors = {}
                     for idx, embedding in enumerate(batch):
                         try:
-                            embedding.embedding_vector = response['data'][idx]['embedding']
+                            vectors[embedding.id] = response['data'][idx]['embedding']
                         except KeyError as e:
                             _logger.error(
                                 "Failed to extract embedding for record %s: %s",
                                 embedding.id, str(e)
                             )
                             failed_embeddings |= embedding
+                    self._write_embedding_vectors(vectors)
 
                     # Commit progress for this batch
                     if not self.env['ir.cron']._commit_progress(len(batch)):
@@ -0,0 +1,291 @@
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+import json
+import logging
+from collections import defaultdict
+from datetime import datetime, timedelta
+from itertools import zip_longest
+
+from odoo import api, fields, models
+from odoo.tools import SQL
+
+from odoo.addons.ai.utils.ai_logging import DURATION_BUCKETS, ai_metrics
+
+_logger = logging.getLogger(__name__)
+
+# date of the rows summing the hours removed after the retention period
+TOTALS_DATE = datetime(1970, 1, 1)
+
+
+class AIMetric(models.Model):
+    _name = 'ai.metric'
+    _description = "AI Usage Metric"
+    _order = 'date desc, id desc'
+    _log_access = False
+
+    date = fields.Datetime("Hour", required=True, readonly=True, index=True)
+    kind = fields.Selection(
+        selection=[('api', "LLM Request"), ('tool', "Tool Call")],
+        string="Type",
+        required=True,
+        readonly=True,
+    )
+    llm_model = fields.Char("LLM Model", readonly=True)
+    agent_id = fields.Many2one('ai.agent', string="Agent", ondelete='set null', readonly=True)
+    tool_name = fields.Char("Tool", readonly=True)
+    count = fields.Integer("Calls", readonly=True)
+    error_count = fields.Integer("Errors", readonly=True)
+    tokens_in = fields.Integer("Input Tokens", readonly=True)
+    tokens_out = fields.Integer("Output Tokens", readonly=True)
+    duration_total = fields.Float("Total Duration (s)", readonly=True)
+    duration_max = fields.Float("Max Duration (s)", aggregator='max', readonly=True)
+    duration_p95 = fields.Float(
+        "P95 Duration (s)", aggregator='max', compute='_compute_duration_p95', store=True, readonly=True,
+        help="Upper bound of the histogram bucket containing the 95th percentile of the hour.")
+    duration_buckets = fields.Json("Duration Histogram", readonly=True)
+    is_total = fields.Boolean(
+        "Removed Hours Total", readonly=True,
+        help="Sum of the hours removed after the retention period, kept so that the exported totals never decrease.")
+
+    _metric_key_unique = models.UniqueIndex(
+        "(date, kind, COALESCE(llm_model, ''), COALESCE(agent_id, 0), COALESCE(tool_name, ''))")
+
+    @api.model
+    def _flush_metrics_if_due(self):
+        """Move the metrics recorded by the current process to the database,
+        if the flush interval is elapsed."""
+        interval = int(self.env['ir.config_parameter'].sudo().get_param('ai.metrics_flush_interval', '60'))
+        if ai_metrics.flush_due(interval):
+            self._flush_metrics()
+
+    @api.model
+    def _flush_metrics(self):
+        """Move the metrics recorded by the current process to the database.
+
+        A separate cursor is used, so the metrics are kept even if the
+        current transaction is rolled back, and the current transaction is
+        not slowed down by locks on the metrics table.
+        """
+        values = ai_metrics.pop()
+        if not values:
+            return
+        try:
+            with self.env.registry.cursor() as cr:
+                self.env(cr=cr, su=True)['ai.metric']._store_metrics(values)
+        except Exception:  # noqa: BLE001
+            _logger.warning("AI: failed to flush the metrics, will retry later", exc_info=True)
+            ai_metrics.restore(values)
+
+    @api.model
+    def _store_metrics(self, values):
+        """Add the given values to the rows of the current hour.
+
+        :param values: dict `{(kind, llm_model, agent_id, tool_name): values}`,
+            as returned by `AIMetrics.pop`
+        """
+        hour = fields.Datetime.now().replace(minute=0, second=0, microsecond=0)
+        existing_agent_ids = set(self.env['ai.agent'].with_context(active_test=False).browse(
+            {agent_id for (__, __, agent_id, __) in values if agent_id}).exists().ids)
+        self._add_metrics(hour, [
+            ((kind, llm_model, agent_id if agent_id in existing_agent_ids else False, tool_name), new)
+            for (kind, llm_model, agent_id, tool_name), new in values.items()
+        ])
+
+    @api.model
+    def _add_metrics(self, date, values, is_total=False):
+        """Add the given values to the rows of the given hour (or to the totals),
+        creating the missing ones, in a single query: concurrent flushes are
+        added up on the same rows instead of creating duplicates.
+
+        :param values: list of `((kind, llm_model, agent_id, tool_name), values)`,
+            the values of the same keys being summed
+        """
+        merged = {}
+        for (kind, llm_model, agent_id, tool_name), new in values:
+            key = (kind, llm_model or None, agent_id or None, tool_name or None)
+            if current := merged.get(key):
+                new = self._merge_metric_values(current, new)
+            merged[key] = new
+        if not merged:
+            return
+        metric_ids = [metric_id for [metric_id] in self.env.execute_query(SQL(
+            """
+            INSERT INTO %(table)s AS metric (date, is_total, kind, llm_model, agent_id, tool_name, count, error_count,
+                                             tokens_in, tokens_out, duration_total, duration_max, duration_buckets)
+                 VALUES %(rows)s
+            ON CONFLICT (date, kind, COALESCE(llm_model, ''), COALESCE(agent_id, 0), COALESCE(tool_name, '')) DO UPDATE
+                    SET count = metric.count + EXCLUDED.count,
+                        error_count = metric.error_count + EXCLUDED.error_count,
+                        tokens_in = metric.tokens_in + EXCLUDED.tokens_in,
+                        tokens_out = metric.tokens_out + EXCLUDED.tokens_out,
+                        duration_total = metric.duration_total + EXCLUDED.duration_total,
+                        duration_max = GREATEST(metric.duration_max, EXCLUDED.duration_max),
+                        duration_buckets = (
+                            SELECT jsonb_agg(COALESCE(stored.value::int, 0) + COALESCE(added.value::int, 0)
+                                             ORDER BY COALESCE(stored.idx, added.idx))
+                              FROM jsonb_array_elements_text(metric.duration_buckets) WITH ORDINALITY AS stored(value, idx)
+                         FULL JOIN jsonb_array_elements_text(EXCLUDED.duration_buckets) WITH ORDINALITY AS added(value, idx)
+                                ON added.idx = stored.idx
+                        )
+              RETURNING metric.id
+            """,
+            table=SQL.identifier(self._table),
+            rows=SQL(", ").join(
+                SQL(
+                    "(%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s::jsonb)",
+                    date, is_total, kind, llm_model, agent_id, tool_name, new["count"], new["error_count"],
+                    new["tokens_in"], new["tokens_out"], new["duration_total"], new["duration_max"],
+                    json.dumps(new["duration_buckets"]),
+                )
+                for (kind, llm_model, agent_id, tool_name), new in merged.items()
+            ),
+        ))]
+        # the percentile is computed from the merged histograms
+        metrics = self.browse(metric_ids)
+        metrics.invalidate_recordset()
+        metrics.modified(['duration_buckets'])
+        metrics.flush_recordset(['duration_p95'])
+
+    @api.model
+    def _merge_metric_values(self, values, other):
+        return {
+            "count": values["count"] + other["count"],
+            "error_count": values["error_count"] + other["error_count"],
+            "tokens_in": values["tokens_in"] + other["tokens_in"],
+            "tokens_out": values["tokens_out"] + other["tokens_out"],
+            "duration_total": values["duration_total"] + other["duration_total"],
+            "duration_max": max(values["duration_max"], other["duration_max"]),
+            "duration_buckets": [
+                a + b for a, b in zip_longest(values["duration_buckets"] or [], other["duration_buckets"] or [], fillvalue=0)
+            ],
+        }
+
+    def _get_metric_values(self):
+        """Return the values of the metrics summed per hour (or totals) and key:
+        `{(date, is_total): {(kind, llm_model, agent_id, tool_name): values}}`."""
+        values = defaultdict(dict)
+        for metric in self:
+            date_values = values[metric.date, metric.is_total]
+            key = (metric.kind, metric.llm_model or "", metric.agent_id.id, metric.tool_name or "")
+            new = {
+                "count": metric.count,
+                "error_count": metric.error_count,
+                "tokens_in": metric.tokens_in,
+                "tokens_out": metric.tokens_out,
+                "duration_total": metric.duration_total,
+                "duration_max": metric.duration_max,
+                "duration_buckets": metric.duration_buckets or [],
+            }
+            date_values[key] = self._merge_metric_values(date_values[key], new) if key in date_values else new
+        return values
+
+    @api.model
+    def _merge_agent_metrics(self, agent_ids):
+        """Move the metrics of the given agents, about to be deleted, to the
+        rows without agent, so that the totals exported keep growing."""
+        metrics = self.search([('agent_id', 'in', agent_ids)])
+        for (date, is_total), values in metrics._get_metric_values().items():
+            self._add_metrics(date, [
+                ((kind, llm_model, False, tool_name), new)
+                for (kind, llm_model, __, tool_name), new in values.items()
+            ], is_total=is_total)
+        metrics.unlink()
+
+    @api.depends('duration_buckets')
+    def _compute_duration_p95(self):
+        for metric in self:
+            metric.duration_p95 = self._get_percentile(metric.duration_buckets or [], 0.95)
+
+    @api.model
+    def _get_percentile(self, buckets, percentile):
+        """Return the upper bound of the bucket containing the given percentile."""
+        total = sum(buckets)
+        if not total:
+            return 0.0
+        cumulative = 0
+        for bound, count in zip(DURATION_BUCKETS, buckets):
+            cumulative += count
+            if cumulative >= percentile * total:
+                # The last bucket has no upper bound, use the last finite one
+                return bound if bound != float("inf") else DURATION_BUCKETS[-2]
+        return DURATION_BUCKETS[-2]
+
+    @api.model
+    def _cron_flush_metrics(self):
+        """Flush the metrics of the cron worker and remove the old rows."""
+        self._flush_metrics()
+        retention_days = int(self.env['ir.config_parameter'].sudo().get_param('ai.metrics_retention_days', '90'))
+        old_metrics = self.search([
+            ('date', '<', fields.Datetime.now() - timedelta(days=retention_days)),
+            ('is_total', '=', False),
+        ])
+        # the exported counters must never decrease: the removed hours are
+        # added to the totals first
+        for values in old_metrics._get_metric_values().values():
+            self._add_metrics(TOTALS_DATE, values.items(), is_total=True)
+        old_metrics.unlink()
+
+    @api.model
+    def _get_prometheus_metrics(self):
+        """Return all the stored metrics in the Prometheus text exposition format."""
+        self.env.cr.execute(SQL(
+            """
+            SELECT m.kind, COALESCE(m.llm_model, ''), m.agent_id, COALESCE(p.name, ''), COALESCE(m.tool_name, ''),
+                   SUM(m.count), SUM(m.error_count), SUM(m.tokens_in), SUM(m.tokens_out), SUM(m.duration_total),
+                   ARRAY(
+                       SELECT SUM(bucket.value::int)
+                         FROM %(table)s sub,
+                              jsonb_array_elements_text(sub.duration_buckets) WITH ORDINALITY AS bucket(value, idx)
+                        WHERE sub.kind = m.kind
+                          AND sub.llm_model IS NOT DISTINCT FROM m.llm_model
+                          AND sub.agent_id IS NOT DISTINCT FROM m.agent_id
+                          AND sub.tool_name IS NOT DISTINCT FROM m.tool_name
+                     GROUP BY bucket.idx
+                     ORDER BY bucket.idx
+                   )
+              FROM %(table)s m
+         LEFT JOIN ai_agent a ON a.id = m.agent_id
+         LEFT JOIN res_partner p ON p.id = a.partner_id
+          GROUP BY m.kind, m.llm_model, m.agent_id, m.tool_name, p.name
+            """,
+            table=SQL.identifier(self._table),
+        ))
+        samples = defaultdict(list)
+        for kind, llm_model, agent_id, agent, tool_name, count, errors, tokens_in, tokens_out, duration, buckets in self.env.cr.fetchall():
+            # agents may have the same name, the id keeps their series apart
+            labels = {'model': llm_model, 'agent': agent, 'agent_id': agent_id or ''}
+            if kind == 'tool':
+                labels['tool'] = tool_name
+            prefix = 'odoo_ai_llm_request' if kind == 'api' else 'odoo_ai_tool_call'
+            samples[f'{prefix}_errors_total'].append((labels, errors))
+            if kind == 'api':
+                samples['odoo_ai_llm_tokens_total'].append((labels | {'direction': 'in'}, tokens_in))
+                samples['odoo_ai_llm_tokens_total'].append((labels | {'direction': 'out'}, tokens_out))
+            cumulative = 0
+            for bound, bucket_count in zip(DURATION_BUCKETS, buckets or []):
+                cumulative += bucket_count
+                le = '+Inf' if bound == float('inf') else str(bound)
+                samples[f'{prefix}_duration_seconds_bucket'].append((labels | {'le': le}, cumulative))
+            samples[f'{prefix}_duration_seconds_sum'].append((labels, duration))
+            samples[f'{prefix}_duration_seconds_count'].append((labels, count))
+
+        metric_types = {
+            'odoo_ai_llm_request_duration_seconds': 'histogram',
+            'odoo_ai_tool_call_duration_seconds': 'histogram',
+            'odoo_ai_llm_request_errors_total': 'counter',
+            'odoo_ai_tool_call_errors_total': 'counter',
+            'odoo_ai_llm_tokens_total': 'counter',
+        }
+        lines = []
+        for name, metric_type in metric_types.items():
+            lines.append(f'# TYPE {name} {metric_type}')
+            names = [f'{name}_bucket', f'{name}_sum', f'{name}_count'] if metric_type == 'histogram' else [name]
+            for sample_name in names:
+                for labels, value in samples[sample_name]:
+                    lines.append(f'{sample_name}{{{self._format_prometheus_labels(labels)}}} {value}')
+        return '\n'.join(lines) + '\n'
+
+    @api.model
+    def _format_prometheus_labels(self, labels):
+        def escape(value):
+            return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        return ','.join(f'{key}="{escape(value)}"' for key, value in labels.items())
@@ -261,6 +261,23 @@ class Model(models.AbstractModel):
 
         return json.dumps(snapshot, default=_ai_context_json_default, ensure_ascii=False, indent=2), list(files_dict.values())
 
+    def _ai_prefetch_context(self, field_paths):
+        """Fill the cache with the values `_get_ai_context` will read for the
+        given field paths, for the whole recordset at once instead of
+        record by record.
+        """
+        for path in field_paths:
+            records = self
+            for fname in path.split("."):
+                field = records._fields.get(fname)
+                if not field or not records:
+                    break
+                if field.store:
+                    records.fetch([fname])
+                if field.type not in ('many2many', 'many2one', 'one2many'):
+                    break
+                records = records.mapped(fname)
+
     def _ai_format_records(self):
         """Format what will be in the prompt when we inserted records.
 
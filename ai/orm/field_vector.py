@@ -1,34 +1,84 @@
 # Part of Odoo. See LICENSE file for full copyright and licensing details.
 import json
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 from odoo import fields
 
+VECTOR_COLUMN_TYPES = {
+    'single': 'vector',
+    'half': 'halfvec',  # requires pgvector >= 0.7
+}
+
 
-def pg_vector(size):
+def pg_vector(size, precision='single'):
     if not isinstance(size, int):
         raise TypeError(f"vector size should be an int, got {size!r}")
+    column_type = VECTOR_COLUMN_TYPES[precision]
     if size > 0:
-        return "vector(%d)" % size
-    return "vector"
+        return "%s(%d)" % (column_type, size)
+    return column_type
+
+
+def encode_vector(value):
+    """Return the text representation of the vector expected by pgvector.
+
+    Floats are written with the shortest representation that round-trips in
+    single precision (the precision of the column), which is about half the
+    size of the `repr` of the python floats.
+    """
+    if isinstance(value, str):
+        return value
+    if numpy is not None:
+        return "[" + ",".join(numpy.asarray(value, dtype=numpy.float32).astype(str)) + "]"
+    return "[" + ",".join(format(float(v), ".9g") for v in value) + "]"
+
+
+def decode_vector(value):
+    """Return the list of floats of the given pgvector text representation."""
+    if numpy is not None:
+        return numpy.array(value[1:-1].split(","), dtype=numpy.float64).tolist() if len(value) > 2 else []
+    return json.loads(value)
 
 
 class Vector(fields.Field):
+    """Embedding vector, stored with the pgvector extension.
+
+    The value is kept in the cache in its (compact) text representation and
+    only decoded into a list of floats when it is read on a record.
+
+    :param int size: the number of dimensions of the vector
+    :param str precision: `single` (default) to store 4-bytes floats (`vector`),
+        or `half` to store 2-bytes floats (`halfvec`, pgvector >= 0.7), which
+        halves the size of the table and of its indexes
+    """
     type = 'vector'
     size = None
+    precision = 'single'
 
     def _setup_attrs__(self, model_class, name: str) -> None:  # noqa: PLW3201
         super()._setup_attrs__(model_class, name)
         assert self.size is None or isinstance(self.size, int), \
             "Vector field %s with non-integer size %r" % (self, self.size)
+        assert self.precision in VECTOR_COLUMN_TYPES, \
+            "Vector field %s with invalid precision %r" % (self, self.precision)
 
     @property
     def _column_type(self):
-        return ('vector', pg_vector(self.size))
+        return (VECTOR_COLUMN_TYPES[self.precision], pg_vector(self.size, self.precision))
+
+    def convert_to_column(self, value, record, values=None, validate=True):
+        if value is None or value is False:
+            return None
+        return encode_vector(value)
 
     def convert_to_cache(self, value, record, validate=True):
         if value is None or value is False:
             return None
-        return str(value)
+        return encode_vector(value)
 
     def convert_to_record(self, value, record):
-        return False if value is None else json.loads(value)
+        return False if value is None else decode_vector(value)
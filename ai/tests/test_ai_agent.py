@@ -2,6 +2,7 @@
 from unittest.mock import patch
 
 from odoo import Command
+from odoo.addons.ai.utils.ai_logging import ai_response_logging, get_ai_logging_session
 from odoo.tests import TransactionCase, tagged
 
 
@@ -149,3 +150,19 @@ class TestAIAgent(TransactionCase):
         self.assertNotIn("[SOURCE", llm_response[0])
         self.assertIn("href=\"%s/web/content/%s\"" % (agent.get_base_url(), attachment.id), llm_response[0])
         self.assertIn("[1]", llm_response[0])
+
+    def test_read_only_tools_cache(self):
+        """Test that the outputs of the read-only tools are cached and that hits are counted."""
+        agent = self.env["ai.agent"].create({"name": "Test AI Agent"})
+        self.env.registry.clear_cache()
+
+        with ai_response_logging("gpt-4.1"):
+            session = get_ai_logging_session()
+            first = agent._ai_tool_get_fields("res.partner")
+            second = agent._ai_tool_get_fields("res.partner")
+            self.assertEqual(first, second)
+            self.assertEqual(session["cache_lookups"], 2)
+            self.assertEqual(session["cache_misses"], 1)
+
+            agent._ai_tool_get_fields("res.partner", include_description=False)
+            self.assertEqual(session["cache_misses"], 2)
@@ -1,8 +1,15 @@
 # Part of Odoo. See LICENSE file for full copyright and licensing details.
 
+import logging
+import random
+import time
 from unittest.mock import patch
 
+from odoo.addons.ai.orm.field_vector import encode_vector
 from odoo.tests import TransactionCase, tagged
+from odoo.tools import SQL, split_every
+
+_logger = logging.getLogger(__name__)
 
 
 @tagged("post_install", "-at_install")
@@ -49,3 +56,89 @@ class TestAIEmbeddingBatching(TransactionCase):
         for batch in batches:
             token_count = sum(self.env["ai.embedding"]._estimate_tokens(emb.content) for emb in batch)
             self.assertLessEqual(token_count, 6)
+
+    def test_write_embedding_vectors(self):
+        """Ensure vectors written in bulk are read back with the single precision values."""
+        embeddings = [self._create_embedding("content") for _ in range(2)]
+        vector = [0.25] * 1535 + [0.1]
+        self.env["ai.embedding"]._write_embedding_vectors({
+            embeddings[0].id: vector,
+            embeddings[1].id: [0.5] * 1536,
+        })
+        self.assertEqual(embeddings[0].embedding_vector[:1535], [0.25] * 1535)
+        self.assertAlmostEqual(embeddings[0].embedding_vector[1535], 0.1, places=6)
+        self.assertEqual(embeddings[1].embedding_vector, [0.5] * 1536)
+
+
+@tagged("post_install", "-at_install", "-standard", "ai_benchmark")
+class TestAIEmbeddingStorageBenchmark(TransactionCase):
+    """Compare the storage size, the bulk write time and the recall of the
+    vector storage modes. Not run by default, use `--test-tags ai_benchmark`.
+    """
+    NUM_VECTORS = 2000
+    DIMENSIONS = 1536
+    TOP_N = 10
+
+    def setUp(self):
+        super().setUp()
+        self.env.cr.execute("SELECT extversion FROM pg_extension WHERE extname = 'vector'")
+        version = self.env.cr.fetchone()
+        if not version or tuple(int(v) for v in version[0].split(".")[:2]) < (0, 7):
+            self.skipTest("pgvector >= 0.7 is required for halfvec and binary_quantize")
+        rng = random.Random(42)
+        self.vectors = [[rng.gauss(0, 1) for __ in range(self.DIMENSIONS)] for __ in range(self.NUM_VECTORS)]
+        self.queries = [[rng.gauss(0, 1) for __ in range(self.DIMENSIONS)] for __ in range(20)]
+
+    def _fill_table(self, table, column_type):
+        self.env.cr.execute(SQL(
+            "CREATE TEMPORARY TABLE %s (id serial PRIMARY KEY, embedding_vector %s)",
+            SQL.identifier(table), SQL(column_type),
+        ))
+        start = time.perf_counter()
+        for batch in split_every(500, self.vectors):
+            self.env.cr.execute(SQL(
+                "INSERT INTO %s (embedding_vector) SELECT v::%s FROM unnest(%s::text[]) AS v",
+                SQL.identifier(table), SQL(column_type), [encode_vector(vector) for vector in batch],
+            ))
+        write_time = time.perf_counter() - start
+        self.env.cr.execute(SQL("SELECT pg_total_relation_size(%s)", table))
+        return write_time, self.env.cr.fetchone()[0]
+
+    def _search(self, table, column_type, query, binary_rerank=False):
+        query_vector = SQL("%s::%s", encode_vector(query), SQL(column_type))
+        candidates = SQL("SELECT id, embedding_vector FROM %s", SQL.identifier(table))
+        if binary_rerank:
+            candidates = SQL(
+                "%s ORDER BY binary_quantize(embedding_vector)::bit(%s) <~> binary_quantize(%s) LIMIT %s",
+                candidates, self.DIMENSIONS, query_vector, self.TOP_N * 10,
+            )
+        self.env.cr.execute(SQL(
+            "SELECT id FROM (%s) AS candidate ORDER BY embedding_vector <=> %s LIMIT %s",
+            candidates, query_vector, self.TOP_N,
+        ))
+        return {row[0] for row in self.env.cr.fetchall()}
+
+    def test_storage_modes(self):
+        results = {}
+        for table, column_type in (
+            ("bench_vector", f"vector({self.DIMENSIONS})"),
+            ("bench_halfvec", f"halfvec({self.DIMENSIONS})"),
+        ):
+            write_time, size = self._fill_table(table, column_type)
+            exact = [self._search("bench_vector" if table == "bench_halfvec" else table, f"vector({self.DIMENSIONS})", q) for q in self.queries]
+            for binary_rerank in (False, True):
+                start = time.perf_counter()
+                found = [self._search(table, column_type, q, binary_rerank) for q in self.queries]
+                search_time = (time.perf_counter() - start) / len(self.queries)
+                recall = sum(len(f & e) for f, e in zip(found, exact)) / (self.TOP_N * len(self.queries))
+                results[(column_type, binary_rerank)] = (write_time, size, search_time, recall)
+                _logger.info(
+                    "%s%s: write %.2fs, size %.1f MB, search %.1f ms, recall@%s %.3f",
+                    column_type, " + binary re-rank" if binary_rerank else "",
+                    write_time, size / 1024 / 1024, search_time * 1000, self.TOP_N, recall,
+                )
+
+        vector_size = results[(f"vector({self.DIMENSIONS})", False)][1]
+        halfvec_size = results[(f"halfvec({self.DIMENSIONS})", False)][1]
+        self.assertLess(halfvec_size, vector_size * 0.6, "Half precision should halve the storage")
+        self.assertGreater(results[(f"halfvec({self.DIMENSIONS})", False)][3], 0.9)
@@ -5,7 +5,9 @@ from unittest.mock import patch
 
 from odoo.tests import TransactionCase, tagged
 from odoo.addons.ai.models.ir_actions_server import _logger as tool_logger
-from odoo.addons.ai.utils.ai_logging import _logger as ai_logger
+from odoo.addons.ai.utils.ai_logging import (
+    _logger as ai_logger, ai_metrics, ai_response_logging, get_ai_logging_session, record_tool_call,
+)
 from odoo.addons.ai.utils.llm_api_service import LLMApiService, _logger as service_logger
 from odoo.addons.ai.utils.llm_providers import get_provider
 
@@ -132,7 +134,7 @@ class TestAILoggingIntegration(TransactionCase):
             '[AI API Call #%d - →] Received single tool call (%.2fs, %d tokens)',
             '[AI API Call #%d] Sending request with %d tokens',
             '[AI API Call #%d] Completed (%.2fs, %d tokens)',
-            '[AI Summary] Total: %.2fs | API calls: %d (%.2fs) | Tools: %d (%.2fs) | Tokens: %d (in: %d, out: %d) | Batches: %d',
+            '[AI Summary] Total: %.2fs | API calls: %d (%.2fs) | Tools: %d (%.2fs) | Tokens: %d (in: %d, out: %d) | Batches: %d | Cache hits: %d/%d',
         ])
 
     def test_parallel_tool_calls(self):
@@ -180,7 +182,7 @@ class TestAILoggingIntegration(TransactionCase):
             '[AI API Call #%d - ⚡] Received Batch #%d, %d tool calls (%.2fs, %d tokens)',
             '[AI API Call #%d] Sending request with %d tokens',
             '[AI API Call #%d] Completed (%.2fs, %d tokens)',
-            '[AI Summary] Total: %.2fs | API calls: %d (%.2fs) | Tools: %d (%.2fs) | Tokens: %d (in: %d, out: %d) | Batches: %d',
+            '[AI Summary] Total: %.2fs | API calls: %d (%.2fs) | Tools: %d (%.2fs) | Tokens: %d (in: %d, out: %d) | Batches: %d | Cache hits: %d/%d',
         ])
         self.assertEqual([r.msg for r in mock_tool_logger.records if r.levelname == 'DEBUG'], [
             "[AI Tool - Batch #%d ⚡] '%s' with args (%s)",
@@ -249,7 +251,7 @@ class TestAILoggingIntegration(TransactionCase):
             '[AI API Call #%d - →] Received single tool call (%.2fs, %d tokens)',
             '[AI API Call #%d] Sending request with %d tokens',
             '[AI API Call #%d] Completed (%.2fs, %d tokens)',
-            '[AI Summary] Total: %.2fs | API calls: %d (%.2fs) | Tools: %d (%.2fs) | Tokens: %d (in: %d, out: %d) | Batches: %d',
+            '[AI Summary] Total: %.2fs | API calls: %d (%.2fs) | Tools: %d (%.2fs) | Tokens: %d (in: %d, out: %d) | Batches: %d | Cache hits: %d/%d',
         ])
         self.assertEqual([r.msg for r in mock_tool_logger.records if r.levelname == 'DEBUG'], [
             "[AI Tool - Batch #%d ⚡] '%s' with args (%s)",
@@ -262,3 +264,90 @@ class TestAILoggingIntegration(TransactionCase):
         self.assertEqual([r.msg for r in mock_service_logger.records if r.levelname == 'DEBUG'], [
             '[AI Tool Summary] Batch #%d completed, %d tool calls',
         ])
+
+    def test_metrics_export(self):
+        """Test that the calls are aggregated in the metrics and exported for Prometheus."""
+        ai_metrics.pop()
+        with ai_response_logging("gpt-4.1"):
+            record_tool_call("my_tool", 0.3)
+            record_tool_call("my_tool", 12, error=True)
+
+        self.env["ai.metric"]._store_metrics(ai_metrics.pop())
+        metric = self.env["ai.metric"].search([("kind", "=", "tool"), ("tool_name", "=", "my_tool")])
+        self.assertEqual(metric.count, 2)
+        self.assertEqual(metric.error_count, 1)
+        self.assertEqual(metric.duration_p95, 30)
+        self.assertEqual(metric.duration_max, 12)
+
+        prometheus_metrics = self.env["ai.metric"]._get_prometheus_metrics()
+        labels = 'model="gpt-4.1",agent="",agent_id="",tool="my_tool"'
+        self.assertIn(f'odoo_ai_tool_call_duration_seconds_bucket{{{labels},le="0.25"}} 0\n', prometheus_metrics)
+        self.assertIn(f'odoo_ai_tool_call_duration_seconds_bucket{{{labels},le="0.5"}} 1\n', prometheus_metrics)
+        self.assertIn(f'odoo_ai_tool_call_duration_seconds_bucket{{{labels},le="+Inf"}} 2\n', prometheus_metrics)
+        self.assertIn(f'odoo_ai_tool_call_duration_seconds_count{{{labels}}} 2\n', prometheus_metrics)
+        self.assertIn(f'odoo_ai_tool_call_errors_total{{{labels}}} 1\n', prometheus_metrics)
+
+    def test_metrics_totals(self):
+        """Test that the exported totals never decrease, when old hours are
+        removed or when an agent is deleted."""
+        ai_metrics.pop()
+        agent = self.env["ai.agent"].create({"name": "Metrics Agent"})
+        with ai_response_logging("gpt-4.1", agent_id=agent.id):
+            record_tool_call("my_tool", 0.3)
+        self.env["ai.metric"]._store_metrics(ai_metrics.pop())
+        with ai_response_logging("gpt-4.1"):
+            record_tool_call("my_tool", 12)
+        values = ai_metrics.pop()
+        # flushes of several processes add up on the same row
+        self.env["ai.metric"]._store_metrics(values)
+        self.env["ai.metric"]._store_metrics(values)
+        metrics = self.env["ai.metric"].search([("tool_name", "=", "my_tool")])
+        self.assertEqual(len(metrics), 2)
+        metric = metrics.filtered(lambda metric: not metric.agent_id)
+        self.assertEqual(metric.count, 2)
+        self.assertEqual(metric.duration_p95, 30)
+
+        # all the hours are older than the retention period
+        self.env["ir.config_parameter"].sudo().set_param("ai.metrics_retention_days", "-1")
+        self.env["ai.metric"]._cron_flush_metrics()
+        self.env["ai.metric"]._cron_flush_metrics()
+        totals = self.env["ai.metric"].search([("tool_name", "=", "my_tool")])
+        self.assertTrue(all(totals.mapped("is_total")))
+        self.assertEqual(sum(totals.mapped("count")), 3)
+
+        agent.unlink()
+        totals = self.env["ai.metric"].search([("tool_name", "=", "my_tool")])
+        self.assertEqual(len(totals), 1)
+        self.assertEqual(totals.count, 3)
+        self.assertEqual(totals.duration_buckets[3], 1)
+        self.assertIn(
+            'odoo_ai_tool_call_duration_seconds_count{model="gpt-4.1",agent="",agent_id="",tool="my_tool"} 3\n',
+            self.env["ai.metric"]._get_prometheus_metrics())
+
+    def test_metrics_agents_same_name(self):
+        """Test that agents with the same name are exported as distinct series."""
+        ai_metrics.pop()
+        agents = self.env["ai.agent"].create([{"name": "Twin"}, {"name": "Twin"}])
+        for agent in agents:
+            with ai_response_logging("gpt-4.1", agent_id=agent.id):
+                record_tool_call("my_tool", 0.3)
+        self.env["ai.metric"]._store_metrics(ai_metrics.pop())
+        prometheus_metrics = self.env["ai.metric"]._get_prometheus_metrics()
+        for agent in agents:
+            self.assertIn(
+                f'odoo_ai_tool_call_duration_seconds_count{{model="gpt-4.1",agent="Twin",agent_id="{agent.id}",tool="my_tool"}} 1\n',
+                prometheus_metrics)
+
+    def test_batch_failed_request_logging(self):
+        """Test that the calls of the failed requests of a batch are logged."""
+        def _request_llm(*args, **kwargs):
+            get_ai_logging_session()["api_calls"] += 1
+            raise ValueError("Rate limited")
+
+        llm_services = LLMApiService(self.env, get_provider(self.env, "gpt-4o"))
+        with patch.object(LLMApiService, '_request_llm', side_effect=_request_llm), \
+            patch.object(LLMApiService, '_get_api_token', return_value='dummy_token'), \
+            self.assertLogs(ai_logger, 'DEBUG') as logs:
+            results = llm_services.request_llm_batch("gpt-4o", [], [{"user_prompts": ["Hello"]}])
+        self.assertIsInstance(results[0][1], ValueError)
+        self.assertTrue(any("API calls: 1 " in line for line in logs.output))
@@ -2,7 +2,7 @@ import json
 from unittest.mock import patch
 
 from odoo.addons.ai.utils.llm_api_service import LLMApiService
-from odoo.exceptions import AccessError
+from odoo.exceptions import AccessError, UserError
 from odoo.tests import TransactionCase, new_test_user, tagged
 from odoo.tools import mute_logger
 from odoo.addons.ai.models.ir_actions_server import _logger as tool_logger
@@ -287,6 +287,103 @@ class TestAiServerActions(TransactionCase):
             'Should log the error on the partner',
         )
 
+    @mute_logger("odoo.addons.ai.utils.llm_api_service")
+    def test_ai_server_action_batch(self):
+        """Check that running an AI action on many records uses the batch mode."""
+        partners = self.env["res.partner"].create([{"name": f"Partner {i}"} for i in range(3)])
+        ir_action_tool = self.env["ir.actions.server"].create({
+            "model_id": self.env["ir.model"]._get_id("res.partner"),
+            "state": "code",
+            "name": "Write Name",
+            "use_in_ai": True,
+            "code": "record.write({'name': record.name + ' (done)'})",
+        })
+        action = self.env["ir.actions.server"].create({
+            "model_id": self.env["ir.model"]._get_id("res.partner"),
+            "state": "ai",
+            "name": "Test",
+            "ai_tool_ids": ir_action_tool.ids,
+            "ai_action_prompt": "Main Prompt",
+        })
+        llm_calls = []
+
+        def _mocked_request_llm(
+            service, llm_model, system_prompts, user_prompts, tools=None,
+            files=None, schema=None, temperature=0.2, inputs=(), web_grounding=False,
+        ):
+            # Executed in the worker threads, must not use the cursor
+            llm_calls.append(user_prompts)
+            if not inputs:
+                return self._ai_tool_call(f"action_{ir_action_tool.id}", "call_1", {})
+            return ["Done"], [], []
+
+        with (
+            patch.object(LLMApiService, "_request_llm", _mocked_request_llm),
+            patch.object(LLMApiService, "_get_api_token", return_value="dummy"),
+            patch.object(self.env.registry["ir.actions.server"], "_ai_action_run", side_effect=AssertionError),
+        ):
+            action.with_context(active_model=partners._name, active_ids=partners.ids).run()
+
+        self.assertEqual(len(llm_calls), 6, "Two calls per record")
+        self.assertEqual(partners.mapped("name"), ["Partner 0 (done)", "Partner 1 (done)", "Partner 2 (done)"])
+        for partner in partners:
+            self.assertIn("Write Name", "".join(partner.message_ids.mapped("body")))
+
+    @mute_logger("odoo.addons.ai.utils.llm_api_service", "odoo.addons.ai.models.ir_actions_server")
+    def test_ai_server_action_batch_failure(self):
+        """Check that the batch mode raises when the LLM requests of some records failed."""
+        partners = self.env["res.partner"].create([{"name": f"Partner {i}"} for i in range(3)])
+        action = self.env["ir.actions.server"].create({
+            "model_id": self.env["ir.model"]._get_id("res.partner"),
+            "state": "ai",
+            "name": "Test",
+            "ai_action_prompt": "Main Prompt",
+        })
+
+        def _mocked_request_llm(service, llm_model, system_prompts, user_prompts, **kwargs):
+            if f"'id': {partners[1].id}}}" in user_prompts[0]:
+                raise ValueError("Rate limited")
+            return ["Done"], [], []
+
+        with (
+            patch.object(LLMApiService, "_request_llm", _mocked_request_llm),
+            patch.object(LLMApiService, "_get_api_token", return_value="dummy"),
+            self.assertRaises(UserError) as error,
+        ):
+            action._ai_action_run_batch(partners)
+        self.assertIn("Partner 1: Rate limited", str(error.exception))
+        self.assertNotIn("Partner 0", str(error.exception))
+
+    def test_ai_tools_compiled_cache(self):
+        """Check that the tool declarations are compiled once and invalidated on write."""
+        ir_action_tool = self.env["ir.actions.server"].create({
+            "model_id": self.env["ir.model"]._get_id("res.partner"),
+            "state": "code",
+            "name": "Write Name",
+            "use_in_ai": True,
+            "code": "record.write({'name': value})",
+            "ai_tool_schema": json.dumps({
+                "type": "object",
+                "properties": {"value": {"type": "string"}},
+                "required": [],
+            }),
+        })
+        tool_name = f"action_{ir_action_tool.id}"
+
+        tools = ir_action_tool.with_context(force_allow_end_message=True)._get_ai_tools()
+        declaration = tools[tool_name].compiled["declarations"]["openai"]
+        self.assertEqual(declaration["parameters"]["properties"]["value"]["type"], ["string", "null"])
+        self.assertEqual(declaration["parameters"]["required"], ["__end_message", "value"])
+        self.assertNotIn("__end_message", ir_action_tool._get_ai_tools()[tool_name].schema["properties"])
+
+        same_tools = ir_action_tool.with_context(force_allow_end_message=True)._get_ai_tools()
+        self.assertIs(same_tools[tool_name].compiled, tools[tool_name].compiled)
+
+        ir_action_tool.ai_tool_description = "New description"
+        tools = ir_action_tool._get_ai_tools()
+        self.assertEqual(tools[tool_name].description, "New description")
+        self.assertEqual(tools[tool_name].compiled["declarations"]["google"]["description"], "New description")
+
     def _ai_tool_call(self, name, call_id, arguments):
         # Simulate the response of `_request_llm` when the LLM ask to execute a tool
         return ["Done"], [(name, call_id, arguments)], [{"call_id": call_id, "name": name, "arguments": json.dumps(arguments)}]
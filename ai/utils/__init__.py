@@ -3,5 +3,6 @@ from . import ai_citation
 from . import ai_logging
 from . import llm_api_service
 from . import llm_providers
+from . import llm_tools
 from . import html_extractor
 from . import tools_schema
@@ -6,9 +6,76 @@ import threading
 import time
 from contextlib import contextmanager
 
+from .llm_tools import AITool
+
 _logger = logging.getLogger(__name__)
 _logging_sessions = threading.local()
 
+# Upper bounds (in seconds) of the buckets of the duration histograms
+DURATION_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, float("inf"))
+
+
+class AIMetrics:
+    """Counters and duration histograms of the LLM and tool calls, aggregated
+    in the memory of the current process, per `(kind, llm_model, agent_id, tool_name)`.
+
+    Recording only updates a few integers under a lock, the values are
+    periodically moved to the database by `ai.metric._flush_metrics`.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._values = {}
+        self.last_flush = time.monotonic()
+
+    def record(self, kind, llm_model, agent_id, tool_name, duration, tokens_in=0, tokens_out=0, error=False):
+        key = (kind, llm_model or "", agent_id or False, tool_name or "")
+        bucket = next(i for i, bound in enumerate(DURATION_BUCKETS) if duration <= bound)
+        with self._lock:
+            values = self._values.get(key)
+            if values is None:
+                values = self._values[key] = {
+                    "count": 0,
+                    "error_count": 0,
+                    "tokens_in": 0,
+                    "tokens_out": 0,
+                    "duration_total": 0.0,
+                    "duration_max": 0.0,
+                    "duration_buckets": [0] * len(DURATION_BUCKETS),
+                }
+            values["count"] += 1
+            values["error_count"] += bool(error)
+            values["tokens_in"] += tokens_in
+            values["tokens_out"] += tokens_out
+            values["duration_total"] += duration
+            values["duration_max"] = max(values["duration_max"], duration)
+            values["duration_buckets"][bucket] += 1
+
+    def pop(self):
+        """Return and reset the values recorded since the last call."""
+        with self._lock:
+            values, self._values = self._values, {}
+            self.last_flush = time.monotonic()
+        return values
+
+    def restore(self, values):
+        """Merge back values that could not be flushed."""
+        with self._lock:
+            for key, restored in values.items():
+                current = self._values.setdefault(key, restored)
+                if current is restored:
+                    continue
+                for fname in ("count", "error_count", "tokens_in", "tokens_out", "duration_total"):
+                    current[fname] += restored[fname]
+                current["duration_max"] = max(current["duration_max"], restored["duration_max"])
+                current["duration_buckets"] = [a + b for a, b in zip(current["duration_buckets"], restored["duration_buckets"])]
+
+    def flush_due(self, interval):
+        return bool(self._values) and time.monotonic() - self.last_flush >= interval
+
+
+ai_metrics = AIMetrics()
+
 
 def estimate_tokens(content) -> int:
     """Estimate token count using OpenAI's heuristic of 1 token ~= 4 characters.
@@ -37,17 +104,11 @@ def get_ai_logging_session():
         return None
 
 
-@contextmanager
-def ai_response_logging(llm_model: str):
-    """Context manager for logging AI responses.
-
-    Tracks API calls, tool executions, token usage, and timing information
-    for a single AI response generation session.
-
-    :param llm_model: Name of the LLM model being used
-    """
-    session = {
+def new_logging_session(llm_model: str, agent_id: int | None = None):
+    """Return a new, empty, logging session."""
+    return {
         "llm_model": llm_model,
+        "agent_id": agent_id,
         "start_time": time.perf_counter(),
         "api_calls": 0,
         "tool_calls": 0,
@@ -57,8 +118,29 @@ def ai_response_logging(llm_model: str):
         "tool_time": 0.0,
         "batch_count": 0,
         "current_batch_id": None,
+        "cache_lookups": 0,
+        "cache_misses": 0,
     }
 
+
+def merge_logging_session(session, other):
+    """Add the counters of `other` (e.g. the session of a worker thread) to `session`."""
+    for key in ("api_calls", "tool_calls", "tokens_in", "tokens_out", "api_time", "tool_time", "cache_lookups", "cache_misses"):
+        session[key] += other[key]
+
+
+@contextmanager
+def ai_response_logging(llm_model: str, agent_id: int | None = None):
+    """Context manager for logging AI responses.
+
+    Tracks API calls, tool executions, token usage, and timing information
+    for a single AI response generation session.
+
+    :param llm_model: Name of the LLM model being used
+    :param agent_id: The agent generating the response, if any (used as metrics label)
+    """
+    session = new_logging_session(llm_model, agent_id)
+
     _logger.debug("[AI Response] Starting generation for model '%s'", llm_model)
     _logging_sessions.ai_logging_session = session
 
@@ -69,7 +151,7 @@ def ai_response_logging(llm_model: str):
             duration = time.perf_counter() - session["start_time"]
             _logger.debug(
                 "[AI Summary] Total: %.2fs | API calls: %d (%.2fs) | Tools: %d (%.2fs) | "
-                "Tokens: %d (in: %d, out: %d) | Batches: %d",
+                "Tokens: %d (in: %d, out: %d) | Batches: %d | Cache hits: %d/%d",
                 duration,
                 session["api_calls"],
                 session["api_time"],
@@ -79,10 +161,35 @@ def ai_response_logging(llm_model: str):
                 session["tokens_in"],
                 session["tokens_out"],
                 session["batch_count"],
+                session["cache_lookups"] - session["cache_misses"],
+                session["cache_lookups"],
             )
         _logging_sessions.ai_logging_session = None
 
 
+def record_tool_call(tool_name, duration, error=False):
+    """Record the execution of a tool in the current session and in the metrics."""
+    if session := get_ai_logging_session():
+        session["tool_time"] += duration
+        ai_metrics.record("tool", session["llm_model"], session["agent_id"], tool_name, duration, error=error)
+
+
+def record_cache_lookup():
+    """Count a lookup in the cache of a read-only tool in the current session."""
+    if session := get_ai_logging_session():
+        session["cache_lookups"] += 1
+
+
+def record_cache_miss():
+    """Count a miss of the cache of a read-only tool in the current session.
+
+    Must be called from the cached function itself, so it is only executed
+    when the value is not in the cache.
+    """
+    if session := get_ai_logging_session():
+        session["cache_misses"] += 1
+
+
 @contextmanager
 def api_call_logging(messages, tools=None):
     """Context manager for logging API calls with automatic timing and response tracking.
@@ -105,15 +212,20 @@ def api_call_logging(messages, tools=None):
 
     if tools:
         tool_data = {}
-        for name, (desc, __, __, schema) in tools.items():
-            tool_data[name] = {"description": desc, "schema": schema}
-        tokens_in += estimate_tokens(tool_data)
+        for name, tool in tools.items():
+            if isinstance(tool, AITool):
+                # Already serialized when the tool was compiled
+                tokens_in += estimate_tokens(tool.compiled["serialized"])
+            else:
+                tool_data[name] = {"description": tool[0], "schema": tool[3]}
+        if tool_data:
+            tokens_in += estimate_tokens(tool_data)
 
     session["tokens_in"] += tokens_in
     _logger.debug("[AI API Call #%d] Sending request with %d tokens", call_id, tokens_in)
 
     start_time = time.perf_counter()
-    response_data = {"tool_calls": [], "tokens_out": 0}
+    response_data = {"tool_calls": [], "tokens_out": 0, "done": False}
 
     def record_response(tool_calls, response):
         """Record the API response data.
@@ -123,6 +235,7 @@ def api_call_logging(messages, tools=None):
         """
         response_data["tool_calls"] = tool_calls or []
         response_data["tokens_out"] = estimate_tokens(response) + estimate_tokens(tool_calls)
+        response_data["done"] = True
 
     try:
         yield record_response
@@ -130,6 +243,10 @@ def api_call_logging(messages, tools=None):
         duration = time.perf_counter() - start_time
         session["api_time"] += duration
         session["tokens_out"] += response_data["tokens_out"]
+        ai_metrics.record(
+            "api", session["llm_model"], session["agent_id"], None, duration,
+            tokens_in=tokens_in, tokens_out=response_data["tokens_out"], error=not response_data["done"],
+        )
 
         if response_data["tool_calls"]:
             num_tools = len(response_data["tool_calls"])
@@ -6,13 +6,22 @@ import requests
 import typing
 from logging import getLogger
 import time
+from concurrent.futures import ThreadPoolExecutor
 from typing import Callable, Any
 
 from odoo import _
 from odoo.api import Environment
 from odoo.exceptions import UserError
 
-from .ai_logging import ai_response_logging, api_call_logging, get_ai_logging_session
+from .ai_logging import (
+    _logging_sessions,
+    ai_response_logging,
+    api_call_logging,
+    get_ai_logging_session,
+    merge_logging_session,
+    new_logging_session,
+)
+from .llm_tools import AITool, add_end_message_parameter, to_openai_parameters
 
 _logger = getLogger(__name__)
 
@@ -96,6 +105,7 @@ class LLMApiService:
 
         self.base_url = base_url
         self.env = env
+        self._api_token = None
 
     def get_embedding(
         self,
@@ -206,6 +216,11 @@ class LLMApiService:
         }
 
     def _get_api_token(self):
+        # Memoized so that concurrent requests (see `request_llm_batch`) never
+        # have to touch the cursor from a worker thread
+        if self._api_token:
+            return self._api_token
+
         provider_config = {
             "openai": {
                 "config_key": "ai.openai_key",
@@ -221,6 +236,7 @@ class LLMApiService:
             raise UserError(_("Unsupported provider '%s'", self.provider))
 
         if api_key := self.env["ir.config_parameter"].sudo().get_param(config["config_key"]) or os.getenv(config["env_var"]):
+            self._api_token = api_key
             return api_key
 
         raise UserError(_("No API key set for provider '%s'", self.provider))
@@ -333,13 +349,7 @@ class LLMApiService:
             }
 
         if tools:
-            body["tools"] = self._to_open_ai_tool_schema([{
-                "description": tool_description,
-                "parameters": tool_parameter_schema,
-                "type": "function",
-                "name": tool_name,
-                "strict": True,
-            } for tool_name, (tool_description, __, __, tool_parameter_schema) in tools.items()])
+            body["tools"] = [self._get_tool_declaration(tool_name, tool) for tool_name, tool in tools.items()]
             body["parallel_tool_calls"] = True
 
         if web_grounding:
@@ -456,11 +466,7 @@ class LLMApiService:
 
         if tools:
             body["tools"] = {
-                "functionDeclarations": [{
-                    "description": tool_description,
-                    "parameters": tool_parameter_schema,
-                    "name": tool_name,
-                } for tool_name, (tool_description, __, __, tool_parameter_schema) in tools.items()]
+                "functionDeclarations": [self._get_tool_declaration(tool_name, tool) for tool_name, tool in tools.items()]
             }
         if web_grounding:
             body["tools"] = {'google_search': {}}
@@ -538,18 +544,21 @@ class LLMApiService:
         >>> }
         > https://json-schema.org/
         """
-        with ai_response_logging(llm_model):
-            return self._request_llm_silent(
-                llm_model=llm_model,
-                system_prompts=system_prompts,
-                user_prompts=user_prompts,
-                tools=tools,
-                files=files,
-                schema=schema,
-                temperature=temperature,
-                inputs=inputs,
-                web_grounding=web_grounding,
-            )
+        try:
+            with ai_response_logging(llm_model, self.env.context.get('ai_agent_id')):
+                return self._request_llm_silent(
+                    llm_model=llm_model,
+                    system_prompts=system_prompts,
+                    user_prompts=user_prompts,
+                    tools=tools,
+                    files=files,
+                    schema=schema,
+                    temperature=temperature,
+                    inputs=inputs,
+                    web_grounding=web_grounding,
+                )
+        finally:
+            self.env['ai.metric']._flush_metrics_if_due()
 
     def _request_llm_silent(
         self, llm_model: str, system_prompts: list[str], user_prompts: list[str],
@@ -564,25 +573,8 @@ class LLMApiService:
         AI_MAX_TOOL_CALLS_PER_CALL = int(self.env["ir.config_parameter"].sudo()
             .get_param("ai.max_tool_calls_per_call", "20"))
 
-        if tools:
-            tools = copy.deepcopy(tools)
-            for __, allow_end_message, __, tool_parameter_schema in tools.values():
-                if allow_end_message and "__end_message" not in tool_parameter_schema["properties"]:
-                    tool_parameter_schema["properties"]["__end_message"] = {
-                        "type": "string",
-                        "description": "If you are not waiting a result and you are done, write here your last message (it must follow the instructions). If you will do an action after this one, leave it empty.",
-                    }
-                if "__end_message" in tool_parameter_schema["properties"] and "__end_message" not in tool_parameter_schema["required"]:
-                    tool_parameter_schema["required"].append("__end_message")
-
-        inputs = inputs or []
-
-        if self.provider == 'google':
-            # OpenAI / Odoo inputs -> Gemini
-            inputs = [
-                {"role": "user" if i["role"] == "user" else "model", "parts": [{"text": i["content"]}]}
-                for i in inputs
-            ]
+        tools = self._prepare_tools(tools)
+        inputs = self._prepare_inputs(inputs)
 
         all_responses = []
         for api_call in range(AI_MAX_SUCCESSIVE_CALLS):
@@ -602,40 +594,8 @@ class LLMApiService:
             if not next_actions:
                 break
 
-            done = False
-            session = get_ai_logging_session()
-
-            if session:
-                session["tool_calls"] += min(len(next_actions), AI_MAX_TOOL_CALLS_PER_CALL)
-
-            for i, (tool_name, call_id, arguments) in enumerate(next_actions):
-                if i >= AI_MAX_TOOL_CALLS_PER_CALL:
-                    _logger.warning("AI: Tool call limit reached, stopping further tool calls")
-                    inputs.append(self._build_tool_call_response(call_id, "Error: This tool call isn't processed because of tool call limit, try again"))
-                    continue
-
-                if tool_name not in tools:
-                    _logger.error("AI: Try to call a forbidden action %s", tool_name)
-                    inputs.append(self._build_tool_call_response(call_id, f"Error: unknown tool '{tool_name}'. Try again with the correct tool name."))
-                    continue
-
-                has_end_message = "__end_message" in arguments
-                end_message = arguments.pop("__end_message", None)
-                result, error = tools[tool_name][2](arguments=arguments)
-
-                inputs.append(self._build_tool_call_response(call_id, result))
-
-                if has_end_message and error is None:
-                    done = True
-                    if end_response := end_message and end_message.strip():
-                        all_responses.append(end_response)
-                        _logger.info("AI: action terminate early: %s", end_response)
-                    else:
-                        _logger.info("AI: action terminate early with empty message")
-
-            if session and len(next_actions) > 1:  # Batch of tool calls
-                _logger.debug("[AI Tool Summary] Batch #%d completed, %d tool calls", session["current_batch_id"], len(next_actions))
-
+            end_responses, done = self._execute_tool_calls(tools, next_actions, inputs, AI_MAX_TOOL_CALLS_PER_CALL)
+            all_responses.extend(end_responses)
             if done:
                 break
 
@@ -649,6 +609,195 @@ class LLMApiService:
 
         return all_responses
 
+    def request_llm_batch(
+        self, llm_model: str, system_prompts: list[str], requests: list[dict],
+        schema: dict | None = None, temperature: float = 0.2, max_workers: int = 4,
+    ) -> list[tuple[list[str], Exception | None]]:
+        """Same as `request_llm`, but for many independent conversations at once.
+
+        The conversations progress round by round: the HTTP requests of a round
+        are sent concurrently through a thread pool of at most `max_workers`
+        threads, then the tools requested by the LLM are executed sequentially
+        in the current thread (they use the cursor, which is not thread-safe).
+
+        >>> requests = [
+        >>>     {'user_prompts': ['...'], 'tools': {...}, 'files': [...]},
+        >>>     ...
+        >>> ]
+
+        :param requests: list of dicts with the keys `user_prompts`, and optionally
+            `tools`, `files` and `inputs` (same format as `request_llm`)
+        :param max_workers: maximum number of concurrent HTTP requests
+        :return: a list of `(responses, error)`, in the same order as `requests`
+        """
+        AI_MAX_SUCCESSIVE_CALLS = int(self.env["ir.config_parameter"].sudo()
+            .get_param("ai.max_successive_calls", "20"))
+
+        AI_MAX_TOOL_CALLS_PER_CALL = int(self.env["ir.config_parameter"].sudo()
+            .get_param("ai.max_tool_calls_per_call", "20"))
+
+        # Resolve the token in the current thread, the workers will reuse it
+        self._get_api_token()
+
+        conversations = [{
+            "user_prompts": request["user_prompts"],
+            "files": request.get("files"),
+            "tools": self._prepare_tools(request.get("tools")),
+            "inputs": self._prepare_inputs(request.get("inputs")),
+            "responses": [],
+            "error": None,
+            "done": False,
+        } for request in requests]
+
+        agent_id = self.env.context.get('ai_agent_id')
+
+        def _request_conversation(conversation):
+            # Each worker logs in its own session, merged afterwards in the current thread
+            worker_session = _logging_sessions.ai_logging_session = new_logging_session(llm_model, agent_id)
+            conversation["logging_session"] = worker_session
+            try:
+                return self._request_llm(
+                    llm_model,
+                    system_prompts,
+                    conversation["user_prompts"],
+                    files=conversation["files"],
+                    inputs=conversation["inputs"],
+                    schema=schema,
+                    tools=conversation["tools"],
+                    temperature=temperature,
+                )
+            finally:
+                _logging_sessions.ai_logging_session = None
+
+        with ai_response_logging(llm_model, agent_id), ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+            session = get_ai_logging_session()
+            for api_call in range(AI_MAX_SUCCESSIVE_CALLS):
+                active = [conversation for conversation in conversations if not conversation["done"]]
+                if not active:
+                    break
+
+                futures = [executor.submit(_request_conversation, conversation) for conversation in active]
+                for conversation, future in zip(active, futures):
+                    try:
+                        responses, next_actions, conversation["inputs"] = future.result()
+                    except Exception as e:  # noqa: BLE001
+                        conversation["error"] = e
+                        conversation["done"] = True
+                        continue
+                    finally:
+                        # the calls of the failed requests are logged as well
+                        merge_logging_session(session, conversation.pop("logging_session"))
+
+                    conversation["responses"].extend(responses)
+                    if not next_actions:
+                        conversation["done"] = True
+                        continue
+
+                    end_responses, done = self._execute_tool_calls(
+                        conversation["tools"], next_actions, conversation["inputs"], AI_MAX_TOOL_CALLS_PER_CALL)
+                    conversation["responses"].extend(end_responses)
+                    conversation["done"] = done
+
+        _logger.info("AI: batch of %s conversations, API rounds %s", len(conversations), api_call + 1)
+        self.env['ai.metric']._flush_metrics_if_due()
+
+        for conversation in conversations:
+            if not conversation["error"] and not conversation["responses"]:
+                conversation["error"] = ValueError("Processing loop ended with no response.")
+        return [(conversation["responses"], conversation["error"]) for conversation in conversations]
+
+    def _prepare_tools(self, tools):
+        """Return the tools where the `__end_message` parameter is injected if needed.
+
+        Compiled tools (see `AITool`) already contain it and are returned as is,
+        the other ones are copied before being modified.
+        """
+        if not tools:
+            return tools
+
+        return {
+            tool_name: tool if isinstance(tool, AITool) else (
+                tool[0], tool[1], tool[2],
+                add_end_message_parameter(copy.deepcopy(tool[3]), tool[1]),
+            )
+            for tool_name, tool in tools.items()
+        }
+
+    def _get_tool_declaration(self, tool_name, tool):
+        """Return the declaration of the tool in the format of the provider."""
+        if isinstance(tool, AITool):
+            return tool.compiled["declarations"][self.provider]
+
+        tool_description, __, __, tool_parameter_schema = tool
+        if self.provider == "openai":
+            return self._to_open_ai_tool_schema([{
+                "description": tool_description,
+                "parameters": tool_parameter_schema,
+                "type": "function",
+                "name": tool_name,
+                "strict": True,
+            }])[0]
+        return {
+            "description": tool_description,
+            "parameters": tool_parameter_schema,
+            "name": tool_name,
+        }
+
+    def _prepare_inputs(self, inputs):
+        """Convert the OpenAI / Odoo inputs to the provider format."""
+        inputs = inputs or []
+        if self.provider == 'google':
+            # OpenAI / Odoo inputs -> Gemini
+            inputs = [
+                {"role": "user" if i["role"] == "user" else "model", "parts": [{"text": i["content"]}]}
+                for i in inputs
+            ]
+        return inputs
+
+    def _execute_tool_calls(self, tools, next_actions, inputs, max_tool_calls):
+        """Execute the tools requested by the LLM and append their results to `inputs`.
+
+        :return: a tuple `(end_responses, done)` where `end_responses` are the
+            `__end_message` given by the LLM, and `done` is True if the
+            processing loop must be terminated
+        """
+        end_responses = []
+        done = False
+        session = get_ai_logging_session()
+
+        if session:
+            session["tool_calls"] += min(len(next_actions), max_tool_calls)
+
+        for i, (tool_name, call_id, arguments) in enumerate(next_actions):
+            if i >= max_tool_calls:
+                _logger.warning("AI: Tool call limit reached, stopping further tool calls")
+                inputs.append(self._build_tool_call_response(call_id, "Error: This tool call isn't processed because of tool call limit, try again"))
+                continue
+
+            if tool_name not in tools:
+                _logger.error("AI: Try to call a forbidden action %s", tool_name)
+                inputs.append(self._build_tool_call_response(call_id, f"Error: unknown tool '{tool_name}'. Try again with the correct tool name."))
+                continue
+
+            has_end_message = "__end_message" in arguments
+            end_message = arguments.pop("__end_message", None)
+            result, error = tools[tool_name][2](arguments=arguments)
+
+            inputs.append(self._build_tool_call_response(call_id, result))
+
+            if has_end_message and error is None:
+                done = True
+                if end_response := end_message and end_message.strip():
+                    end_responses.append(end_response)
+                    _logger.info("AI: action terminate early: %s", end_response)
+                else:
+                    _logger.info("AI: action terminate early with empty message")
+
+        if session and len(next_actions) > 1:  # Batch of tool calls
+            _logger.debug("[AI Tool Summary] Batch #%d completed, %d tool calls", session["current_batch_id"], len(next_actions))
+
+        return end_responses, done
+
     def _to_open_ai_tool_schema(self, schema):
         """Convert the tool schema if needed.
 
@@ -661,12 +810,7 @@ class LLMApiService:
             return schema
 
         for tool in schema:
-            required = tool["parameters"]["required"]
-            non_required = set(tool["parameters"]["properties"]) - set(required)
-            for name in non_required:
-                tool["parameters"]["properties"][name]["type"] = [tool["parameters"]["properties"][name]["type"], "null"]
-            tool["parameters"]["required"].extend(non_required)
-            tool["parameters"]["additionalProperties"] = False
+            to_openai_parameters(tool["parameters"])
         return schema
 
     def _build_tool_call_response(self, tool_call_id, return_value):
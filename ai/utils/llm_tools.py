@@ -0,0 +1,79 @@
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+import copy
+import json
+import typing
+from typing import Any, Callable
+
+END_MESSAGE_PARAMETER = {
+    "type": "string",
+    "description": "If you are not waiting a result and you are done, write here your last message (it must follow the instructions). If you will do an action after this one, leave it empty.",
+}
+
+
+class AITool(typing.NamedTuple):
+    """A tool given to `LLMApiService.request_llm`.
+
+    Behaves like the `(description, allow_end_message, function, schema)`
+    tuple, but also holds the provider-ready declarations of the tool, built
+    once by `compile_tool` and shared between requests (they must never be
+    mutated).
+    """
+    description: str
+    allow_end_message: bool
+    function: Callable[[dict[str, Any]], Any]
+    schema: dict
+    compiled: dict
+
+
+def add_end_message_parameter(schema, allow_end_message):
+    """Add the `__end_message` parameter to the given schema (in place) if needed."""
+    if allow_end_message and "__end_message" not in schema["properties"]:
+        schema["properties"]["__end_message"] = dict(END_MESSAGE_PARAMETER)
+    if "__end_message" in schema["properties"] and "__end_message" not in schema["required"]:
+        schema["required"].append("__end_message")
+    return schema
+
+
+def to_openai_parameters(schema):
+    """Convert the parameters schema (in place) to the format of the OpenAI `responses` endpoint.
+
+    It needs all parameters to be in the "required" list, but it accepts
+    `"type": ["string", "null"]`, so we convert the base JSON schema to the
+    array version if needed.
+    """
+    required = schema["required"]
+    non_required = set(schema["properties"]) - set(required)
+    for name in non_required:
+        schema["properties"][name]["type"] = [schema["properties"][name]["type"], "null"]
+    required.extend(non_required)
+    schema["additionalProperties"] = False
+    return schema
+
+
+def compile_tool(name, description, allow_end_message, schema):
+    """Pre-compute everything needed to send a tool to the LLM providers.
+
+    :return: a dict with the final `schema` (including `__end_message`),
+        the provider-ready `declarations` and their `serialized` JSON
+        (used to estimate the tokens)
+    """
+    schema = add_end_message_parameter(copy.deepcopy(schema), allow_end_message)
+    declarations = {
+        "openai": {
+            "description": description,
+            "parameters": to_openai_parameters(copy.deepcopy(schema)),
+            "type": "function",
+            "name": name,
+            "strict": True,
+        },
+        "google": {
+            "description": description,
+            "parameters": schema,
+            "name": name,
+        },
+    }
+    return {
+        "schema": schema,
+        "declarations": declarations,
+        "serialized": json.dumps({"description": description, "schema": schema}, separators=(",", ":")),
+    }
@@ -98,14 +98,13 @@ class AIAgentSource(models.Model):
             return super()._fetch_content(source)
 
         extractor = HTMLExtractor()
-        parent_article = source.article_id
-        article_descendants = parent_article._get_descendants()
-        all_articles = article_descendants | parent_article
-        content = ""
-        for article in all_articles:
-            result = extractor.extract_from_html(article.body)
-            if result and result['content']:
-                content += result['content'] + '\n'
-            else:
-                return {"content": None, "error": result.get('error', _("Failed to extract content from the articles."))}
-        return {"content": content, "error": None}
+        content = []
+        # walk the tree by batches, without keeping all the bodies in the cache
+        for articles in source.article_id._iter_subtree_batches(['body']):
+            for article in articles:
+                result = extractor.extract_from_html(article.body)
+                if result and result['content']:
+                    content.append(result['content'] + '\n')
+                else:
+                    return {"content": None, "error": result.get('error', _("Failed to extract content from the articles."))}
+        return {"content": ''.join(content), "error": None}
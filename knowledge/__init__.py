@@ -27,6 +27,9 @@ def _uninstall_knowledge(env):
     env.cr.execute("""
         DROP TEXT SEARCH CONFIGURATION IF EXISTS knowledge_config CASCADE;
     """)
+    env.cr.execute("""
+        DROP FUNCTION IF EXISTS knowledge_article_update_search_vector CASCADE;
+    """)
     env.cr.execute("""
         DROP TEXT SEARCH DICTIONARY IF EXISTS knowledge_dictionary;
     """)
@@ -1,12 +1,18 @@
 # -*- coding: utf-8 -*-
 # Part of Odoo. See LICENSE file for full copyright and licensing details.
 
+import hashlib
+import json
+
+from collections import defaultdict
+
 from odoo import http
 from odoo.addons.portal.controllers.mail import MailController
 from odoo.addons.knowledge.controllers.main import KnowledgeController
 from odoo.http import request
 from odoo.addons.mail.controllers.thread import ThreadController
 from odoo.addons.mail.tools.discuss import Store
+from odoo.tools import json_default
 from werkzeug.exceptions import Forbidden
 
 
@@ -32,27 +38,36 @@ class ArticleThreadController(KnowledgeController):
 
 class KnowledgeThreadController(ThreadController):
 
-    @http.route("/knowledge/threads/messages", methods=["POST"], type="jsonrpc", auth="user")
-    def mail_threads_messages(self, thread_model, thread_ids, limit=30):
-        thread_ids = [int(thread_id) for thread_id in thread_ids]
-        output = {}
-        for thread_id in thread_ids:
-            domain = self._prepare_thread_messages_domain(thread_model, thread_id)
-            # TODO ABD optimize duration. Currently very slow because of mail.message._to_store
-            res = request.env["mail.message"]._message_fetch(domain, limit=limit)
-            messages = res.pop("messages")
-            output[thread_id] = {
-                **res,
-                "data": Store().add(messages).get_result(),
-                "messages": messages.ids,
-            }
-        return output
-
-    def _prepare_thread_messages_domain(self, thread_model, thread_id):
-        return [
-            ("res_id", "=", int(thread_id)),
-            ("model", "=", thread_model),
-            ("message_type", "=", "comment"),  # only user input
-            ("subtype_id", "=", request.env.ref('mail.mt_comment').id),  # comments in threads are sent as notes
-            ("is_internal", "=", False)  # respect internal users only flag
-        ]
+    @http.route("/knowledge/threads/messages", methods=["GET"], type="http", auth="user", readonly=True)
+    def mail_threads_messages(self, article_id, thread_ids, limit=30):
+        """ Load the last comments of the given threads of an article at once:
+        the messages are fetched in a single query and serialized, with their
+        authors and attachments, in a single store shared by all threads.
+
+        The response carries an ETag specific to the user and to the state of
+        the comments of the threads: when the client sends it back in the
+        ``If-None-Match`` header and nothing changed, an empty "304 Not
+        Modified" response is returned without loading the messages. """
+        threads = request.env['knowledge.article.thread'].search([
+            ('id', 'in', [int(thread_id) for thread_id in thread_ids.split(',') if thread_id]),
+            ('article_id', '=', int(article_id)),
+        ])
+        limit = int(limit)
+        version = threads._get_comment_messages_version()
+        etag = hashlib.sha1(
+            f'{request.env.uid}:{request.env.lang}:{threads.ids}:{limit}:{version}'.encode()
+        ).hexdigest()
+        headers = [('ETag', f'"{etag}"'), ('Cache-Control', 'private, no-cache')]
+        if etag in request.httprequest.if_none_match:
+            return request.make_response('', headers=headers, status=304)
+
+        messages = threads._fetch_comment_messages(limit=limit)
+        messages_by_thread = defaultdict(list)
+        for message in messages:
+            messages_by_thread[message.res_id].append(message.id)
+        result = {
+            'data': Store().add(messages).get_result(),
+            'threads': {thread.id: {'messages': messages_by_thread[thread.id]} for thread in threads},
+        }
+        body = json.dumps(result, default=json_default)
+        return request.make_response(body, headers=[('Content-Type', 'application/json'), *headers])
@@ -1,10 +1,17 @@
 # -*- coding: utf-8 -*-
 # Part of Odoo. See LICENSE file for full copyright and licensing details.
 
+import hashlib
+import json
+import tempfile
 import werkzeug
 
+from werkzeug.exceptions import NotFound
+from werkzeug.wsgi import wrap_file
+
 from odoo import http, tools, _
-from odoo.http import request
+from odoo.http import content_disposition, request
+from odoo.tools import json_default
 
 
 class KnowledgeController(http.Controller):
@@ -61,6 +68,59 @@ class KnowledgeController(http.Controller):
 
         return request.redirect('/web/login?redirect=/knowledge/article/%s' % article.id)
 
+    @http.route('/knowledge/article/<int:article_id>/export', type='http', methods=['GET'], auth='user', readonly=True)
+    def export_article(self, article_id, export_format='html'):
+        """ Download a zip archive of the article and of its descendants, in
+        HTML or Markdown (see ``knowledge.article.export``).
+
+        The archive is written by batches of articles into a temporary file
+        (kept in memory while small) and streamed from there, as the database
+        cursor is released before the response is sent. """
+        article = request.env['knowledge.article'].search([('id', '=', article_id)])
+        Export = request.env['knowledge.article.export']
+        if not article or export_format not in Export.EXPORT_FORMATS:
+            raise NotFound()
+        fileobj = tempfile.SpooledTemporaryFile(max_size=10 * 1024 * 1024)
+        Export._export_archive(article, fileobj, export_format)
+        size = fileobj.tell()
+        fileobj.seek(0)
+        filename = f"{article.name or _('Untitled')}.zip"
+        return request.make_response(wrap_file(request.httprequest.environ, fileobj), headers=[
+            ('Content-Type', 'application/zip'),
+            ('Content-Length', size),
+            ('Content-Disposition', content_disposition(filename)),
+        ])
+
+    # ------------------------
+    # Sidebar Routes
+    # ------------------------
+
+    @http.route('/knowledge/sidebar/children', type='http', methods=['GET'], auth='user', readonly=True)
+    def sidebar_children(self, parents, cursors=None, limit=None):
+        """ Lazily load windows of the sidebar tree (see ``get_sidebar_children``
+        on ``knowledge.article``), parameters being JSON encoded.
+
+        The response carries an ETag specific to the user and to the version
+        of the windows (see ``_get_sidebar_children_version``): when the client
+        sends it back in the ``If-None-Match`` header and nothing changed, an
+        empty "304 Not Modified" response is returned without loading them. """
+        parents = json.loads(parents)
+        Article = request.env['knowledge.article']
+        etag = hashlib.sha1(
+            f'{request.env.uid}:{request.env.lang}:{parents}:{cursors}:{limit}:'
+            f'{Article._get_sidebar_children_version(parents)}'.encode()
+        ).hexdigest()
+        headers = [('ETag', f'"{etag}"'), ('Cache-Control', 'private, no-cache')]
+        if etag in request.httprequest.if_none_match:
+            return request.make_response('', headers=headers, status=304)
+        result = Article.get_sidebar_children(
+            parents,
+            cursors=json.loads(cursors) if cursors else None,
+            limit=int(limit) if limit else None,
+        )
+        body = json.dumps(result, default=json_default, sort_keys=True)
+        return request.make_response(body, headers=[('Content-Type', 'application/json'), *headers])
+
     def _redirect_to_backend_view(self, article, show_resolved_threads=False):
         if article.id and show_resolved_threads:
             action_id = request.env.ref('knowledge.knowledge_article_action_form_show_resolved').id
@@ -2,10 +2,14 @@
 # Part of Odoo. See LICENSE file for full copyright and licensing details.
 
 from . import knowledge_article_thread
+from . import knowledge_article_export
 from . import knowledge_article_favorite
+from . import knowledge_article_import
 from . import knowledge_article_member
 from . import knowledge_article_template_category
 from . import knowledge_article
+from . import knowledge_article_permission
+from . import knowledge_article_revision
 from . import knowledge_article_stage
 from . import knowledge_cover
 from . import res_partner
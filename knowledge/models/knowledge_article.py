@@ -7,17 +7,20 @@ import re
 from collections import defaultdict
 from datetime import datetime, timedelta
 from lxml import html
-from markupsafe import Markup
+from markupsafe import Markup, escape
 
 from odoo import api, Command, fields, models, _
 from odoo.addons.html_editor.tools import handle_history_divergence
 from odoo.exceptions import AccessError, ValidationError, UserError
 from odoo.fields import Domain
 from odoo.tools import get_lang, OrderedSet
-from odoo.tools.sql import create_index, make_index_name, SQL
+from odoo.tools.sql import column_exists, create_index, drop_index, make_index_name, SQL
 from odoo.tools.translate import html_translate
 from odoo.tools.urls import urljoin as url_join
 
+from .knowledge_article_member import KnowledgeArticleMember
+from .knowledge_article_stage import KnowledgeArticleStage
+
 ARTICLE_PERMISSION_LEVEL = {'none': 0, 'read': 1, 'write': 2}
 
 
@@ -30,9 +33,19 @@ class KnowledgeArticle(models.Model):
     _parent_store = True
 
     def _get_versioned_fields(self):
+        # revisions are kept in knowledge.article.revision instead of the
+        # history of the mixin, see ``_get_revision_fields``
+        return []
+
+    def _get_revision_fields(self):
         return [KnowledgeArticle.body.name]
 
     DEFAULT_ARTICLE_TRASH_LIMIT_DAYS = 30
+    # spacing of the sequences of the children when they are rebalanced,
+    # see ``_resequence``
+    SEQUENCE_GAP = 1024
+    SEQUENCE_REBALANCE_THRESHOLD = 10
+    SIDEBAR_CHILDREN_LIMIT = 80
 
     active = fields.Boolean(default=True)
     name = fields.Char(string="Title", tracking=20, default_export_compatible=True, index="trigram")
@@ -60,14 +73,17 @@ class KnowledgeArticle(models.Model):
         [('write', 'Can edit'), ('read', 'Can read'), ('none', 'Members only')],
         string='Inherited Permission',
         compute="_compute_inherited_permission", compute_sudo=True,
-        store=True, index=True, recursive=True)
+        store=True, index=True)
     inherited_permission_parent_id = fields.Many2one(
         "knowledge.article", string="Inherited Permission Parent Article",
         compute="_compute_inherited_permission", compute_sudo=True,
-        store=True, recursive=True)
+        store=True)
     article_member_ids = fields.One2many(
         'knowledge.article.member', 'article_id', string='Members Information',
         copy=True)
+    effective_permission_ids = fields.One2many(
+        'knowledge.article.permission', 'article_id', string='Effective Member Permissions',
+        copy=False)
     user_has_access = fields.Boolean(
         string='Has Access',
         compute="_compute_user_has_access", search="_search_user_has_access")
@@ -135,6 +151,11 @@ class KnowledgeArticle(models.Model):
     favorite_ids = fields.One2many(
         'knowledge.article.favorite', 'article_id',
         string='Favorite Articles', copy=False)
+    # History
+    revision_ids = fields.One2many(
+        'knowledge.article.revision', 'article_id',
+        string='Revisions', copy=False)
+    html_field_history_metadata = fields.Json(compute='_compute_html_field_history_metadata')
     # Set default=0 to avoid false values and messed up order
     favorite_count = fields.Integer(
         string="#Is Favorite",
@@ -257,19 +278,45 @@ class KnowledgeArticle(models.Model):
                     WITH knowledge_dictionary;
             """)
 
-            # 4. Add an index to speed up the @@ match operation:
-            #
-            # When searching in a large collection of articles, the search can
-            # quickly become slow as the database has to parse the body of all
-            # articles. To speed up the search, we will use an index to quickly
-            # find potential candidates matching with the given search terms.
-
-            create_index(
-                self.env.cr,
-                make_index_name(self._table, 'body'),
-                self._table,
-                ["to_tsvector('knowledge_config', body)"],
-                method='GIN')
+        # 4. Maintain the document to search in:
+        #
+        # To avoid parsing the whole HTML body of the articles at each search,
+        # we store a weighted document combining the title (weight A) and the
+        # body stripped from its HTML tags (weight B). The document is kept
+        # up to date by a trigger that only fires when the title or the body
+        # are updated, and a GIN index is used to speed up the @@ match
+        # operation on large collections of articles.
+
+        search_vector = """
+            setweight(to_tsvector('knowledge_config', COALESCE(%(record)s.name, '')), 'A')
+            || setweight(to_tsvector('knowledge_config', regexp_replace(COALESCE(%(record)s.body, ''), '<[^>]*>', ' ', 'g')), 'B')
+        """
+        if not column_exists(self.env.cr, self._table, 'search_vector'):
+            self.env.cr.execute("ALTER TABLE knowledge_article ADD COLUMN search_vector tsvector")
+            self.env.cr.execute("UPDATE knowledge_article SET search_vector = %s" % (search_vector % {'record': 'knowledge_article'}))
+
+        self.env.cr.execute("""
+            CREATE OR REPLACE FUNCTION knowledge_article_update_search_vector() RETURNS trigger AS $$
+            BEGIN
+                NEW.search_vector := %s;
+                RETURN NEW;
+            END;
+            $$ LANGUAGE plpgsql;
+
+            DROP TRIGGER IF EXISTS knowledge_article_search_vector_trigger ON knowledge_article;
+            CREATE TRIGGER knowledge_article_search_vector_trigger
+                BEFORE INSERT OR UPDATE OF name, body ON knowledge_article
+                FOR EACH ROW EXECUTE FUNCTION knowledge_article_update_search_vector();
+        """ % (search_vector % {'record': 'NEW'}))
+
+        create_index(
+            self.env.cr,
+            make_index_name(self._table, 'search_vector'),
+            self._table,
+            ['search_vector'],
+            method='GIN')
+        # the body is not searched directly anymore
+        drop_index(self.env.cr, make_index_name(self._table, 'body'), self._table)
 
     # ------------------------------------------------------------
     # CONSTRAINTS
@@ -411,7 +458,7 @@ class KnowledgeArticle(models.Model):
         for template in self:
             template.template_preview = template._render_template()
 
-    @api.depends('parent_id', 'parent_id.inherited_permission_parent_id', 'internal_permission')
+    @api.depends('parent_id', 'internal_permission')
     def _compute_inherited_permission(self):
         """ Computed inherited internal permission. We go up ancestors until
         finding an article with an internal permission set, or a root article
@@ -419,20 +466,34 @@ class KnowledgeArticle(models.Model):
         serves as permission ancestor. Desynchronized articles break the
         permission tree finding.
 
-        'parent_id.inherited_permission_parent_id' needs to be in the trigger
-        as we will need to update this article's inherited permissions if our parent
-        changes itself from which article it's inheriting.
-        This allows cascading changes "downwards" when we modify the
-        internal_permission of an article in the chain.
+        The descendants are not triggered through the ORM, as it would cascade
+        the computation one level at a time: writes changing the permission
+        chain recompute whole subtrees at once instead (see
+        ``_recompute_inherited_permission_descendants``).
 
-        It is however not directly used as we optimize the batching and group all
-        articles by their parent_id."""
+        Existing articles are resolved in a single query on their parent_path.
+        New records (e.g. in onchange) go up their ancestors in Python, grouped
+        by parent_id to lessen number of computation."""
         self_inherit = self.filtered(lambda article: article.internal_permission)
         for article in self_inherit:
             article.inherited_permission = article.internal_permission
             article.inherited_permission_parent_id = False
 
         remaining = self - self_inherit
+        if not remaining:
+            return
+
+        stored = remaining.filtered('id')
+        if stored:
+            sources = stored._get_inherited_permission_sources()
+            articles_bysource = defaultdict(lambda: self.env['knowledge.article'])
+            for article in stored:
+                articles_bysource[sources.get(article.id, (False, False))] += article
+            for (source_id, permission), articles in articles_bysource.items():
+                articles.inherited_permission = permission
+                articles.inherited_permission_parent_id = source_id
+
+        remaining -= stored
         if not remaining:
             return
         # group by parents to lessen number of computation
@@ -457,12 +518,14 @@ class KnowledgeArticle(models.Model):
             articles.inherited_permission_parent_id = ancestors[-1:]
 
     @api.depends_context('uid')
-    @api.depends('internal_permission', 'article_member_ids.partner_id', 'article_member_ids.permission')
+    @api.depends('internal_permission', 'inherited_permission', 'article_member_ids.partner_id', 'article_member_ids.permission')
     def _compute_user_permission(self):
         """ Compute permission for current user. Public users never have any
         permission. Shared users have permission based only on members permission
         as internal permission never apply to them. Internal users combine both
-        internal and members permissions, taking the highest one. """
+        internal and members permissions, taking the highest one. Both are read
+        from materialized data: the stored inherited permission and the
+        effective member permissions. """
         if self.env.user._is_public():
             self.user_permission = False
             return
@@ -476,7 +539,7 @@ class KnowledgeArticle(models.Model):
 
         articles_permissions = {}
         if not self.env.user.share:
-            articles_permissions = self._get_internal_permission()
+            articles_permissions = {article.id: article.inherited_permission for article in toupdate.sudo()}
         member_permissions = self._get_partner_member_permissions(self.env.user.partner_id)
         for article in self:
             article_id = article.ids[0]
@@ -510,7 +573,6 @@ class KnowledgeArticle(models.Model):
           - The article allow read or write access to all internal users AND the user
             is not member with 'none' access
         """
-        KnowledgeArticle = self.env["knowledge.article"]
         # The ORM will optimize the domain leaf
         # before calling the search method:
         # = True | != False -> in [True]
@@ -518,21 +580,25 @@ class KnowledgeArticle(models.Model):
         if operator not in ('in', 'not in'):
             return NotImplemented
 
-        member_permissions = KnowledgeArticle._get_partner_member_permissions(self.env.user.partner_id)
-        articles_with_member_access = {article_id for article_id, perm in member_permissions.items() if perm != 'none'}
-
-        if self.env.user.share:
-            return [('id', operator, list(articles_with_member_access))]
-
-        # sudo reason: we're already computing ir.rules, avoid re-applying it.
-        articles_with_access = KnowledgeArticle.with_context(active_test=False).sudo().search([('inherited_permission', 'in', ('read', 'write'))])
-        articles_with_no_member_access = member_permissions.keys() - articles_with_member_access
-        article_ids = list((set(articles_with_access.ids) - articles_with_no_member_access) | articles_with_member_access)
-        return [('id', operator, article_ids)]
+        Permission = self.env['knowledge.article.permission']
+        partner = self.env.user.partner_id
+        domain = Domain('effective_permission_ids', 'in', Permission._search_partner_articles(partner, ['read', 'write']))
+        if not self.env.user.share:
+            domain |= Domain('inherited_permission', 'in', ['read', 'write']) & Domain(
+                'effective_permission_ids', 'not in', Permission._search_partner_articles(partner, ['none']))
+        return domain if operator == 'in' else ~domain
 
     @api.depends_context('uid')
     @api.depends('user_has_access', 'parent_id.user_has_access_parent_path')
     def _compute_user_has_access_parent_path(self):
+        """ Existing articles are resolved at once, checking the access on all
+        their ancestors in a single query (see ``_get_parent_path_access``)."""
+        stored = self.filtered('id')
+        if stored:
+            parent_path_access = stored._get_parent_path_access()
+            for article in stored:
+                article.user_has_access_parent_path = parent_path_access.get(article.id, False)
+        self -= stored
         roots = self.filtered(lambda article: not article.parent_id)
         for article in roots:
             article.user_has_access_parent_path = article.user_has_access
@@ -553,7 +619,6 @@ class KnowledgeArticle(models.Model):
             article.user_has_write_access = article.user_permission == 'write'
 
     def _search_user_has_write_access(self, operator, value):
-        KnowledgeArticle = self.env["knowledge.article"]
         if operator not in ('in', 'not in'):
             return NotImplemented
 
@@ -561,22 +626,13 @@ class KnowledgeArticle(models.Model):
         if self.env.user.share:
             return Domain(operator == 'in')
 
-        articles_with_access = KnowledgeArticle._get_internal_permission(filter_domain=[('internal_permission', '=', 'write')])
-        member_permissions = KnowledgeArticle._get_partner_member_permissions(self.env.user.partner_id)
-        articles_with_member_access = [article_id for article_id, perm in member_permissions.items() if perm == 'write']
-        articles_with_no_member_access = list(set(member_permissions.keys() - set(articles_with_member_access)))
-
-        # If searching articles for which user has write access.
-        if operator == 'in':
-            return ['|',
-                        '&', ('id', 'in', list(articles_with_access.keys())), ('id', 'not in', articles_with_no_member_access),
-                        ('id', 'in', articles_with_member_access)
-            ]
-        # If searching articles for which user has NO write access.
-        return ['|',
-                    '&', ('id', 'not in', list(articles_with_access.keys())), ('id', 'not in', articles_with_member_access),
-                    ('id', 'in', articles_with_no_member_access)
-        ]
+        Permission = self.env['knowledge.article.permission']
+        partner = self.env.user.partner_id
+        domain = Domain('effective_permission_ids', 'in', Permission._search_partner_articles(partner, ['write'])) | (
+            Domain('inherited_permission', '=', 'write')
+            & Domain('effective_permission_ids', 'not in', Permission._search_partner_articles(partner, ['read', 'none']))
+        )
+        return domain if operator == 'in' else ~domain
 
     @api.depends_context('uid')
     @api.depends('user_has_access')
@@ -636,6 +692,27 @@ class KnowledgeArticle(models.Model):
         for article in self:
             article.favorite_count = favorites_count_by_article.get(article.id, 0)
 
+    @api.depends('html_field_history', 'revision_ids')
+    def _compute_html_field_history_metadata(self):
+        """ Metadata of the revisions of the versioned fields, read from the
+        revision store (see ``knowledge.article.revision``), or from the
+        history of the mixin for articles whose history was not moved yet. """
+        Revision = self.env['knowledge.article.revision'].sudo()
+        for article in self:
+            if article.html_field_history:
+                metadata = {
+                    field_name: [
+                        {key: value for key, value in revision.items() if key != 'patch'}
+                        for revision in revisions
+                    ] for field_name, revisions in article.html_field_history.items()
+                }
+            else:
+                metadata = {
+                    field_name: revisions for field_name in article._get_revision_fields()
+                    if (revisions := Revision._get_metadata(article, field_name))
+                }
+            article.html_field_history_metadata = metadata or None
+
     @api.depends_context('uid')
     @api.depends('favorite_ids.user_id')
     def _compute_is_user_favorite(self):
@@ -941,6 +1018,8 @@ class KnowledgeArticle(models.Model):
         if any(articles.mapped('is_template')) and not self.env.user.has_group('base.group_system'):
             raise ValidationError(_('You are not allowed to create a new template.'))
 
+        # children inherit the members of their parents (own members are handled on member creation)
+        self.env['knowledge.article.permission']._mark_to_refresh(articles.filtered('parent_id'))
         return articles
 
     def write(self, vals):
@@ -987,8 +1066,26 @@ class KnowledgeArticle(models.Model):
             else:
                 _resequence = True
 
+        revision_fields = [field_name for field_name in self._get_revision_fields() if field_name in vals]
+        if revision_fields:
+            Revision = self.env['knowledge.article.revision'].sudo()
+            # older revisions are rebuilt from the current content, move them first
+            Revision._import_legacy_history(self)
+            old_contents = {
+                (article, field_name): article[field_name]
+                for article in self for field_name in revision_fields
+            }
+
         result = super().write(vals)
 
+        if revision_fields:
+            Revision._add_revisions(old_contents)
+
+        if 'parent_id' in vals or 'is_desynchronized' in vals:
+            self.env['knowledge.article.permission']._mark_to_refresh(self)
+        if vals.keys() & {'internal_permission', 'parent_id', 'is_desynchronized'}:
+            self.sudo()._recompute_inherited_permission_descendants()
+
         # resequence only if a sequence was not already computed based on current
         # parent maximum to avoid unnecessary recomputation of sequences
         if _resequence:
@@ -1014,25 +1111,294 @@ class KnowledgeArticle(models.Model):
     def copy_batch(self, default=None):
         """ Duplicates a recordset of articles. Filters out articles that are
         going to be duplicated during the duplication of their parent in order
-        to prevent duplicating several times the same article. """
+        to prevent duplicating several times the same article. Whole subtrees
+        are duplicated at once, see ``_copy_subtrees``. """
         current_ids = set(self.ids)
         # Remove records that will get duplicated with their parent
         to_copy = self.filtered(lambda article: not article._get_ancestor_ids() & current_ids)
-
+        if self._has_copy_overrides():
+            return to_copy._copy_with_create(default=default)
+        return to_copy._copy_subtrees(default=default)
+
+    def _copy_with_create(self, default=None):
+        """ Duplicate the articles through ``copy_data`` and ``create``, their
+        descendants being copied by the ``copy`` of ``child_ids``. Used instead
+        of ``_copy_subtrees`` when modules override these methods. """
         duplicates = self.create([
             article.with_context(active_test=False).copy_data(default=default)[0]
-            for article in to_copy
+            for article in self
         ])
         # update translations, skip name (hardcoded in default anyway) and o2m fields
         # as we don't need anything translated from them
-        for old, new in zip(to_copy, duplicates):
+        for old, new in zip(self, duplicates):
             old.copy_translations(
                 new,
                 excluded=list(default.keys()) if default else [] + ['name', 'article_member_ids', 'favorite_ids']
             )
-
         return duplicates
 
+    def _has_copy_overrides(self):
+        """ Return whether modules extending the models inserted by
+        ``_copy_subtrees`` override their ``create``, ``copy`` or ``copy_data``,
+        which the bulk duplication would skip. """
+        for model_name, base_class in (
+            ('knowledge.article', KnowledgeArticle),
+            ('knowledge.article.member', KnowledgeArticleMember),
+            ('knowledge.article.stage', KnowledgeArticleStage),
+        ):
+            mro = type(self.env[model_name]).__mro__
+            extensions = mro[:mro.index(base_class)]
+            if any(method in vars(cls) for cls in extensions for method in ('create', 'copy', 'copy_data')):
+                return True
+        return False
+
+    def _copy_subtrees(self, default=None):
+        """ Duplicate the articles with all their (readable) descendants, in a
+        bounded number of queries whatever the size and the depth of the
+        subtrees: articles, members and item stages are each inserted with a
+        single INSERT ... SELECT on the originals.
+
+        Values follow the ``copy`` attribute of the fields: copied columns are
+        kept as is (with all their translations), the other ones get their
+        default value and stored computed fields are recomputed on the copies.
+        The hierarchy (parent_id, parent_path, item stages) and the references
+        to copied articles in the bodies (links and embedded views) are
+        remapped to the copies. Favorites are not copied, and no message is
+        logged on the copies.
+
+        The ``create`` and ``copy_data`` overrides are skipped: ``copy_batch``
+        falls back to ``_copy_with_create`` when modules extending the copied
+        models override them. The mixins are skipped on purpose: no follower,
+        message or body history is created for the copies. The python
+        constraints are checked on the inserted records.
+
+        As for ``copy``, the copies of the articles in self are named "(copy)"
+        when they are roots and ``default`` only applies to them. They are
+        put at the end of their parent.
+
+        :return: the copies of the articles in self, in the same order """
+        if not self:
+            return self.browse()
+        default = dict(default or {})
+        Article = self.with_context(active_test=False)
+        Member = self.env['knowledge.article.member'].sudo()
+        Stage = self.env['knowledge.article.stage']
+
+        self.check_access('read')
+        root_ids = set(self.ids)
+
+        # keep the descendants reachable through readable articles, ordered
+        # by parent_path so that parents always come before their children
+        copied_ids = set()
+        originals = Article.browse()
+        for article in Article.search([('id', 'child_of', self.ids)], order='parent_path'):
+            if article.id in root_ids or article.parent_id.id in copied_ids:
+                copied_ids.add(article.id)
+                originals += article
+
+        parents = self.browse(default.pop('parent_id')) if 'parent_id' in default else None
+        root_parents = {article: parents if parents is not None else article.parent_id for article in self}
+
+        # same checks as ``create``: members are then copied as superuser, as
+        # ``create`` does for the members of the new articles
+        Article.check_access('create')
+        target_parents = self.browse({parent.id for parent in root_parents.values() if parent})
+        if target_parents and not target_parents.has_access('write'):
+            raise AccessError(_("You cannot create an article under articles on which you cannot write"))
+        # copies put in the workspace get the permission forced by ``create``
+        root_permissions = {
+            article: article.internal_permission or 'write'
+            for article, parent in root_parents.items() if not parent
+        }
+        if not self.env.su and not self.env.user._is_internal() and any(
+                permission != 'none' for permission in root_permissions.values()):
+            raise AccessError(_('Only internal users are allowed to create workspace root articles.'))
+        if any(originals.mapped('is_template')) and not self.env.user.has_group('base.group_system'):
+            raise ValidationError(_('You are not allowed to create a new template.'))
+
+        self.env.flush_all()
+        new_ids = [new_id for new_id, in self.env.execute_query(SQL(
+            "SELECT nextval(%s) FROM generate_series(1, %s)", f'{self._table}_id_seq', len(originals),
+        ))]
+        new_id_by_old = dict(zip(originals.ids, new_ids))
+
+        # hierarchy, names, sequences and permissions of the copies
+        max_sequences = self._get_max_sequence_inside_parents(list({parent.id for parent in root_parents.values()}))
+        parent_ids, parent_paths, names, sequences, permissions = [], [], [], [], []
+        new_path_by_old = {}
+        for article, new_id in zip(originals, new_ids):
+            permissions.append(root_permissions.get(article))
+            if article.id in root_ids:
+                parent = root_parents[article]
+                parent_path = parent.parent_path or ''
+                if 'name' in default:
+                    name = default['name']
+                else:
+                    name = article.name if article.parent_id else _('%(article_name)s (copy)', article_name=article.name)
+                sequence = max_sequences.get(parent.id, -1) + 1
+                max_sequences[parent.id] = sequence
+            else:
+                parent = article.parent_id
+                parent_path = new_path_by_old[parent.id]
+                name = sequence = None
+            new_path_by_old[article.id] = f'{parent_path}{new_id}/'
+            parent_ids.append(new_id_by_old.get(parent.id, parent.id) or None)
+            parent_paths.append(new_path_by_old[article.id])
+            names.append(name)
+            sequences.append(sequence)
+
+        now = SQL("(now() at time zone 'UTC')")
+        log_access = {
+            'create_uid': SQL("%s", self.env.uid), 'create_date': now,
+            'write_uid': SQL("%s", self.env.uid), 'write_date': now,
+        }
+        columns, article_fields_to_compute = self._get_copy_columns(Article, 'article', {
+            **log_access,
+            'id': SQL("mapping.new_id"),
+            'parent_id': SQL("mapping.parent_id"),
+            'parent_path': SQL("mapping.parent_path"),
+            'name': SQL("COALESCE(mapping.name, article.name)"),
+            'sequence': SQL("COALESCE(mapping.sequence, article.sequence)"),
+            'internal_permission': SQL("COALESCE(mapping.internal_permission, article.internal_permission)"),
+            'stage_id': SQL("article.stage_id"),
+            'last_edition_uid': SQL("%s", self.env.uid),
+            'last_edition_date': now,
+        })
+        self.env.cr.execute(SQL("""
+            INSERT INTO knowledge_article (%(columns)s)
+                 SELECT %(values)s
+                   FROM unnest(%(old_ids)s::int[], %(new_ids)s::int[], %(parent_ids)s::int[],
+                               %(parent_paths)s::varchar[], %(names)s::varchar[], %(sequences)s::int[],
+                               %(permissions)s::varchar[])
+                        AS mapping(old_id, new_id, parent_id, parent_path, name, sequence, internal_permission)
+                   JOIN knowledge_article AS article ON article.id = mapping.old_id""",
+            columns=SQL(", ").join(SQL.identifier(column) for column in columns),
+            values=SQL(", ").join(columns.values()),
+            old_ids=originals.ids, new_ids=new_ids, parent_ids=parent_ids,
+            parent_paths=parent_paths, names=names, sequences=sequences, permissions=permissions,
+        ))
+
+        mapping_query = SQL("unnest(%s::int[], %s::int[]) AS mapping(old_id, new_id)", originals.ids, new_ids)
+        columns, member_fields_to_compute = self._get_copy_columns(Member, 'member', {
+            **log_access,
+            'article_id': SQL("mapping.new_id"),
+        })
+        member_ids = [member_id for member_id, in self.env.execute_query(SQL("""
+            INSERT INTO knowledge_article_member (%(columns)s)
+                 SELECT %(values)s
+                   FROM knowledge_article_member AS member
+                   JOIN %(mapping)s ON mapping.old_id = member.article_id
+              RETURNING id""",
+            columns=SQL(", ").join(SQL.identifier(column) for column in columns),
+            values=SQL(", ").join(columns.values()),
+            mapping=mapping_query,
+        ))]
+
+        # item stages are owned by the parent of the items: copy them and
+        # move the copied items in the copies of their stages
+        stage_mapping = self.env.execute_query(SQL(
+            "SELECT id, nextval(%s) FROM knowledge_article_stage WHERE parent_id IN %s",
+            f'{Stage._table}_id_seq', tuple(originals.ids),
+        ))
+        new_stage_ids = []
+        if stage_mapping:
+            old_stage_ids, new_stage_ids = (list(ids) for ids in zip(*stage_mapping))
+            columns = self._get_copy_columns(Stage, 'stage', {
+                **log_access,
+                'id': SQL("stage_mapping.new_id"),
+                'parent_id': SQL("mapping.new_id"),
+            })[0]
+            stage_mapping_query = SQL(
+                "unnest(%s::int[], %s::int[]) AS stage_mapping(old_id, new_id)", old_stage_ids, new_stage_ids)
+            self.env.cr.execute(SQL("""
+                INSERT INTO knowledge_article_stage (%(columns)s)
+                     SELECT %(values)s
+                       FROM knowledge_article_stage AS stage
+                       JOIN %(stage_mapping)s ON stage_mapping.old_id = stage.id
+                       JOIN %(mapping)s ON mapping.old_id = stage.parent_id""",
+                columns=SQL(", ").join(SQL.identifier(column) for column in columns),
+                values=SQL(", ").join(columns.values()),
+                stage_mapping=stage_mapping_query,
+                mapping=mapping_query,
+            ))
+            self.env.cr.execute(SQL("""
+                UPDATE knowledge_article AS article
+                   SET stage_id = stage_mapping.new_id
+                  FROM %(stage_mapping)s
+                 WHERE article.id IN %(new_ids)s
+                   AND article.stage_id = stage_mapping.old_id""",
+                stage_mapping=stage_mapping_query,
+                new_ids=tuple(new_ids),
+            ))
+
+        # remap the references to the copied articles in the bodies
+        bodies = self.env.execute_query(SQL("""
+            SELECT id, body
+              FROM knowledge_article
+             WHERE id IN %s
+               AND (body LIKE %s OR body LIKE %s)""",
+            tuple(new_ids), '%data-embedded=_view_%', '%o_knowledge_article_link%',
+        ))
+        remapped_bodies = [
+            (article_id, remapped_body) for article_id, body in bodies
+            if (remapped_body := self._get_remapped_body(body, new_id_by_old)) != body
+        ]
+        if remapped_bodies:
+            article_ids, bodies = zip(*remapped_bodies)
+            # written in SQL, the bodies are sanitized as done by create
+            body_field = self._fields['body']
+            bodies = [body_field.convert_to_column_insert(body, self.browse()) for body in bodies]
+            self.env.cr.execute(SQL("""
+                UPDATE knowledge_article AS article
+                   SET body = remapped.body
+                  FROM unnest(%s::int[], %s::text[]) AS remapped(id, body)
+                 WHERE article.id = remapped.id""", list(article_ids), list(bodies)))
+
+        self.env.invalidate_all()
+        duplicates = self.browse(new_ids)
+        roots = self.browse(new_id_by_old[article.id] for article in self)
+        for field in article_fields_to_compute:
+            self.env.add_to_compute(field, duplicates)
+        if parents is not None:
+            # items moved under another parent go to its first stage
+            self.env.add_to_compute(self._fields['stage_id'], roots)
+        for field in member_fields_to_compute:
+            self.env.add_to_compute(field, Member.browse(member_ids))
+
+        self.env['knowledge.article.permission']._mark_to_refresh(roots)
+        duplicates._validate_fields(self._fields)
+        Member.browse(member_ids)._validate_fields(Member._fields)
+        Stage.browse(new_stage_ids)._validate_fields(Stage._fields)
+        default.pop('name', None)
+        if default:
+            roots.write(default)
+        return roots
+
+    @api.model
+    def _get_copy_columns(self, model, alias, overrides):
+        """ Return the columns to insert when copying the rows of ``model``
+        with an INSERT ... SELECT on ``alias``, as a dict ``{column: SQL}``,
+        and the stored computed fields to recompute on the copies.
+
+        Columns of copied fields are selected as is, other ones get their
+        default value (if any) and the ``overrides`` are applied on top. Without
+        ``alias``, the columns of new rows are returned: all of them get their
+        default value. """
+        defaults = model._add_missing_default_values({})
+        columns, fields_to_compute = {}, []
+        for field in model._fields.values():
+            if not field.store or not field.column_type:
+                continue
+            if field.name in overrides:
+                columns[field.name] = overrides[field.name]
+            elif field.compute:
+                fields_to_compute.append(field)
+            elif field.copy and alias:
+                columns[field.name] = SQL.identifier(alias, field.name)
+            elif field.name in defaults:
+                columns[field.name] = SQL("%s", field.convert_to_column_insert(defaults[field.name], model.browse()))
+        return columns, fields_to_compute
+
     @api.model
     def _read_group_stage_ids(self, stages, domain):
         search_domain = Domain('id', 'in', stages.ids)
@@ -1176,6 +1542,43 @@ class KnowledgeArticle(models.Model):
 
         return html.tostring(fragment, encoding="unicode")
 
+    @api.model
+    def _get_remapped_body(self, body, article_mapping):
+        """ Returns the body with its references to the articles updated
+        following the given mapping (used when duplicating articles):
+        - Updates the links to the articles;
+        - Updates the embedded views so that the views listing the article items
+        of an article now list the article items of its copy.
+        :param str body: html body
+        :param dict article_mapping: ``{original_id: copy_id}``
+        """
+        fragment = html.fragment_fromstring(body, create_parent=True)
+        updated = False
+
+        for element in fragment.findall(".//*[@data-res_id]"):
+            if 'o_knowledge_article_link' not in element.get('class', '').split():
+                continue
+            article_id = int(element.get('data-res_id')) if element.get('data-res_id', '').isdigit() else False
+            if article_id in article_mapping:
+                element.set('data-res_id', str(article_mapping[article_id]))
+                element.set('href', f'/knowledge/article/{article_mapping[article_id]}')
+                updated = True
+
+        for element in fragment.findall(".//*[@data-embedded='view']"):
+            embedded_props = json.loads(element.get("data-embedded-props"))
+            context = embedded_props.get("viewProps", {}).get("context", {})
+            if context.get("default_is_article_item") and context.get("active_id") in article_mapping:
+                new_id = article_mapping[context["active_id"]]
+                context.update({"active_id": new_id, "default_parent_id": new_id})
+                element.set("data-embedded-props", json.dumps(embedded_props))
+                updated = True
+
+        if not updated:
+            return body
+        # drop the wrapping element added by fragment_fromstring, its text
+        # being unescaped by lxml
+        return str(escape(fragment.text or '')) + ''.join(html.tostring(child, encoding="unicode") for child in fragment)
+
     # ------------------------------------------------------------
     # ACTIONS
     # ------------------------------------------------------------
@@ -1270,6 +1673,16 @@ class KnowledgeArticle(models.Model):
         action['res_id'] = article.id
         return action
 
+    def action_export_archive(self, export_format='html'):
+        """ Download a zip archive of the article and of its descendants,
+        converted to HTML or Markdown (see ``knowledge.article.export``). """
+        self.ensure_one()
+        return {
+            'type': 'ir.actions.act_url',
+            'url': f'/knowledge/article/{self.id}/export?export_format={export_format}',
+            'target': 'download',
+        }
+
     def action_redirect_to_parent(self):
         """ Redirect to the parent article if the user has access to the parent
             article. Otherwise, redirect to the home page. """
@@ -1408,7 +1821,7 @@ class KnowledgeArticle(models.Model):
 
         values = {'parent_id': parent_id}
         if before_article:
-            values['sequence'] = before_article.sequence
+            values['sequence'] = self._get_sequence_before(before_article)
         if parent_id and not self.parent_id:
             # be sure to reset internal permission when moving a root article under a parent
             values['internal_permission'] = False
@@ -1423,55 +1836,127 @@ class KnowledgeArticle(models.Model):
         return self.write(values)
 
     def _resequence(self):
-        """ This method reorders the children of the same parent (brotherhood) if
-        needed. If an article have been moved from one parent to another we do not
-        need to resequence the children of the old parent as the order remains
-        unchanged. We only need to resequence the children of the new parent only if
-        the sequences of the children contains duplicates.
-
-        When reordering an article, we assume that we always set the sequence
-        equals to the position we want it to be. When duplicates last modified
-        wins. We use write date, presence in self (indicating a write hence a
-        priority) and ID to differentiate new ordering between duplicates.
+        """ Solve the sequence collisions among the children of the parents of
+        the articles, in a single query. When reordering an article, we set its
+        sequence to the one of the article it is placed before (unless a gap
+        is left between that article and the previous one, see
+        ``_get_sequence_before``): when duplicates, articles in self win, then
+        last modified, then most recently created ones. The following siblings
+        are shifted until the first gap absorbing the collision, so that holes
+        in the sequences limit the number of rows updated.
 
         e.g. if we want article D to be placed at 3rd position between A B et C
           * set D.sequence = 2;
           * but C was already 2;
-          * D is in self: it wins. Or D has newer write_date: it wins. Or D has
-            been created more recently: it wins.
-        """
-        parent_ids = self.mapped("parent_id").ids
-        if any(not article.parent_id for article in self):
-            parent_ids.append(False)
-
-        # fetch and sort all_children: sequence ASC, then modified, then write date DESC
-        all_children = self.search([("parent_id", 'in', parent_ids)])
-        all_children = all_children.sorted(
-            lambda article: (-1 * article.sequence,
-                             article in self,
-                             article.write_date,
-                             article.id
-                             ),
-            reverse=True  # due to date
-        )
+          * D is in self: it wins. C gets 3, and the next sibling 4 if it was
+            3, and so on.
 
-        article_to_update_by_sequence = defaultdict(self.env['knowledge.article'].browse)
-        for parent_id in parent_ids:
-            children = all_children.filtered(lambda a: a.parent_id.id == parent_id)
-            sequences = children.mapped('sequence')
-            # no need to resequence if no duplicates.
-            if len(sequences) == len(set(sequences)):
-                return
+        When a collision would shift more than ``SEQUENCE_REBALANCE_THRESHOLD``
+        siblings, all the children of the parent are spread instead, leaving
+        ``SEQUENCE_GAP`` between consecutive articles so that the next moves
+        only update the moved article.
 
-            # only need to resequence after duplicate: allow holes in the sequence but limit number of write operations.
-            duplicate_index = [idx for idx, item in enumerate(sequences) if item in sequences[:idx]][0]
-            start_sequence = sequences[duplicate_index] + 1
-            for i, child in enumerate(children[duplicate_index:]):
-                article_to_update_by_sequence[i + start_sequence] |= child
-
-        for sequence in article_to_update_by_sequence:
-            # call super to avoid loops in write
-            super(KnowledgeArticle, article_to_update_by_sequence[sequence]).write({'sequence': sequence})
+        Root articles are siblings within their category only, and private
+        ones within the articles of their owner: moving a root article never
+        updates the root articles of other sections or other users.
+        """
+        if not self:
+            return
+        self.flush_model(['active', 'category', 'parent_id', 'sequence', 'write_date'])
+        self.env['knowledge.article.member'].flush_model(['article_id', 'partner_id', 'permission'])
+        parent_ids = self.parent_id.ids
+        siblings_clause = SQL("article.parent_id IN %s", tuple(parent_ids)) if parent_ids else SQL("FALSE")
+        root_categories = {article.category for article in self if not article.parent_id}
+        if root_categories:
+            siblings_clause = SQL(
+                "(%s OR (article.parent_id IS NULL AND article.category IN %s))",
+                siblings_clause, tuple(root_categories))
+
+        updated_ids = [article_id for article_id, in self.env.execute_query(SQL("""
+            WITH keyed AS (
+                SELECT article.id, article.sequence, article.write_date, article.active,
+                       CASE WHEN article.parent_id IS NOT NULL THEN article.parent_id::text
+                            WHEN article.category = 'private' THEN 'private-' || COALESCE(owner.partner_id, 0)
+                            ELSE article.category
+                       END AS sibling_key
+                  FROM knowledge_article AS article
+             LEFT JOIN LATERAL (
+                           SELECT member.partner_id
+                             FROM knowledge_article_member AS member
+                            WHERE member.article_id = article.id
+                              AND member.permission != 'none'
+                         ORDER BY member.id
+                            LIMIT 1
+                       ) AS owner ON article.parent_id IS NULL AND article.category = 'private'
+                 WHERE %(siblings_clause)s
+            ),
+            ranked AS (
+                SELECT id, sibling_key, sequence,
+                       ROW_NUMBER() OVER (
+                           PARTITION BY sibling_key
+                           ORDER BY sequence, id IN %(ids)s DESC, write_date DESC, id DESC
+                       ) AS rank
+                  FROM keyed
+                 WHERE sibling_key IN (SELECT sibling_key FROM keyed WHERE id IN %(ids)s)
+                   AND (active OR id IN %(ids)s)
+            ),
+            shifted AS (
+                -- each sibling gets at least the sequence of the previous one + 1
+                SELECT id, sibling_key, sequence, rank,
+                       rank + max(sequence - rank) OVER (PARTITION BY sibling_key ORDER BY rank) AS new_sequence
+                  FROM ranked
+            ),
+            rebalanced AS (
+                SELECT sibling_key
+                  FROM shifted
+                 WHERE new_sequence != sequence
+              GROUP BY sibling_key
+                HAVING count(*) > %(threshold)s
+            ),
+            resequenced AS (
+                SELECT shifted.id,
+                       CASE WHEN rebalanced.sibling_key IS NULL THEN shifted.new_sequence
+                            ELSE (shifted.rank - 1) * %(gap)s
+                       END AS sequence
+                  FROM shifted
+             LEFT JOIN rebalanced ON rebalanced.sibling_key = shifted.sibling_key
+            )
+            UPDATE knowledge_article AS article
+               SET sequence = resequenced.sequence
+              FROM resequenced
+             WHERE article.id = resequenced.id
+               AND article.sequence != resequenced.sequence
+         RETURNING article.id""",
+            ids=tuple(self.ids), siblings_clause=siblings_clause,
+            threshold=self.SEQUENCE_REBALANCE_THRESHOLD, gap=self.SEQUENCE_GAP,
+        ))]
+        if updated_ids:
+            updated = self.browse(updated_ids)
+            updated.invalidate_recordset(['sequence'])
+            updated.modified(['sequence'])
+
+    def _get_sequence_before(self, before_article):
+        """ Return the sequence to give to the article to place it right before
+        ``before_article``: the middle of the gap left between that article and
+        its previous sibling if any, so that only the moved article is updated,
+        otherwise the sequence of ``before_article`` itself, the collision
+        being solved by ``_resequence``. """
+        self.ensure_one()
+        before_article = before_article.sudo()
+        domain = [
+            ('parent_id', '=', before_article.parent_id.id),
+            ('sequence', '<', before_article.sequence),
+            ('id', 'not in', (self + before_article).ids),
+        ]
+        if not before_article.parent_id:
+            # root articles are only siblings within their section, see ``_resequence``
+            domain.append(('category', '=', before_article.category))
+            if before_article.category == 'private':
+                domain.append(('article_member_ids.partner_id', 'in', before_article.article_member_ids.partner_id.ids))
+        previous = self.sudo().search_fetch(domain, ['sequence'], order='sequence desc', limit=1)
+        if previous and before_article.sequence - previous.sequence > 1:
+            return (previous.sequence + before_article.sequence) // 2
+        return before_article.sequence
 
     @api.model
     def _get_max_sequence_inside_parents(self, parent_ids):
@@ -1576,26 +2061,27 @@ class KnowledgeArticle(models.Model):
         """
             Get the articles matching with the given search term.
 
+            The search is done in a single query on the stored weighted
+            document of the articles (title with weight A, body with weight B,
+            see ``init``) and on the title (using its trigram index).
+
             To reduce the query runtime, the search method limits the number of
             candidates to consider using the `knowledge.fts_search_cut_off`
-            configuration and pre-selects relevant candidates incrementally
-            using CTE queries.
+            configuration, favoring the articles matching with the title.
 
-            The search method pre-selects first articles matching with the title
+            The candidates are then ranked: first articles matching with the title
             and the body, then articles matching with the title only and, finally,
-            articles matching with the body only. The search method stops adding
-            new candidates when the maximum number of candidates is reached.
-
-            After that, the search method ranks the selected articles using a
-            scoring function and return the most relevant ones. With that approach,
-            the query should return relevant results in reasonable time.
+            articles matching with the body only. Within each group, articles are
+            sorted using a scoring function. The headlines are only generated
+            for the returned articles. With that approach, the query should return
+            relevant results in reasonable time.
 
             - If the number of overall matches is lower than the configured cut
               off, the query returns the top-k matches of the database.
             - If the number of overall matches is greater than the configured cut
               off, we consider that the search terms are too broad and we don't
               consider all potential candidates to reduce the query runtime. As
-              we pre-select relevant matches first, the query should return
+              we pre-select matches on the title first, the query should return
               relevant results but not necessarily the most relevant ones.
 
         :param str search_query: Search terms
@@ -1610,80 +2096,71 @@ class KnowledgeArticle(models.Model):
         # Escape special characters recognized by the 'ILIKE' keyword
         search_pattern = '%' + re.sub(r'(%|_|\\)', r'\\\1', search_query) + '%'
         ts_query = SQL("plainto_tsquery('knowledge_config', %(search_query)s)", search_query=search_query)
-        cut_off = max(self.env['ir.config_parameter'].sudo().get_param('knowledge.fts_search_cut_off', 100), limit)
+        cut_off = max(int(self.env['ir.config_parameter'].sudo().get_param('knowledge.fts_search_cut_off', 100)), limit)
+        # the search document is updated by a trigger on flush
+        self.flush_model(['name', 'body'])
 
         self.env.cr.execute(SQL('''
             WITH
-            articles_matching_with_title_and_body AS (
-                SELECT knowledge_article.id AS id,
-                       1 AS order,
-                       ts_rank_cd(to_tsvector('knowledge_config', knowledge_article.name), %(ts_query)s) AS score
-                  FROM knowledge_article
-                 WHERE knowledge_article.name ILIKE %(search_pattern)s
-                   AND to_tsvector('knowledge_config', knowledge_article.body) @@ %(ts_query)s
-                   AND %(sql_where_clause)s
-                 LIMIT %(cut_off)s
-            ),
-            articles_matching_with_title AS (
+            candidates AS (
                 SELECT knowledge_article.id AS id,
-                       2 AS order,
-                       1 AS score
+                       knowledge_article.name ILIKE %(search_pattern)s AS title_match
                   FROM knowledge_article
-                 WHERE knowledge_article.name ILIKE %(search_pattern)s
-                   AND knowledge_article.id NOT IN (
-                       SELECT id FROM articles_matching_with_title_and_body)
+                 WHERE (knowledge_article.name ILIKE %(search_pattern)s
+                        OR knowledge_article.search_vector @@ %(ts_query)s)
                    AND %(sql_where_clause)s
+              ORDER BY title_match DESC
                  LIMIT %(cut_off)s
-                    - (SELECT COUNT(*) FROM articles_matching_with_title_and_body)
             ),
-            articles_matching_with_body AS (
-                SELECT knowledge_article.id AS id,
-                       3 AS order,
-                       ts_rank_cd(to_tsvector('knowledge_config', knowledge_article.body), %(ts_query)s) AS score
-                  FROM knowledge_article
-                 WHERE to_tsvector('knowledge_config', knowledge_article.body) @@ %(ts_query)s
-                   AND knowledge_article.id NOT IN (
-                        SELECT id FROM articles_matching_with_title_and_body
-                        UNION ALL
-                        SELECT id FROM articles_matching_with_title)
-                   AND %(sql_where_clause)s
-                 LIMIT %(cut_off)s
-                    - (SELECT COUNT(*) FROM articles_matching_with_title_and_body)
-                    - (SELECT COUNT(*) FROM articles_matching_with_title)
+            ranked_articles AS (
+                SELECT candidates.id,
+                       ts_filter(knowledge_article.search_vector, '{b}') @@ %(ts_query)s AS body_match,
+                       candidates.title_match,
+                       ts_rank_cd(knowledge_article.search_vector, %(ts_query)s) AS score
+                  FROM candidates
+                  JOIN knowledge_article
+                    ON knowledge_article.id = candidates.id
             ),
-            all_matching_articles AS (
-                SELECT * FROM articles_matching_with_title_and_body
-                UNION ALL
-                SELECT * FROM articles_matching_with_title
-                UNION ALL
-                SELECT * FROM articles_matching_with_body
+            top_articles AS (
+                SELECT ranked_articles.id,
+                       ranked_articles.body_match,
+                       ranked_articles.score,
+                       CASE WHEN ranked_articles.title_match AND ranked_articles.body_match THEN 1
+                            WHEN ranked_articles.title_match OR NOT ranked_articles.body_match THEN 2
+                            ELSE 3 END AS match_group,
+                       COALESCE(CAST(article_favorite.id AS BOOLEAN), FALSE) AS is_user_favorite
+                  FROM ranked_articles
+             LEFT JOIN knowledge_article_favorite article_favorite
+                    ON ranked_articles.id = article_favorite.article_id
+                   AND article_favorite.user_id = %(user_id)s
+              ORDER BY match_group ASC,
+                       ranked_articles.score DESC,
+                       is_user_favorite DESC,
+                       ranked_articles.id DESC
+                 LIMIT %(limit)s
             )
             SELECT
                 knowledge_article.id,
                 knowledge_article.icon,
                 knowledge_article.name,
-                CASE WHEN to_tsvector('knowledge_config', knowledge_article.body) @@ %(ts_query)s
+                CASE WHEN top_articles.body_match
                      THEN ts_headline('knowledge_config', knowledge_article.body, %(ts_query)s,
                             'StartSel=<strong>, StopSel=</strong>, MaxWords=20, MinWords=10, MaxFragments=3')
                      ELSE NULL END AS "headline",
-                COALESCE(CAST(article_favorite.id AS BOOLEAN), FALSE) AS is_user_favorite,
+                top_articles.is_user_favorite,
                 knowledge_article.root_article_id,
                 root_article.id AS root_article_id,
                 root_article.icon AS root_article_icon,
                 root_article.name AS root_article_name
-              FROM all_matching_articles
-         LEFT JOIN knowledge_article
-                ON knowledge_article.id = all_matching_articles.id
+              FROM top_articles
+              JOIN knowledge_article
+                ON knowledge_article.id = top_articles.id
          LEFT JOIN knowledge_article AS root_article
                 ON knowledge_article.root_article_id = root_article.id
-         LEFT JOIN knowledge_article_favorite article_favorite
-                ON knowledge_article.id = article_favorite.article_id
-               AND article_favorite.user_id = %(user_id)s
-          ORDER BY all_matching_articles.order ASC,
-                   all_matching_articles.score DESC,
-                   is_user_favorite DESC,
+          ORDER BY top_articles.match_group ASC,
+                   top_articles.score DESC,
+                   top_articles.is_user_favorite DESC,
                    knowledge_article.id DESC
-             LIMIT %(limit)s
             ''',
             sql_where_clause=query.where_clause,
             search_pattern=search_pattern,
@@ -2305,7 +2782,7 @@ class KnowledgeArticle(models.Model):
             'parent_id': parent.id if parent else False,
         }
         if before_article:
-            article_values['sequence'] = before_article.sequence
+            article_values['sequence'] = self._get_sequence_before(before_article)
 
         self_sudo = self.sudo()
         # remove members as the article is moved to private
@@ -2406,7 +2883,7 @@ class KnowledgeArticle(models.Model):
             'parent_id': False,
         }
         if before_article:
-            values['sequence'] = before_article.sequence
+            values['sequence'] = self._get_sequence_before(before_article)
 
         # Sudo to be able to create new article_members
         return self.sudo().write(values)
@@ -2450,7 +2927,8 @@ class KnowledgeArticle(models.Model):
 
     @api.model
     def _get_internal_permission(self, filter_domain=None):
-        """ Compute article based permissions.
+        """ Compute article based permissions, following the ancestors. Only
+        meant to check or rebuild the stored ``inherited_permission``.
 
         Note: we don't use domain because we cannot include properly the where clause
         in the custom sql query. The query's output table and fields names does not match
@@ -2491,52 +2969,125 @@ class KnowledgeArticle(models.Model):
     GROUP BY article_id
         ''', base_where_domain, where_clause)))
 
+    def _get_inherited_permission_sources(self):
+        """ Return, for each article, the closest article (itself or one of its
+        ancestors) holding the internal permission the article inherits, as a
+        dict ``{article_id: (source_id, internal_permission)}``. The source id
+        is False for articles that have their own internal permission.
+
+        Ancestors are read from the parent_path of the articles, so that the
+        sources of a whole subtree are found in one query, whatever its depth. """
+        if not self.ids:
+            return {}
+        self.flush_model(['internal_permission', 'is_desynchronized', 'parent_path'])
+        return {
+            article_id: (source_id if source_id != article_id else False, permission)
+            for article_id, source_id, permission in self.env.execute_query(SQL("""
+                SELECT article.id, source.id, source.internal_permission
+                  FROM knowledge_article AS article
+            CROSS JOIN LATERAL (
+                    SELECT ancestor.id, ancestor.internal_permission
+                      FROM unnest(string_to_array(rtrim(article.parent_path, '/'), '/')::int[])
+                           WITH ORDINALITY AS path(id, depth)
+                      JOIN knowledge_article AS ancestor ON ancestor.id = path.id
+                     WHERE ancestor.internal_permission IS NOT NULL
+                        OR ancestor.is_desynchronized
+                  ORDER BY path.depth DESC
+                     LIMIT 1
+                ) AS source
+                 WHERE article.id IN %s""", tuple(self.ids)))
+        }
+
+    def _recompute_inherited_permission_descendants(self):
+        """ Recompute the inherited permission of all the descendants of the
+        articles at once, after a change of their permission chain (internal
+        permission, parent or desynchronization).
+
+        Letting the ORM cascade the recomputation would go down the hierarchy
+        one level at a time, with one query (and one round of dependencies)
+        per level. Instead, the whole subtrees are updated in one query, only
+        touching the rows that actually change, and the dependencies of the
+        updated articles are then notified. """
+        article_ids = tuple(article_id for article_id in self.ids if article_id)
+        if not article_ids:
+            return
+        self.flush_model(['internal_permission', 'is_desynchronized', 'parent_path'])
+        updated_ids = [article_id for article_id, in self.env.execute_query(SQL("""
+            WITH descendants AS (
+                SELECT DISTINCT descendant.id, descendant.parent_path
+                  FROM knowledge_article AS article
+                  JOIN knowledge_article AS descendant
+                    ON descendant.parent_path LIKE article.parent_path || %(like)s
+                 WHERE article.id IN %(article_ids)s
+                   AND descendant.id NOT IN %(article_ids)s
+            ), sources AS (
+                SELECT descendants.id, NULLIF(source.id, descendants.id) AS source_id, source.internal_permission
+                  FROM descendants
+            CROSS JOIN LATERAL (
+                    SELECT ancestor.id, ancestor.internal_permission
+                      FROM unnest(string_to_array(rtrim(descendants.parent_path, '/'), '/')::int[])
+                           WITH ORDINALITY AS path(id, depth)
+                      JOIN knowledge_article AS ancestor ON ancestor.id = path.id
+                     WHERE ancestor.internal_permission IS NOT NULL
+                        OR ancestor.is_desynchronized
+                  ORDER BY path.depth DESC
+                     LIMIT 1
+                ) AS source
+            )
+            UPDATE knowledge_article AS article
+               SET inherited_permission = sources.internal_permission,
+                   inherited_permission_parent_id = sources.source_id
+              FROM sources
+             WHERE article.id = sources.id
+               AND (article.inherited_permission, article.inherited_permission_parent_id)
+                   IS DISTINCT FROM (sources.internal_permission, sources.source_id)
+         RETURNING article.id
+        """, like='%', article_ids=article_ids))]
+        if updated_ids:
+            fnames = ['inherited_permission', 'inherited_permission_parent_id']
+            descendants = self.browse(updated_ids)
+            descendants.invalidate_recordset(fnames)
+            descendants.modified(fnames)
+
+    def _get_parent_path_access(self):
+        """ Return, for each article, whether the current user has access to
+        all its ancestors (or to itself for root articles), as a dict
+        ``{article_id: bool}``.
+
+        Access is checked on all the ancestors in one query, combining the
+        effective member permissions of the user with the inherited internal
+        permission (for internal users only), as in ``user_has_access``. """
+        if not self.ids or self.env.user._is_public():
+            return {}
+        self.flush_model(['inherited_permission', 'parent_path'])
+        self.env['knowledge.article.permission']._flush_permissions()
+        internal_permission = SQL("ancestor.inherited_permission") if not self.env.user.share else SQL("NULL")
+        return dict(self.env.execute_query(SQL("""
+            SELECT article.id,
+                   bool_and(COALESCE(perm.permission, %(internal_permission)s, 'none') != 'none')
+              FROM knowledge_article AS article
+              JOIN knowledge_article AS ancestor
+                ON ancestor.id = ANY(string_to_array(rtrim(article.parent_path, '/'), '/')::int[])
+               AND (ancestor.id != article.id OR article.parent_id IS NULL)
+         LEFT JOIN knowledge_article_permission AS perm
+                ON perm.article_id = ancestor.id
+               AND perm.partner_id = %(partner_id)s
+             WHERE article.id IN %(article_ids)s
+          GROUP BY article.id""",
+            internal_permission=internal_permission,
+            partner_id=self.env.user.partner_id.id,
+            article_ids=tuple(self.ids),
+        )))
+
     @api.model
     def _get_partner_member_permissions(self, partner):
         """ Retrieve the permission for the given partner for all articles.
         The articles can be filtered using the article_ids param.
 
-        The member model is fully flushed before running the request. """
-        self.env['knowledge.article'].flush_model()
-        self.env['knowledge.article.member'].flush_model()
-
-        if self.ids:
-            where_domain = SQL("WHERE id in %s", tuple(self.ids))
-        else:
-            where_domain = SQL()
-
-        return dict(self.env.execute_query(SQL('''
-            WITH RECURSIVE membered_articles AS (
-                -- base case: all articles the partner is member of
-                SELECT a.id,
-                       a.parent_id,
-                       a.is_desynchronized,
-                       m.permission
-                FROM knowledge_article AS a
-                     JOIN knowledge_article_member AS m ON a.id = m.article_id
-                WHERE m.partner_id = %(partner_id)s
-
-                UNION ALL
-                -- recurse into each child, that is not desync, and the partner is not a member of,
-                -- to propagate the member permission
-                SELECT a.id,
-                       a.parent_id,
-                       a.is_desynchronized,
-                       m.permission
-                FROM membered_articles AS m
-                     JOIN knowledge_article AS a ON m.id = a.parent_id
-                WHERE a.is_desynchronized IS NOT TRUE
-                  AND NOT EXISTS (SELECT 1
-                                  FROM knowledge_article_member AS mm
-                                  WHERE mm.article_id = a.id
-                                    AND mm.partner_id = %(partner_id)s))
-            SELECT id AS article_id, permission
-            FROM membered_articles
-            %(where_domain)s
-            ''',
-            partner_id=partner.id,
-            where_domain=where_domain,
-        )))
+        Permissions are read from the materialized effective permissions (see
+        ``knowledge.article.permission``), refreshed beforehand if needed. """
+        return self.env['knowledge.article.permission']._get_partner_permissions(
+            partner, article_ids=self.ids or None)
 
     def _get_article_member_permissions(self, additional_fields=False):
         """ Retrieve the permission for all the members that apply to the target article.
@@ -2835,6 +3386,40 @@ class KnowledgeArticle(models.Model):
     # BUSINESS METHODS
     # ------------------------------------------------------------
 
+    def html_field_history_get_content_at_revision(self, field_name, revision_id):
+        """ Rebuild the content from the revision store (see
+        ``knowledge.article.revision``), unless the history of the article
+        was not moved there yet. """
+        self.ensure_one()
+        if field_name not in self._get_revision_fields() or self.html_field_history:
+            return super().html_field_history_get_content_at_revision(field_name, revision_id)
+        self.check_access('read')
+        return self.env['knowledge.article.revision'].sudo()._get_content(self, field_name, revision_id)
+
+    def get_revision_metadata(self, field_name='body', before_revision_id=None, limit=50):
+        """ Return the metadata of the revisions of the field by pages, newest
+        first, so that the history can be loaded progressively.
+
+        :param str field_name: versioned field;
+        :param int before_revision_id: last revision of the previous page;
+        :param int limit: size of the page;
+        :return: dict with the ``revisions`` metadata (see
+          ``html_field_history_metadata``) and whether there are ``more``
+        """
+        self.ensure_one()
+        self.check_access('read')
+        if field_name not in self._get_revision_fields():
+            raise UserError(_('The field %(field_name)s has no history.', field_name=field_name))
+        if self.html_field_history:
+            revisions = [
+                revision for revision in self.html_field_history_metadata.get(field_name, [])
+                if not before_revision_id or revision['revision_id'] < before_revision_id
+            ]
+            return {'revisions': revisions[:limit], 'more': len(revisions) > limit}
+        revisions = self.env['knowledge.article.revision'].sudo()._get_metadata(
+            self, field_name, before_revision_id=before_revision_id, limit=limit + 1)
+        return {'revisions': revisions[:limit], 'more': len(revisions) > limit}
+
     def create_article_from_template(self, parent_id=False):
         self.ensure_one()
         values = {
@@ -3236,6 +3821,30 @@ class KnowledgeArticle(models.Model):
         """ Returns the descendants recordset of the current article. """
         return self.env['knowledge.article'].search([('id', 'not in', self.ids), ('parent_id', 'child_of', self.ids)])
 
+    def _iter_subtree_batches(self, field_names=None, batch_size=500):
+        """ Yield the articles and their (accessible) descendants by batches,
+        in ``parent_path`` order, i.e. each article before its descendants.
+        Batches are paginated on ``parent_path`` and the cache is dropped
+        between them, so that trees of any size are walked with a bounded
+        memory.
+
+        :param list field_names: fields to fetch with each batch
+        :param int batch_size: number of articles per batch
+        """
+        domain = Domain('id', 'child_of', self.ids)
+        last_parent_path = None
+        while True:
+            batch_domain = domain if last_parent_path is None else domain & Domain('parent_path', '>', last_parent_path)
+            batch = self.env['knowledge.article'].search_fetch(
+                batch_domain, ['parent_path', *(field_names or [])], order='parent_path', limit=batch_size)
+            if not batch:
+                return
+            last_parent_path = batch[-1].parent_path
+            yield batch
+            if len(batch) < batch_size:
+                return
+            self.env.invalidate_all()
+
     @api.model
     def get_empty_list_help(self, help_message):
         # Meant to target knowledge_article_action_trashed action only.
@@ -3322,9 +3931,11 @@ class KnowledgeArticle(models.Model):
             root_articles_ids += [active_article_accessible_ancestors[-1].id]
             unfolded_ids += active_article_accessible_ancestors.ids
 
-        favorite_articles_ids = self.env['knowledge.article.favorite'].sudo().search(
-            [("user_id", "=", self.env.user.id), ('is_article_active', '=', True)]
-        ).article_id.filtered(lambda article: article.user_has_access).ids
+        favorite_articles_ids = self.env['knowledge.article.favorite'].sudo().search([
+            ("user_id", "=", self.env.user.id),
+            ('is_article_active', '=', True),
+            ('article_id.user_has_access', '=', True),
+        ]).article_id.ids
 
         # Add favorite articles and items (they are root articles in the
         # favorite tree)
@@ -3352,6 +3963,151 @@ class KnowledgeArticle(models.Model):
             "active_article_accessible_root_id": active_article_accessible_ancestors[-1].id if active_article_accessible_ancestors else False
         }
 
+    @api.model
+    def get_sidebar_children(self, parents, cursors=None, limit=None):
+        """ Get a window of the articles to show in the sidebar under each of
+        the given parents, to lazily load large trees: the client loads the
+        next windows using the returned cursors.
+
+        Children are sorted by sequence and id, and the cursor of a parent is
+        the ``[sequence, id]`` of its last loaded child (keyset pagination),
+        so that windows stay consistent when articles are added before them.
+
+        :param list parents: ids of the parent articles, or categories
+          ('workspace', 'shared', 'private') to get the visible root articles
+          of the section
+        :param dict cursors: ``{parent: [sequence, id]}`` to get the window
+          following the given child of the parent (keys as strings)
+        :param int limit: maximal number of children per parent
+        :return dict: ``articles``, the data of all the returned articles, and
+          ``windows``, ``{parent: {'article_ids': [...], 'next_cursor': [sequence, id]}}``
+          where the next cursor is False when all children are loaded
+        """
+        limit = limit or self.SIDEBAR_CHILDREN_LIMIT
+        cursors = {str(key): cursor for key, cursor in (cursors or {}).items()}
+        categories = [parent for parent in parents if parent in ('workspace', 'shared', 'private')]
+        parent_ids = [int(parent) for parent in parents if parent not in categories]
+
+        domain = Domain.FALSE
+        if parent_ids:
+            domain |= Domain([('parent_id', 'in', parent_ids), ('is_article_item', '=', False)])
+        if categories:
+            domain |= Domain([
+                ('parent_id', '=', False),
+                ('category', 'in', categories),
+                ('is_template', '=', False),
+                ('is_article_visible', '=', True),
+            ])
+        query = self._search(domain)
+
+        # roots are paginated per category, children per parent
+        window_key = SQL("COALESCE(%s::varchar, %s)",
+            SQL.identifier(query.table, 'parent_id'), SQL.identifier(query.table, 'category'))
+        cursor_conditions = [
+            SQL("(%s = %s AND (%s, %s) > (%s, %s))",
+                window_key, key,
+                SQL.identifier(query.table, 'sequence'), SQL.identifier(query.table, 'id'),
+                int(cursor[0]), int(cursor[1]))
+            for key, cursor in cursors.items() if cursor
+        ]
+        if cursor_conditions:
+            query.add_where(SQL("(%s NOT IN %s OR %s)",
+                window_key, tuple(key for key, cursor in cursors.items() if cursor),
+                SQL(" OR ").join(cursor_conditions)))
+
+        rows = self.env.execute_query(SQL("""
+            SELECT window_key, id, sequence
+              FROM (%s) AS windows
+             WHERE rank <= %s
+          ORDER BY window_key, rank
+        """, query.select(
+            SQL("%s AS window_key", window_key),
+            SQL.identifier(query.table, 'id'),
+            SQL.identifier(query.table, 'sequence'),
+            SQL("ROW_NUMBER() OVER (PARTITION BY %s ORDER BY %s, %s) AS rank",
+                window_key, SQL.identifier(query.table, 'sequence'), SQL.identifier(query.table, 'id')),
+        ), limit + 1))
+
+        windows = {str(parent): {'article_ids': [], 'next_cursor': False} for parent in parents}
+        for key, article_id, sequence in rows:
+            window = windows[key]
+            if len(window['article_ids']) < limit:
+                window['article_ids'].append(article_id)
+                window['last'] = [sequence, article_id]
+            else:
+                window['next_cursor'] = window['last']
+        for window in windows.values():
+            window.pop('last', None)
+
+        loaded_ids = {article_id for window in windows.values() for article_id in window['article_ids']}
+        articles = self.browse(article_id for __, article_id, __ in rows if article_id in loaded_ids)
+        children_counts = dict(self._read_group(
+            [('parent_id', 'in', articles.ids), ('is_article_item', '=', False)],
+            ['parent_id'], ['__count'],
+        ))
+        articles_data = articles.read(
+            ['name', 'icon', 'parent_id', 'category', 'is_locked', 'user_can_write', 'is_user_favorite', 'is_article_item'],
+            None,  # To not fetch the name of parent_id
+        )
+        for article, data in zip(articles, articles_data):
+            data['child_count'] = children_counts.get(article, 0)
+            data['has_article_children'] = bool(data['child_count'])
+        return {'articles': articles_data, 'windows': windows}
+
+    def _get_sidebar_children_version(self, parents):
+        """ Return a key changing whenever the result of ``get_sidebar_children``
+        for the given parents may have changed for the current user, computed
+        with indexed aggregates instead of the access checks and the reads: the
+        children (roots for the categories) and their own children (added,
+        removed, moved or modified, as their internal permission), the member
+        permissions of the user on them and the favorites of the user.
+
+        Only the roots of the requested categories are read, the shared and
+        private ones being restricted to the ones the user is member of. """
+        self.env['knowledge.article.permission']._flush_permissions()
+        self.flush_model(['parent_id', 'category', 'is_article_item', 'inherited_permission', 'write_date'])
+        self.env['knowledge.article.favorite'].flush_model(['user_id', 'write_date'])
+        partner_id = self.env.user.partner_id.id
+        categories = [parent for parent in parents if parent in ('workspace', 'shared', 'private')]
+        parent_ids = [int(parent) for parent in parents if parent not in categories]
+        filters = []
+        if parent_ids:
+            filters.append(SQL("article.parent_id = ANY(%s) AND NOT article.is_article_item", parent_ids))
+        if 'workspace' in categories:
+            filters.append(SQL("article.parent_id IS NULL AND article.category = 'workspace'"))
+        if member_categories := [category for category in categories if category != 'workspace']:
+            filters.append(SQL("""
+                article.parent_id IS NULL AND article.category = ANY(%s) AND article.id IN (
+                    SELECT article_id FROM knowledge_article_permission WHERE partner_id = %s)""",
+                member_categories, partner_id,
+            ))
+        children_filter = SQL(" OR ").join(SQL("(%s)", condition) for condition in filters) if filters else SQL("FALSE")
+        [version] = self.env.execute_query(SQL("""
+            WITH children AS (
+                SELECT article.id, article.write_date, article.inherited_permission
+                  FROM knowledge_article AS article
+                 WHERE %(children_filter)s
+            )
+            SELECT (SELECT count(*) || '-' || COALESCE(md5(string_agg(
+                           id || ':' || write_date || ':' || COALESCE(inherited_permission, ''), ',' ORDER BY id)), '')
+                      FROM children),
+                   (SELECT count(*) || '-' || COALESCE(max(grandchild.write_date)::varchar, '')
+                      FROM knowledge_article AS grandchild
+                     WHERE grandchild.parent_id IN (SELECT id FROM children)),
+                   (SELECT COALESCE(md5(string_agg(permission.article_id || ':' || permission.permission, ','
+                                                   ORDER BY permission.article_id)), '')
+                      FROM knowledge_article_permission AS permission
+                     WHERE permission.partner_id = %(partner_id)s
+                       AND permission.article_id IN (SELECT id FROM children)),
+                   (SELECT count(*) || '-' || COALESCE(max(favorite.write_date)::varchar, '')
+                      FROM knowledge_article_favorite AS favorite
+                     WHERE favorite.user_id = %(uid)s)""",
+            children_filter=children_filter,
+            partner_id=partner_id,
+            uid=self.env.uid,
+        ))
+        return ','.join(version)
+
     def get_article_hierarchy(self, exclude_article_ids=False):
         """ Return the `display_name` and `user_has_access` values of the articles that are in the
         hierarchy (parent_path) of the given article from the furthest ancestor to the closest one,
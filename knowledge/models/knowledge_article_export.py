@@ -0,0 +1,361 @@
+# -*- coding: utf-8 -*-
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+
+import json
+import re
+import shutil
+import tempfile
+import zipfile
+
+from lxml import html
+from markupsafe import escape
+from werkzeug.utils import secure_filename
+
+from odoo import api, models, _
+from odoo.fields import Domain
+
+ATTACHMENT_URL_RE = re.compile(r'^/web/(?:image|content)/(\d+)(?:[-/?#]|$)')
+MARKDOWN_ESCAPE_RE = re.compile(r'([\\`*_\[\]])')
+
+
+# ------------------------------------------------------------
+# MARKDOWN CONVERSION
+# ------------------------------------------------------------
+
+def html_to_markdown(content):
+    """ Convert an html fragment (string or lxml element) to Markdown.
+
+    The structure produced by the editor (headings, paragraphs, emphasis,
+    links, images, lists and checklists, quotes, code blocks and tables) is
+    converted, the other elements being replaced by their content. """
+    if isinstance(content, str):
+        if not content.strip():
+            return ''
+        content = html.fragment_fromstring(content, create_parent=True)
+    markdown = _render_children(content, 0)
+    return re.sub(r'\n{3,}', '\n\n', markdown).strip() + '\n'
+
+
+def _render_text(text):
+    if not text or (not text.strip() and '\n' in text):
+        # empty or indentation between blocks
+        return ''
+    return MARKDOWN_ESCAPE_RE.sub(r'\\\1', re.sub(r'\s+', ' ', text))
+
+
+def _render_children(element, depth):
+    parts = [_render_text(element.text)]
+    for child in element:
+        parts.append(_render_element(child, depth))
+        parts.append(_render_text(child.tail))
+    return ''.join(parts)
+
+
+def _render_inline(element, depth=0):
+    return re.sub(r'\s*\n\s*', ' ', _render_children(element, depth)).strip()
+
+
+def _render_element(element, depth):
+    tag = element.tag if isinstance(element.tag, str) else ''
+    if not tag or tag in ('script', 'style', 'head', 'title'):
+        return ''
+    if tag in ('h1', 'h2', 'h3', 'h4', 'h5', 'h6'):
+        return f"\n\n{'#' * int(tag[1])} {_render_inline(element)}\n\n"
+    if tag in ('p', 'div', 'section', 'article'):
+        return f"\n\n{_render_children(element, depth).strip()}\n\n"
+    if tag == 'br':
+        return '  \n'
+    if tag == 'hr':
+        return '\n\n---\n\n'
+    if tag in ('ul', 'ol'):
+        return _render_list(element, depth)
+    if tag == 'blockquote':
+        content = _render_children(element, depth).strip()
+        return '\n\n' + '\n'.join(f'> {line}' if line.strip() else '>' for line in content.split('\n')) + '\n\n'
+    if tag == 'pre':
+        return f"\n\n```\n{element.text_content().strip(chr(10))}\n```\n\n"
+    if tag == 'table':
+        return _render_table(element)
+    if tag == 'img':
+        return f"![{_render_text(element.get('alt', ''))}]({element.get('src', '')})"
+
+    content = _render_children(element, depth)
+    if not content.strip():
+        return content
+    if tag in ('strong', 'b'):
+        return f'**{content.strip()}**'
+    if tag in ('em', 'i'):
+        return f'*{content.strip()}*'
+    if tag in ('s', 'del', 'strike'):
+        return f'~~{content.strip()}~~'
+    if tag == 'code':
+        return f'`{element.text_content()}`'
+    if tag == 'a' and element.get('href'):
+        return f"[{content.strip()}]({element.get('href')})"
+    return content
+
+
+def _render_list(element, depth):
+    lines = []
+    index = int(element.get('start') or 1) if element.get('start', '1').isdigit() else 1
+    is_checklist = 'o_checklist' in element.get('class', '').split()
+    for item in element:
+        if item.tag != 'li':
+            continue
+        if element.tag == 'ol':
+            marker = f'{index}.'
+            index += 1
+        elif is_checklist:
+            marker = '- [x]' if 'o_checked' in item.get('class', '').split() else '- [ ]'
+        else:
+            marker = '-'
+        content = re.sub(r'\n\s*\n', '\n', _render_children(item, depth + 1).strip())
+        if 'oe-nested' in item.get('class', '').split():
+            # nested list of the editor, already indented
+            lines.append(content)
+        else:
+            lines.append(f"{'    ' * depth}{marker} {content}")
+    return '\n' + '\n'.join(lines) + '\n' + ('\n' if not depth else '')
+
+
+def _render_table(element):
+    rows = [
+        [_render_inline(cell).replace('|', r'\|') for cell in row if cell.tag in ('td', 'th')]
+        for row in element.iter('tr')
+    ]
+    rows = [row for row in rows if row]
+    if not rows:
+        return ''
+    width = max(len(row) for row in rows)
+    rows = [row + [''] * (width - len(row)) for row in rows]
+    lines = [
+        f"| {' | '.join(rows[0])} |",
+        f"|{' --- |' * width}",
+        *(f"| {' | '.join(row)} |" for row in rows[1:]),
+    ]
+    return '\n\n' + '\n'.join(lines) + '\n\n'
+
+
+class KnowledgeArticleExport(models.AbstractModel):
+    """ Export of article trees into a zip archive.
+
+    The archive holds an index listing the exported articles as a tree, one
+    HTML or Markdown file per article in ``articles/`` and their files (covers
+    and attachments) in ``files/``. Links between exported articles and to
+    exported files are rewritten into relative links, so that the archive can
+    be browsed offline.
+
+    Articles are walked by batches (see ``_iter_subtree_batches``) and written
+    to the archive as they are converted: the memory used does not depend on
+    the number of exported articles. """
+    _name = 'knowledge.article.export'
+    _description = 'Article Export'
+
+    EXPORT_FORMATS = {'html': 'html', 'markdown': 'md'}
+
+    @api.model
+    def _export_archive(self, articles, fileobj, export_format='html', batch_size=500):
+        """ Write the archive of the given articles and of all their
+        descendants into the given file object.
+
+        :param articles: root articles to export
+        :param fileobj: writable (and seekable) binary file object
+        :param str export_format: 'html' or 'markdown'
+        :return: number of exported articles
+        """
+        if export_format not in self.EXPORT_FORMATS:
+            raise ValueError(f"Invalid export format: {export_format}")
+        exported_count = 0
+        written_attachment_ids = set()
+        ancestor_stack = []
+        with zipfile.ZipFile(fileobj, 'w', zipfile.ZIP_DEFLATED) as archive, \
+                tempfile.SpooledTemporaryFile(max_size=1024 * 1024, mode='w+b') as index:
+            for batch in articles._iter_subtree_batches(
+                    ['name', 'body', 'icon', 'cover_image_id'], batch_size=batch_size):
+                context = self._prepare_batch_context(batch, articles, export_format)
+                for attachment in context['attachments'].values():
+                    if attachment.id not in written_attachment_ids:
+                        self._write_attachment(archive, attachment, context['attachment_paths'][attachment.id])
+                        written_attachment_ids.add(attachment.id)
+                for article in batch:
+                    archive.writestr(
+                        f"articles/{self._get_article_filename(article.id, article.name, export_format)}",
+                        self._render_article(article, context, export_format))
+                    # indentation of the index: number of exported ancestors
+                    ancestor_ids = set(article.parent_path.split('/')[:-2])
+                    while ancestor_stack and ancestor_stack[-1] not in ancestor_ids:
+                        ancestor_stack.pop()
+                    index.write(self._render_index_entry(article, len(ancestor_stack), export_format).encode())
+                    ancestor_stack.append(str(article.id))
+                exported_count += len(batch)
+
+            index.seek(0)
+            extension = self.EXPORT_FORMATS[export_format]
+            with archive.open(f'index.{extension}', 'w') as index_file:
+                index_file.write(self._render_index_header(articles, export_format).encode())
+                shutil.copyfileobj(index, index_file)
+                if export_format == 'html':
+                    index_file.write(b'</body>\n</html>\n')
+        return exported_count
+
+    # ------------------------------------------------------------
+    # BATCH PREPARATION
+    # ------------------------------------------------------------
+
+    @api.model
+    def _prepare_batch_context(self, batch, roots, export_format):
+        """ Fetch what is needed to render the articles of the batch: the
+        exported articles they link to and their attachments. """
+        fragments = {}
+        linked_article_ids = set()
+        referenced_attachment_ids = set()
+        for article in batch:
+            if not article.body:
+                continue
+            fragment = html.fragment_fromstring(article.body, create_parent=True)
+            fragments[article.id] = fragment
+            for element in fragment.iter():
+                if not isinstance(element.tag, str):
+                    continue
+                if element.get('data-res_id', '').isdigit() and \
+                        'o_knowledge_article_link' in element.get('class', '').split():
+                    linked_article_ids.add(int(element.get('data-res_id')))
+                elif element.get('data-embedded') == 'view':
+                    active_id = self._get_embedded_view_props(element).get('context', {}).get('active_id')
+                    if isinstance(active_id, int):
+                        linked_article_ids.add(active_id)
+                for attribute in ('src', 'href'):
+                    match = ATTACHMENT_URL_RE.match(element.get(attribute) or '')
+                    if match:
+                        referenced_attachment_ids.add(int(match.group(1)))
+
+        # linked articles that are part of the export
+        linked_names = {}
+        if linked_article_ids:
+            linked_articles = self.env['knowledge.article'].search_fetch(
+                Domain('id', 'in', list(linked_article_ids)) & Domain('id', 'child_of', roots.ids), ['name'])
+            linked_names = {article.id: article.name for article in linked_articles}
+
+        attachments = self.env['ir.attachment'].search(
+            Domain('type', '=', 'binary') & (
+                Domain('id', 'in', list(referenced_attachment_ids))
+                | (Domain('res_model', '=', 'knowledge.article') & Domain('res_id', 'in', batch.ids))
+            )
+        )
+        # covers are visible to anyone reading the article
+        attachments |= batch.cover_image_id.sudo().attachment_id
+        return {
+            'attachments': {attachment.id: attachment for attachment in attachments},
+            'attachment_paths': {
+                attachment.id: f"files/{attachment.id}-{secure_filename(attachment.name or '') or 'file'}"
+                for attachment in attachments
+            },
+            'base_url': self.get_base_url(),
+            'fragments': fragments,
+            'linked_names': linked_names,
+        }
+
+    @api.model
+    def _get_embedded_view_props(self, element):
+        try:
+            return json.loads(element.get('data-embedded-props') or '{}').get('viewProps', {})
+        except ValueError:
+            return {}
+
+    @api.model
+    def _get_article_filename(self, article_id, name, export_format):
+        return f"{secure_filename(name or '') or 'article'}-{article_id}.{self.EXPORT_FORMATS[export_format]}"
+
+    @api.model
+    def _write_attachment(self, archive, attachment, path):
+        """ Copy the file of the attachment into the archive, from the
+        filestore when possible to avoid loading it in memory. """
+        if attachment.store_fname:
+            archive.write(attachment._full_path(attachment.store_fname), path)
+        else:
+            archive.writestr(path, attachment.raw or b'')
+
+    # ------------------------------------------------------------
+    # RENDERING
+    # ------------------------------------------------------------
+
+    @api.model
+    def _render_article(self, article, context, export_format):
+        """ Return the content of the file of the article, with the links to
+        the exported articles and files made relative to that file. """
+        fragment = context['fragments'].get(article.id)
+        if fragment is None:
+            fragment = html.fragment_fromstring('<div></div>', create_parent=True)
+        self._rewrite_links(fragment, context, export_format)
+        cover = article.cover_image_id.sudo().attachment_id
+        cover_path = context['attachment_paths'].get(cover.id)
+        title = f"{article.icon} {article.name or ''}" if article.icon else (article.name or _('Untitled'))
+
+        if export_format == 'markdown':
+            header = f"# {title}\n\n" + (f"![]({'../' + cover_path})\n\n" if cover_path else '')
+            return header + html_to_markdown(fragment)
+
+        # the text before the first element is unescaped by lxml
+        body = str(escape(fragment.text or '')) + ''.join(html.tostring(child, encoding='unicode') for child in fragment)
+        return (
+            '<!DOCTYPE html>\n<html>\n<head>\n<meta charset="utf-8"/>\n'
+            f'<title>{escape(article.name or "")}</title>\n</head>\n<body>\n'
+            + (f'<img class="o_knowledge_cover" src="../{escape(cover_path)}"/>\n' if cover_path else '')
+            + f'<h1>{escape(title)}</h1>\n{body}\n</body>\n</html>\n'
+        )
+
+    @api.model
+    def _rewrite_links(self, fragment, context, export_format):
+        for element in list(fragment.iter()):
+            if not isinstance(element.tag, str):
+                continue
+            if element.get('data-res_id', '').isdigit() and \
+                    'o_knowledge_article_link' in element.get('class', '').split():
+                element.set('href', self._get_article_link(int(element.get('data-res_id')), context, export_format))
+            elif element.get('data-embedded') == 'view':
+                self._replace_embedded_view(element, context, export_format)
+                continue
+            for attribute in ('src', 'href'):
+                match = ATTACHMENT_URL_RE.match(element.get(attribute) or '')
+                if match and int(match.group(1)) in context['attachment_paths']:
+                    element.set(attribute, '../' + context['attachment_paths'][int(match.group(1))])
+
+    @api.model
+    def _get_article_link(self, article_id, context, export_format):
+        if article_id in context['linked_names']:
+            return self._get_article_filename(article_id, context['linked_names'][article_id], export_format)
+        return f"{context['base_url']}/knowledge/article/{article_id}"
+
+    @api.model
+    def _replace_embedded_view(self, element, context, export_format):
+        """ Embedded views cannot be rendered outside of the web client:
+        replace them by a link to the article whose items they list. """
+        view_props = self._get_embedded_view_props(element)
+        active_id = view_props.get('context', {}).get('active_id')
+        link = html.Element('p')
+        if isinstance(active_id, int):
+            anchor = html.Element('a', href=self._get_article_link(active_id, context, export_format))
+            anchor.text = view_props.get('displayName') or _('Embedded View')
+            link.append(anchor)
+        else:
+            link.text = view_props.get('displayName') or _('Embedded View')
+        link.tail = element.tail
+        element.getparent().replace(element, link)
+
+    @api.model
+    def _render_index_header(self, articles, export_format):
+        title = ', '.join(name or _('Untitled') for name in articles.mapped('name'))
+        if export_format == 'markdown':
+            return f"# {title}\n\n"
+        return (
+            '<!DOCTYPE html>\n<html>\n<head>\n<meta charset="utf-8"/>\n'
+            f'<title>{escape(title)}</title>\n</head>\n<body>\n<h1>{escape(title)}</h1>\n'
+        )
+
+    @api.model
+    def _render_index_entry(self, article, depth, export_format):
+        path = f"articles/{self._get_article_filename(article.id, article.name, export_format)}"
+        name = article.name or _('Untitled')
+        if export_format == 'markdown':
+            return f"{'    ' * depth}- [{_render_text(name)}]({path})\n"
+        return f'<p style="margin-left: {depth * 2}em"><a href="{escape(path)}">{escape(name)}</a></p>\n'
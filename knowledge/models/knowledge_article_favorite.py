@@ -2,6 +2,7 @@
 # Part of Odoo. See LICENSE file for full copyright and licensing details.
 
 from odoo import api, exceptions, fields, models, _
+from odoo.tools import SQL
 
 
 class KnowledgeArticleFavorite(models.Model):
@@ -53,11 +54,29 @@ class KnowledgeArticleFavorite(models.Model):
         return super().write(vals)
 
     def resequence_favorites(self, article_ids):
+        """ Give the favorites of the current user the order of the given
+        articles, in a single query only updating the favorites whose position
+        changed. """
         # Some article may not be accessible by the user anymore. Therefore,
         # to prevent an access error, one will only resequence the favorites
         # related to the articles accessible by the user
-        sequence = 0
+        favorites = self.search([('article_id', 'in', article_ids), ('user_id', '=', self.env.uid)])
+        if not favorites:
+            return
+        favorites.check_access('write')
+        self.flush_model(['article_id', 'sequence', 'user_id'])
         # Keep the same order as in article_ids
-        for article_id in article_ids:
-            self.search([('article_id', '=', article_id), ('user_id', '=', self.env.uid)]).write({"sequence": sequence})
-            sequence += 1
+        updated_ids = [favorite_id for favorite_id, in self.env.execute_query(SQL("""
+            UPDATE knowledge_article_favorite AS favorite
+               SET sequence = ordered.position - 1
+              FROM unnest(%s::int[]) WITH ORDINALITY AS ordered(article_id, position)
+             WHERE favorite.id IN %s
+               AND favorite.article_id = ordered.article_id
+               AND favorite.sequence IS DISTINCT FROM ordered.position - 1
+         RETURNING favorite.id""",
+            [int(article_id) for article_id in article_ids], tuple(favorites.ids),
+        ))]
+        if updated_ids:
+            updated = self.browse(updated_ids)
+            updated.invalidate_recordset(['sequence'])
+            updated.modified(['sequence'])
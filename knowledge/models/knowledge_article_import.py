@@ -0,0 +1,290 @@
+# -*- coding: utf-8 -*-
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+
+import os
+import posixpath
+import re
+import zipfile
+
+from urllib.parse import unquote, urlsplit
+
+from lxml import html
+from markupsafe import escape
+
+from odoo import api, models, _
+from odoo.exceptions import AccessError, UserError
+from odoo.tools import SQL
+
+try:
+    from markdown2 import markdown
+except ImportError:
+    markdown = None
+
+ARTICLE_FORMATS = {'.md': 'markdown', '.markdown': 'markdown', '.html': 'html', '.htm': 'html'}
+# files giving the body of the article of their directory
+INDEX_NAMES = {'index', 'readme'}
+RELATIVE_URL_RE = re.compile(r'''(?:href|src)=["'](?![a-zA-Z][a-zA-Z0-9+.-]*:|/|#)''')
+
+
+class KnowledgeArticleImport(models.AbstractModel):
+    """ Bulk import of trees of Markdown and HTML files as articles.
+
+    The whole tree is read first to allocate the ids of all the articles, so
+    that they are inserted by batches with their final ``parent_path`` and
+    sequences, skipping the logic run by ``create`` for each batch (access,
+    permissions, categories, sequences and members). Stored computed fields
+    (permissions, category, ...) are then computed once, on all the imported
+    articles. Files that are not articles are attached to the articles of
+    their directory, and the relative links of the bodies are resolved in a
+    second pass. """
+    _name = 'knowledge.article.import'
+    _description = 'Article Import'
+
+    @api.model
+    def _import_tree(self, source, parent=None, batch_size=1000):
+        """ Import the files of a directory or of a zip archive as articles:
+
+        - each Markdown (``.md``, ``.markdown``) or HTML (``.html``, ``.htm``)
+          file becomes an article named after the file;
+        - each directory holding such files becomes an article, parent of the
+          articles of its files and subdirectories. Its body is given by a
+          file of the same name next to it (``Folder.md`` for ``Folder/``) or
+          by an ``index`` or ``readme`` file inside it;
+        - other files are attached to the article of their directory.
+
+        Links between the files are turned into links to the articles and to
+        the attachments.
+
+        :param source: path of a directory or of a zip archive, or file object
+          of a zip archive
+        :param parent: article under which the tree is imported, otherwise the
+          top-level articles are created in the workspace
+        :return: the imported top-level articles
+        """
+        Article = self.env['knowledge.article']
+        parent = parent or Article
+        if parent and not parent.has_access('write'):
+            raise AccessError(_("You cannot create an article under articles on which you cannot write"))
+        Article.check_access('create')
+
+        archive = None
+        if isinstance(source, str) and os.path.isdir(source):
+            paths = sorted(
+                os.path.relpath(os.path.join(dirpath, filename), source).replace(os.sep, '/')
+                for dirpath, __, filenames in os.walk(source) for filename in filenames
+            )
+
+            def read(path):
+                with open(os.path.join(source, path), 'rb') as file:
+                    return file.read()
+        else:
+            archive = zipfile.ZipFile(source)
+            paths = sorted(name for name in archive.namelist() if not name.endswith('/'))
+            read = archive.read
+
+        try:
+            nodes, attachment_paths = self._get_import_nodes(paths)
+            if not nodes:
+                return Article
+            roots = self._insert_articles(nodes, parent, read, batch_size)
+
+            # compute the stored computed fields of all the articles at once,
+            # before attaching files to them (access rules rely on them)
+            self.env.invalidate_all()
+            articles = Article.browse(node['id'] for node in nodes.values())
+            for field in Article._get_copy_columns(Article, None, {})[1]:
+                self.env.add_to_compute(field, articles)
+            self.env['knowledge.article.permission']._mark_to_refresh(roots)
+            self.env.flush_all()
+
+            attachment_ids = self._create_attachments(nodes, attachment_paths, parent, read)
+            self._resolve_links(nodes, attachment_ids, batch_size)
+        finally:
+            if archive is not None:
+                archive.close()
+        articles.invalidate_recordset(['body'])
+        return roots
+
+    # ------------------------------------------------------------
+    # TREE
+    # ------------------------------------------------------------
+
+    @api.model
+    def _get_import_nodes(self, paths):
+        """ Return the articles to create from the given file paths, as an
+        ordered dict ``{key: node}`` (parents first, then ordered by name)
+        whose key is the path of the article without extension, and the paths
+        of the other files. """
+        nodes, attachment_paths = {}, []
+        for path in paths:
+            if any(part.startswith('.') or part == '__MACOSX' for part in path.split('/')):
+                continue
+            stem, extension = posixpath.splitext(path)
+            import_format = ARTICLE_FORMATS.get(extension.lower())
+            if not import_format:
+                attachment_paths.append(path)
+                continue
+            directory = posixpath.dirname(path)
+            key = directory if directory and posixpath.basename(stem).lower() in INDEX_NAMES else stem
+            node = nodes.setdefault(key, {'key': key, 'path': None, 'format': None})
+            if not node['path']:
+                node.update(path=path, format=import_format)
+            # directories holding articles are articles too
+            while (key := posixpath.dirname(key)) and key not in nodes:
+                nodes[key] = {'key': key, 'path': None, 'format': None}
+
+        ordered_keys = sorted(nodes, key=lambda key: (key.count('/'), posixpath.dirname(key), key.lower()))
+        return {key: nodes[key] for key in ordered_keys}, attachment_paths
+
+    @api.model
+    def _convert_body(self, content, import_format):
+        content = content.decode('utf-8', errors='replace')
+        if import_format == 'markdown':
+            if markdown is None:
+                raise UserError(_("The markdown2 python library is required to import Markdown files."))
+            return markdown(content, extras=['fenced-code-blocks', 'tables', 'strike'])
+        document = html.document_fromstring(content) if content.strip() else None
+        body = document.find('body') if document is not None else None
+        if body is None:
+            return content
+        # the text before the first element is unescaped by lxml
+        return str(escape(body.text or '')) + ''.join(html.tostring(child, encoding='unicode') for child in body)
+
+    # ------------------------------------------------------------
+    # INSERTION
+    # ------------------------------------------------------------
+
+    @api.model
+    def _insert_articles(self, nodes, parent, read, batch_size):
+        """ Insert the articles of the nodes by batches, with their hierarchy
+        and sequences computed beforehand, and return the top-level ones. """
+        Article = self.env['knowledge.article']
+        self.env.flush_all()
+        new_ids = [new_id for new_id, in self.env.execute_query(SQL(
+            "SELECT nextval(%s) FROM generate_series(1, %s)", f'{Article._table}_id_seq', len(nodes),
+        ))]
+        next_sequence = {None: Article._get_max_sequence_inside_parents(parent.ids).get(parent.id, -1) + 1}
+        for node, new_id in zip(nodes.values(), new_ids):
+            parent_node = nodes.get(posixpath.dirname(node['key']))
+            parent_key = parent_node['key'] if parent_node else None
+            node.update(
+                id=new_id,
+                parent_id=parent_node['id'] if parent_node else parent.id or None,
+                parent_path=f"{parent_node['parent_path'] if parent_node else parent.parent_path or ''}{new_id}/",
+                sequence=next_sequence.get(parent_key, 0),
+            )
+            next_sequence[parent_key] = node['sequence'] + 1
+
+        now = SQL("(now() at time zone 'UTC')")
+        columns = Article._get_copy_columns(Article, None, {
+            'create_uid': SQL("%s", self.env.uid), 'create_date': now,
+            'write_uid': SQL("%s", self.env.uid), 'write_date': now,
+            'id': SQL("imported.id"),
+            'parent_id': SQL("imported.parent_id"),
+            'parent_path': SQL("imported.parent_path"),
+            'name': SQL("imported.name"),
+            'body': SQL("imported.body"),
+            'sequence': SQL("imported.sequence"),
+            # top-level articles of the workspace are open to everyone,
+            # the other ones inherit from their parent
+            'internal_permission': SQL("CASE WHEN imported.parent_id IS NULL THEN 'write' END"),
+        })[0]
+        body_field = Article._fields['body']
+        node_list = list(nodes.values())
+        for start in range(0, len(node_list), batch_size):
+            batch = node_list[start:start + batch_size]
+            bodies = []
+            for node in batch:
+                body = self._convert_body(read(node['path']), node['format']) if node['path'] else ''
+                body = body_field.convert_to_column_insert(body, Article.browse()) or None
+                # only bodies with relative links need the second pass
+                node['has_links'] = bool(body and RELATIVE_URL_RE.search(body))
+                bodies.append(body)
+            self.env.cr.execute(SQL("""
+                INSERT INTO knowledge_article (%(columns)s)
+                     SELECT %(values)s
+                       FROM unnest(%(ids)s::int[], %(parent_ids)s::int[], %(parent_paths)s::varchar[],
+                                   %(names)s::varchar[], %(bodies)s::text[], %(sequences)s::int[])
+                            AS imported(id, parent_id, parent_path, name, body, sequence)""",
+                columns=SQL(", ").join(SQL.identifier(column) for column in columns),
+                values=SQL(", ").join(columns.values()),
+                ids=[node['id'] for node in batch],
+                parent_ids=[node['parent_id'] for node in batch],
+                parent_paths=[node['parent_path'] for node in batch],
+                names=[posixpath.basename(node['key']).replace('_', ' ') for node in batch],
+                bodies=bodies,
+                sequences=[node['sequence'] for node in batch],
+            ))
+        return Article.browse(node['id'] for node in node_list if node['parent_id'] == (parent.id or None))
+
+    @api.model
+    def _create_attachments(self, nodes, attachment_paths, parent, read):
+        """ Attach the files to the article of their directory (or to the
+        parent of the import) and return their ids by path. """
+        Attachment = self.env['ir.attachment']
+        attachment_ids = {}
+        for path in attachment_paths:
+            directory = posixpath.dirname(path)
+            while directory and directory not in nodes:
+                directory = posixpath.dirname(directory)
+            res_id = nodes[directory]['id'] if directory else parent.id
+            # one by one, to keep a single file in memory
+            attachment_ids[path] = Attachment.create({
+                'name': posixpath.basename(path),
+                'raw': read(path),
+                'res_model': 'knowledge.article' if res_id else False,
+                'res_id': res_id or False,
+            }).id
+        return attachment_ids
+
+    @api.model
+    def _resolve_links(self, nodes, attachment_ids, batch_size):
+        """ Replace the relative links of the imported bodies by links to the
+        imported articles and attachments. """
+        article_ids = {}
+        for node in nodes.values():
+            article_ids[node['key']] = node['id']
+            if node['path']:
+                article_ids[node['path']] = node['id']
+        to_resolve = {node['id']: node['path'] for node in nodes.values() if node.get('has_links')}
+        Article = self.env['knowledge.article']
+        body_field = Article._fields['body']
+        resolve_ids = list(to_resolve)
+        for start in range(0, len(resolve_ids), batch_size):
+            bodies = self.env.execute_query(SQL(
+                "SELECT id, body FROM knowledge_article WHERE id IN %s",
+                tuple(resolve_ids[start:start + batch_size]),
+            ))
+            updated = []
+            for article_id, body in bodies:
+                fragment = html.fragment_fromstring(body, create_parent=True)
+                directory = posixpath.dirname(to_resolve[article_id])
+                changed = False
+                for element in fragment.iter('a', 'img'):
+                    attribute = 'src' if element.tag == 'img' else 'href'
+                    url = urlsplit(element.get(attribute) or '')
+                    if url.scheme or url.netloc or not url.path or url.path.startswith('/'):
+                        continue
+                    target = posixpath.normpath(posixpath.join(directory, unquote(url.path)))
+                    if target in article_ids and element.tag == 'a':
+                        element.set('href', f'/knowledge/article/{article_ids[target]}')
+                        element.set('data-res_id', str(article_ids[target]))
+                        element.set('class', f"{element.get('class', '')} o_knowledge_article_link".strip())
+                    elif target in attachment_ids:
+                        route = 'image' if element.tag == 'img' else 'content'
+                        element.set(attribute, f'/web/{route}/{attachment_ids[target]}')
+                    else:
+                        continue
+                    changed = True
+                if changed:
+                    body = str(escape(fragment.text or '')) + ''.join(
+                        html.tostring(child, encoding='unicode') for child in fragment)
+                    # written in SQL, the bodies are sanitized as on insert
+                    updated.append((article_id, body_field.convert_to_column_insert(body, Article.browse())))
+            if updated:
+                updated_ids, updated_bodies = zip(*updated)
+                self.env.cr.execute(SQL("""
+                    UPDATE knowledge_article AS article
+                       SET body = resolved.body
+                      FROM unnest(%s::int[], %s::text[]) AS resolved(id, body)
+                     WHERE article.id = resolved.id""", list(updated_ids), list(updated_bodies)))
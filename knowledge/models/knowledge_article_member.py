@@ -76,11 +76,28 @@ class KnowledgeArticleMember(models.Model):
                       article.display_name)
                 )
 
+    @api.model_create_multi
+    def create(self, vals_list):
+        members = super().create(vals_list)
+        self.env['knowledge.article.permission']._mark_to_refresh(members.article_id)
+        return members
+
     def write(self, vals):
         """ Whatever rights, avoid any attempt at privilege escalation. """
         if ('article_id' in vals or 'partner_id' in vals) and not self.env.is_admin():
             raise AccessError(_("Can not update the article or partner of a member."))
-        return super().write(vals)
+        if {'article_id', 'partner_id', 'permission'} & vals.keys():
+            self.env['knowledge.article.permission']._mark_to_refresh(self.article_id)
+        result = super().write(vals)
+        if 'article_id' in vals:
+            self.env['knowledge.article.permission']._mark_to_refresh(self.article_id)
+        return result
+
+    def unlink(self):
+        articles = self.article_id
+        result = super().unlink()
+        self.env['knowledge.article.permission']._mark_to_refresh(articles)
+        return result
 
     @api.ondelete(at_uninstall=False)
     def _unlink_except_no_writer(self):
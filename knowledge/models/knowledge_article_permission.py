@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+
+from odoo import api, fields, models
+from odoo.tools import SQL
+
+
+class KnowledgeArticlePermission(models.Model):
+    """ Effective member permissions of the articles.
+
+    Materializes, for each article, the permission of every partner that is
+    member of the article or of one of its ancestors (until the first
+    desynchronized article), so that the access checks become simple indexed
+    lookups instead of recursive queries on the whole article tree. The
+    permission of the internal users is already materialized on the article
+    itself (see ``inherited_permission``).
+
+    Rows are never written through the ORM. Writes impacting the memberships
+    (members, parents and desynchronization) mark the articles to refresh, and
+    their subtrees are recomputed in a single query before the table is read
+    (see ``_flush_permissions``) or at the latest before the commit. """
+    _name = 'knowledge.article.permission'
+    _description = 'Article Effective Permission'
+    _log_access = False
+
+    article_id = fields.Many2one(
+        'knowledge.article', 'Article',
+        ondelete='cascade', required=True, readonly=True)
+    partner_id = fields.Many2one(
+        'res.partner', 'Partner',
+        ondelete='cascade', required=True, readonly=True)
+    member_id = fields.Many2one(
+        'knowledge.article.member', 'Source Member',
+        ondelete='cascade', required=True, readonly=True)
+    permission = fields.Selection(
+        [('write', 'Can edit'),
+         ('read', 'Can read'),
+         ('none', 'No access')],
+        required=True, readonly=True)
+
+    _unique_article_partner = models.Constraint(
+        'unique(article_id, partner_id)',
+        "An article can only have one effective permission per partner.",
+    )
+    _partner_permission_idx = models.Index("(partner_id, permission, article_id)")
+
+    def init(self):
+        super().init()
+        # (re)build the whole table: fills it on install and fixes any drift on update
+        self._refresh_permissions()
+
+    # ------------------------------------------------------------
+    # MAINTENANCE
+    # ------------------------------------------------------------
+
+    @api.model
+    def _mark_to_refresh(self, articles):
+        """ Mark the given articles (and their descendants) to be refreshed
+        before the next read of the effective permissions. """
+        article_ids = {article_id for article_id in articles.ids if article_id}
+        if not article_ids:
+            return
+        to_refresh = self.env.cr.precommit.data.setdefault('knowledge.article.permission.refresh', set())
+        if not to_refresh:
+            self.env.cr.precommit.add(self.sudo()._flush_permissions)
+        to_refresh.update(article_ids)
+
+    @api.model
+    def _flush_permissions(self):
+        """ Refresh the subtrees of the articles marked to refresh, if any. """
+        to_refresh = self.env.cr.precommit.data.get('knowledge.article.permission.refresh')
+        if to_refresh:
+            article_ids = list(to_refresh)
+            to_refresh.clear()
+            self._refresh_permissions(article_ids)
+
+    @api.model
+    def _refresh_permissions(self, article_ids=None):
+        """ Recompute the effective permissions of the given articles and of
+        all their descendants, or of all articles if no ids are given.
+
+        The members set on the refreshed articles are propagated downwards,
+        starting from the permissions already stored for the parents of the
+        topmost refreshed articles (which are not impacted by the refresh).
+        Stale rows are deleted and the others are upserted in the same query,
+        leaving untouched the rows that did not change. """
+        self.env['knowledge.article'].flush_model(['parent_id', 'parent_path', 'is_desynchronized'])
+        self.env['knowledge.article.member'].flush_model(['article_id', 'partner_id', 'permission'])
+
+        if article_ids is None:
+            subtree_query = SQL("SELECT id, parent_id, is_desynchronized FROM knowledge_article")
+        else:
+            subtree_query = SQL("""
+                SELECT DISTINCT article.id, article.parent_id, article.is_desynchronized
+                  FROM knowledge_article AS root
+                  JOIN knowledge_article AS article ON article.parent_path LIKE root.parent_path || %s
+                 WHERE root.id IN %s""", '%', tuple(article_ids))
+
+        self.env.cr.execute(SQL("""
+            WITH RECURSIVE
+                subtree AS (%(subtree_query)s),
+                effective AS (
+                    -- members set on the refreshed articles
+                    SELECT subtree.id AS article_id, member.partner_id, member.id AS member_id, member.permission
+                      FROM subtree
+                      JOIN knowledge_article_member AS member ON member.article_id = subtree.id
+
+                     UNION ALL
+
+                    -- permissions inherited from the (up-to-date) parents of the topmost refreshed articles
+                    SELECT subtree.id, perm.partner_id, perm.member_id, perm.permission
+                      FROM subtree
+                      JOIN knowledge_article_permission AS perm ON perm.article_id = subtree.parent_id
+                     WHERE subtree.is_desynchronized IS NOT TRUE
+                       AND NOT EXISTS (SELECT 1 FROM subtree AS parent WHERE parent.id = subtree.parent_id)
+                       AND NOT EXISTS (SELECT 1
+                                         FROM knowledge_article_member AS own
+                                        WHERE own.article_id = subtree.id
+                                          AND own.partner_id = perm.partner_id)
+
+                     UNION ALL
+
+                    -- propagate to the children that are not desynchronized, unless overridden by a member
+                    SELECT child.id, effective.partner_id, effective.member_id, effective.permission
+                      FROM effective
+                      JOIN knowledge_article AS child ON child.parent_id = effective.article_id
+                     WHERE child.is_desynchronized IS NOT TRUE
+                       AND NOT EXISTS (SELECT 1
+                                         FROM knowledge_article_member AS own
+                                        WHERE own.article_id = child.id
+                                          AND own.partner_id = effective.partner_id)
+                ),
+                stale AS (
+                    DELETE FROM knowledge_article_permission AS perm
+                     USING subtree
+                     WHERE perm.article_id = subtree.id
+                       AND NOT EXISTS (SELECT 1
+                                         FROM effective
+                                        WHERE effective.article_id = perm.article_id
+                                          AND effective.partner_id = perm.partner_id)
+                )
+            INSERT INTO knowledge_article_permission (article_id, partner_id, member_id, permission)
+                 SELECT article_id, partner_id, member_id, permission
+                   FROM effective
+            ON CONFLICT (article_id, partner_id) DO UPDATE
+                    SET member_id = EXCLUDED.member_id,
+                        permission = EXCLUDED.permission
+                  WHERE (knowledge_article_permission.member_id, knowledge_article_permission.permission)
+                        IS DISTINCT FROM (EXCLUDED.member_id, EXCLUDED.permission)
+        """, subtree_query=subtree_query))
+        self.invalidate_model()
+
+    # ------------------------------------------------------------
+    # TOOLS
+    # ------------------------------------------------------------
+
+    @api.model
+    def _get_partner_permissions(self, partner, article_ids=None):
+        """ Return the effective member permission of the given partner as a
+        dict ``{article_id: permission}``, for the given articles or for all
+        articles the partner is (directly or through a parent) member of. """
+        self._flush_permissions()
+        where_clause = SQL("partner_id = %s", partner.id)
+        if article_ids is not None:
+            if not article_ids:
+                return {}
+            where_clause = SQL("%s AND article_id IN %s", where_clause, tuple(article_ids))
+        return dict(self.env.execute_query(SQL(
+            "SELECT article_id, permission FROM knowledge_article_permission WHERE %s",
+            where_clause,
+        )))
+
+    @api.model
+    def _search_partner_articles(self, partner, permissions):
+        """ Return a query on the rows of the given partner having one of the
+        given permissions, to be used in a domain on the article's
+        ``effective_permission_ids``. """
+        self._flush_permissions()
+        return self.sudo()._search([
+            ('partner_id', '=', partner.id),
+            ('permission', 'in', permissions),
+        ])
@@ -0,0 +1,263 @@
+# -*- coding: utf-8 -*-
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+
+import zlib
+
+from datetime import timedelta
+
+from odoo import api, fields, models
+from odoo.addons.html_editor.models.diff_utils import apply_patch, generate_patch
+from odoo.tools import SQL
+
+
+class KnowledgeArticleRevision(models.Model):
+    """ Revisions of the versioned html fields of the articles.
+
+    Each revision holds the content of the field before an edition, stored
+    either as a full snapshot or as a patch giving it from the content of the
+    next revision (or from the current content for the last revision), both
+    compressed. A snapshot is stored at least every ``SNAPSHOT_INTERVAL``
+    revisions, so that rebuilding a revision applies a bounded number of
+    patches whatever the length of the history.
+
+    Old revisions are thinned and the history is capped on a schedule (see
+    ``_gc_compact_revisions``). """
+    _name = 'knowledge.article.revision'
+    _description = 'Article Revision'
+    _order = 'revision_id desc'
+    _log_access = False
+
+    SNAPSHOT_INTERVAL = 20
+    HISTORY_SIZE_LIMIT = 300
+    DEFAULT_COMPACT_DAYS = 30
+
+    article_id = fields.Many2one(
+        'knowledge.article', 'Article',
+        ondelete='cascade', required=True, readonly=True)
+    field_name = fields.Char('Field', required=True, readonly=True)
+    revision_id = fields.Integer('Revision', required=True, readonly=True)
+    date = fields.Datetime('Date', required=True, readonly=True)
+    author_id = fields.Many2one('res.users', 'Author', ondelete='set null', readonly=True)
+    is_snapshot = fields.Boolean('Is Snapshot', readonly=True)
+    data = fields.Binary('Compressed Content', attachment=False, prefetch=False, readonly=True)
+
+    _unique_revision = models.Constraint(
+        'unique(article_id, field_name, revision_id)',
+        "A revision can only be stored once per article field.",
+    )
+
+    # ------------------------------------------------------------
+    # STORAGE
+    # ------------------------------------------------------------
+
+    @api.model
+    def _compress(self, content):
+        return zlib.compress(content.encode())
+
+    @api.model
+    def _decompress(self, data):
+        return zlib.decompress(data).decode()
+
+    @api.model
+    def _add_revisions(self, old_contents):
+        """ Store the contents replaced by an edition of the articles, the
+        current contents of the articles being the new ones.
+
+        :param dict old_contents: ``{(article, field_name): old content}`` """
+        vals_list = []
+        for (article, field_name), old_content in old_contents.items():
+            new_content = article[field_name] or ''
+            old_content = old_content or ''
+            if new_content == old_content:
+                continue
+            # snapshot when the previous revisions are all patches, bounding
+            # the number of patches to apply to rebuild any revision
+            previous = self.search_fetch(
+                [('article_id', '=', article.id), ('field_name', '=', field_name)],
+                ['revision_id', 'is_snapshot'], limit=self.SNAPSHOT_INTERVAL - 1)
+            is_snapshot = len(previous) == self.SNAPSHOT_INTERVAL - 1 and not any(previous.mapped('is_snapshot'))
+            vals_list.append({
+                'article_id': article.id,
+                'field_name': field_name,
+                'revision_id': (previous[:1].revision_id or 0) + 1,
+                'date': self.env.cr.now(),
+                'author_id': self.env.uid,
+                'is_snapshot': is_snapshot,
+                'data': self._compress(old_content if is_snapshot else generate_patch(new_content, old_content)),
+            })
+        return self.create(vals_list)
+
+    @api.model
+    def _encode_revisions(self, article, field_name, revisions):
+        """ Return the values to store the given revisions, given as a list of
+        dicts with their content, newest first, the current content of the
+        article being the next one of the newest revision. """
+        vals_list = []
+        next_content = article[field_name] or ''
+        for revision in revisions:
+            vals_list.append({
+                'article_id': article.id,
+                'field_name': field_name,
+                'revision_id': revision['revision_id'],
+                'date': revision['date'],
+                'author_id': revision['author_id'],
+                'content': revision['content'],
+                'next_content': next_content,
+            })
+            next_content = revision['content']
+        # snapshots are placed from the oldest revision, as when storing them one by one
+        patches_count = 0
+        for vals in reversed(vals_list):
+            content, next_content = vals.pop('content'), vals.pop('next_content')
+            vals['is_snapshot'] = patches_count == self.SNAPSHOT_INTERVAL - 1
+            vals['data'] = self._compress(content if vals['is_snapshot'] else generate_patch(next_content, content))
+            patches_count = 0 if vals['is_snapshot'] else patches_count + 1
+        return vals_list
+
+    @api.model
+    def _import_legacy_history(self, articles):
+        """ Move the revisions stored in the ``html_field_history`` of the
+        given articles (see ``html.field.history.mixin``) into the store. """
+        articles = articles.filtered('html_field_history')
+        if not articles:
+            return
+        vals_list = []
+        users = self.env['res.users'].sudo().with_context(active_test=False)
+        for article in articles:
+            for field_name, legacy_revisions in article.html_field_history.items():
+                content = article[field_name] or ''
+                revisions = []
+                for legacy_revision in legacy_revisions:
+                    content = apply_patch(content, legacy_revision['patch'])
+                    revisions.append({
+                        'revision_id': legacy_revision['revision_id'],
+                        'date': fields.Datetime.to_datetime(legacy_revision['create_date'][:19].replace('T', ' ')),
+                        'author_id': users.browse(legacy_revision.get('create_uid')).exists().id,
+                        'content': content,
+                    })
+                vals_list += self._encode_revisions(article, field_name, revisions)
+        self.create(vals_list)
+        self.env.cr.execute(SQL(
+            "UPDATE knowledge_article SET html_field_history = NULL WHERE id IN %s",
+            tuple(articles.ids),
+        ))
+        articles.invalidate_recordset(['html_field_history', 'html_field_history_metadata'])
+
+    # ------------------------------------------------------------
+    # RECONSTRUCTION
+    # ------------------------------------------------------------
+
+    @api.model
+    def _get_content(self, article, field_name, revision_id):
+        """ Rebuild the content of the field before the given revision, from
+        the closest snapshot or from the current content. """
+        self.flush_model()
+        rows = self.env.execute_query(SQL("""
+            SELECT is_snapshot, data
+              FROM knowledge_article_revision
+             WHERE article_id = %(article_id)s
+               AND field_name = %(field_name)s
+               AND revision_id >= %(revision_id)s
+               AND revision_id <= COALESCE((
+                       SELECT min(revision_id)
+                         FROM knowledge_article_revision
+                        WHERE article_id = %(article_id)s
+                          AND field_name = %(field_name)s
+                          AND revision_id >= %(revision_id)s
+                          AND is_snapshot
+                   ), %(max_int)s)
+          ORDER BY revision_id DESC""",
+            article_id=article.id, field_name=field_name, revision_id=revision_id, max_int=2 ** 31 - 1,
+        ))
+        content = article[field_name] or ''
+        for is_snapshot, data in rows:
+            content = self._decompress(data) if is_snapshot else apply_patch(content, self._decompress(data))
+        return content
+
+    @api.model
+    def _get_metadata(self, article, field_name, before_revision_id=None, limit=None):
+        """ Return the metadata of the revisions of the field, newest first,
+        in the format of ``html_field_history_metadata``. Revisions can be
+        loaded by pages, giving the last revision of the previous page. """
+        domain = [('article_id', '=', article.id), ('field_name', '=', field_name)]
+        if before_revision_id:
+            domain.append(('revision_id', '<', before_revision_id))
+        revisions = self.search_fetch(domain, ['revision_id', 'date', 'author_id'], limit=limit)
+        return [{
+            'revision_id': revision.revision_id,
+            'create_date': revision.date.isoformat(),
+            'create_uid': revision.author_id.id,
+            'create_user_name': revision.author_id.name,
+        } for revision in revisions]
+
+    # ------------------------------------------------------------
+    # COMPACTION
+    # ------------------------------------------------------------
+
+    @api.autovacuum
+    def _gc_compact_revisions(self):
+        """ Import the legacy histories, then thin the revisions older than
+        ``knowledge.article_revision_compact_days`` to one per day and keep at
+        most ``HISTORY_SIZE_LIMIT`` revisions per article field. """
+        Article = self.env['knowledge.article'].with_context(active_test=False)
+        legacy_ids = [article_id for article_id, in self.env.execute_query(SQL(
+            "SELECT id FROM knowledge_article WHERE html_field_history IS NOT NULL LIMIT 100"))]
+        self._import_legacy_history(Article.browse(legacy_ids))
+
+        compact_days = self.env['ir.config_parameter'].sudo().get_param('knowledge.article_revision_compact_days')
+        try:
+            compact_days = int(compact_days)
+        except (TypeError, ValueError):
+            compact_days = self.DEFAULT_COMPACT_DAYS
+        cutoff = self.env.cr.now() - timedelta(days=compact_days)
+
+        self.flush_model()
+        to_compact = self.env.execute_query(SQL("""
+            SELECT article_id, field_name
+              FROM knowledge_article_revision
+          GROUP BY article_id, field_name
+            HAVING count(*) > %(limit)s
+                OR count(*) FILTER (WHERE date < %(cutoff)s) > count(DISTINCT date::date) FILTER (WHERE date < %(cutoff)s)
+             LIMIT 100""",
+            limit=self.HISTORY_SIZE_LIMIT, cutoff=cutoff,
+        ))
+        for article_id, field_name in to_compact:
+            self._compact(Article.browse(article_id), field_name, cutoff)
+
+    @api.model
+    def _compact(self, article, field_name, cutoff):
+        """ Drop the revisions beyond the size limit and all but the newest
+        revision of each day before ``cutoff``, then encode the remaining
+        ones again. """
+        revisions = self.search_fetch(
+            [('article_id', '=', article.id), ('field_name', '=', field_name)],
+            ['revision_id', 'date', 'author_id', 'is_snapshot', 'data'])
+        kept_days = set()
+        to_keep = self.browse()
+        for revision in revisions[:self.HISTORY_SIZE_LIMIT]:
+            if revision.date < cutoff:
+                if revision.date.date() in kept_days:
+                    continue
+                kept_days.add(revision.date.date())
+            to_keep += revision
+        if to_keep == revisions:
+            return
+
+        # rebuild all the contents down to the oldest kept revision, newest first
+        contents = {}
+        content = article[field_name] or ''
+        for revision in revisions:
+            if revision.revision_id < to_keep[-1].revision_id:
+                break
+            data = self._decompress(revision.data)
+            content = data if revision.is_snapshot else apply_patch(content, data)
+            contents[revision] = content
+
+        vals_list = self._encode_revisions(article, field_name, [{
+            'revision_id': revision.revision_id,
+            'date': revision.date,
+            'author_id': revision.author_id.id,
+            'content': contents[revision],
+        } for revision in to_keep])
+        revisions.unlink()
+        self.create(vals_list)
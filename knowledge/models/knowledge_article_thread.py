@@ -2,7 +2,7 @@
 # Part of Odoo. See LICENSE file for full copyright and licensing details.
 
 from odoo import api, fields, models, _
-from odoo.tools import html2plaintext
+from odoo.tools import SQL, html2plaintext
 
 
 class KnowledgeArticleThread(models.Model):
@@ -62,6 +62,70 @@ class KnowledgeArticleThread(models.Model):
         return super().write(vals)
 
 
+# ==========================================================================
+#                              MESSAGES LOADING
+# ==========================================================================
+
+    def _get_comment_messages_domain(self):
+        return [
+            ("res_id", "in", self.ids),
+            ("model", "=", self._name),
+            ("message_type", "=", "comment"),  # only user input
+            ("subtype_id", "=", self.env.ref('mail.mt_comment').id),  # comments in threads are sent as notes
+            ("is_internal", "=", False),  # respect internal users only flag
+        ]
+
+    def _fetch_comment_messages(self, limit=30):
+        """ Return the last ``limit`` comments of each thread, newest first,
+        fetched in a single query ranking the accessible messages per thread. """
+        if not self:
+            return self.env['mail.message']
+        Message = self.env['mail.message']
+        query = Message._search(self._get_comment_messages_domain())
+        ranked = query.select(
+            SQL.identifier('mail_message', 'id'),
+            SQL("ROW_NUMBER() OVER (PARTITION BY %s ORDER BY %s DESC) AS rank",
+                SQL.identifier('mail_message', 'res_id'), SQL.identifier('mail_message', 'id')),
+        )
+        message_ids = [message_id for message_id, in self.env.execute_query(SQL(
+            "SELECT id FROM (%s) AS ranked WHERE rank <= %s ORDER BY id DESC", ranked, limit,
+        ))]
+        return Message.browse(message_ids)
+
+    def _get_comment_messages_version(self):
+        """ Return a key changing whenever the comments of the threads (or
+        the data sent along with them) may have changed: posted, edited or
+        deleted messages, reactions, attachments, stars of the current user
+        and changes of the threads and of their article. """
+        if not self:
+            return ''
+        self.env.flush_all()
+        [version] = self.env.execute_query(SQL("""
+            SELECT (SELECT max(article.write_date)
+                      FROM knowledge_article AS article
+                      JOIN knowledge_article_thread AS thread ON thread.article_id = article.id
+                     WHERE thread.id IN %(thread_ids)s),
+                   (SELECT max(write_date) FROM knowledge_article_thread WHERE id IN %(thread_ids)s),
+                   count(message.id), max(message.id), max(message.write_date),
+                   (SELECT count(*) || '-' || COALESCE(max(reaction.id), 0)
+                      FROM mail_message_reaction AS reaction
+                      JOIN mail_message AS reacted ON reacted.id = reaction.message_id
+                     WHERE reacted.model = %(model)s AND reacted.res_id IN %(thread_ids)s),
+                   (SELECT count(*)
+                      FROM message_attachment_rel AS rel
+                      JOIN mail_message AS attached ON attached.id = rel.message_id
+                     WHERE attached.model = %(model)s AND attached.res_id IN %(thread_ids)s),
+                   (SELECT count(*)
+                      FROM mail_message_res_partner_starred_rel AS starred
+                      JOIN mail_message AS starred_message ON starred_message.id = starred.mail_message_id
+                     WHERE starred.res_partner_id = %(partner_id)s
+                       AND starred_message.model = %(model)s AND starred_message.res_id IN %(thread_ids)s)
+              FROM mail_message AS message
+             WHERE message.model = %(model)s AND message.res_id IN %(thread_ids)s""",
+            thread_ids=tuple(self.ids), model=self._name, partner_id=self.env.user.partner_id.id,
+        ))
+        return ':'.join(str(value) for value in version)
+
 # ==========================================================================
 #                              THREAD OVERRIDES
 # ==========================================================================
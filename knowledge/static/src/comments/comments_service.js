@@ -214,20 +214,35 @@ export const knowledgeCommentsService = {
             let error;
             let result;
             try {
-                result = await rpc("/knowledge/threads/messages", {
-                    thread_model: "knowledge.article.thread",
-                    thread_ids,
+                // GET request: the browser revalidates its cached response
+                // with the ETag, the server answering 304 if nothing changed
+                const params = new URLSearchParams({
+                    article_id: this.commentsState.articleId,
+                    thread_ids: thread_ids.sort((a, b) => a - b).join(","),
                 });
+                const response = await browser.fetch(`/knowledge/threads/messages?${params}`);
+                if (!response.ok) {
+                    throw new Error(response.statusText);
+                }
+                result = await response.json();
             } catch (e) {
                 error = e;
             }
+            if (!error && this.loadingId === batch.loadingId) {
+                // messages of all threads share the same records (authors,
+                // attachments, ...), insert them once
+                this.services["mail.store"].insert(result.data, { html: true });
+            }
             // thread_id is a number, not a string (used for backend)
             for (const thread_id in deferredPromises) {
                 for (const deferred of deferredPromises[thread_id]) {
                     if (error) {
                         deferred.reject(error);
                     } else {
-                        deferred.resolve(result[thread_id]);
+                        deferred.resolve({
+                            data: {},
+                            messages: result.threads[thread_id]?.messages || [],
+                        });
                     }
                 }
             }
@@ -3,9 +3,13 @@
 
 from . import test_knowledge_article_business
 from . import test_knowledge_article_constraints
+from . import test_knowledge_article_export
 from . import test_knowledge_article_full_text_search
+from . import test_knowledge_article_import
 from . import test_knowledge_article_internals
+from . import test_knowledge_article_permission_table
 from . import test_knowledge_article_permissions
+from . import test_knowledge_article_revision
 from . import test_knowledge_article_sequence
 from . import test_knowledge_article_stage
 from . import test_knowledge_article_template
@@ -174,6 +174,75 @@ class TestKnowledgeArticleBusiness(KnowledgeCommonBusinessCase):
         self.assertListEqual(sidebar_articles['favorite_ids'], [playground_root.id])
         self.assertListEqual([article['id'] for article in sidebar_articles['articles']], (playground_children + playground_root).ids)
 
+    @users('employee')
+    def test_article_get_sidebar_children(self):
+        """ Testing the lazy loading of the sidebar, window by window. """
+        playground_root = self.article_workspace.with_env(self.env)
+        playground_children = self.workspace_children.with_env(self.env).sorted(lambda article: (article.sequence, article.id))
+        shared_root = self.article_shared.with_env(self.env)
+        Article = self.env['knowledge.article']
+
+        result = Article.get_sidebar_children(['workspace', 'shared', 'private', playground_root.id], limit=1)
+        self.assertEqual(result['windows'], {
+            'workspace': {'article_ids': playground_root.ids, 'next_cursor': False},
+            'shared': {'article_ids': shared_root.ids, 'next_cursor': False},
+            'private': {'article_ids': [], 'next_cursor': False},
+            str(playground_root.id): {
+                'article_ids': playground_children[0].ids,
+                'next_cursor': [playground_children[0].sequence, playground_children[0].id],
+            },
+        })
+        articles_data = {article['id']: article for article in result['articles']}
+        self.assertEqual(articles_data[playground_root.id]['child_count'], 2)
+        self.assertTrue(articles_data[playground_root.id]['has_article_children'])
+        self.assertFalse(articles_data[playground_children[0].id]['has_article_children'])
+
+        # next window of the children, from the cursor
+        result = Article.get_sidebar_children(
+            [playground_root.id],
+            cursors={playground_root.id: [playground_children[0].sequence, playground_children[0].id]},
+            limit=1)
+        self.assertEqual(result['windows'], {
+            str(playground_root.id): {'article_ids': playground_children[1].ids, 'next_cursor': False},
+        })
+
+        # children without access are not counted nor returned
+        playground_children[1].sudo()._add_members(self.partner_employee, 'none')
+        result = Article.get_sidebar_children([playground_root.id, 'workspace'])
+        self.assertEqual(result['windows'][str(playground_root.id)]['article_ids'], playground_children[0].ids)
+        self.assertEqual(
+            next(article for article in result['articles'] if article['id'] == playground_root.id)['child_count'], 1)
+
+    @users('employee')
+    def test_article_get_sidebar_children_version(self):
+        """ The version of the sidebar windows changes with their content. """
+        playground_root = self.article_workspace.with_env(self.env)
+        playground_children = self.workspace_children.with_env(self.env)
+        Article = self.env['knowledge.article']
+        parents = ['workspace', playground_root.id]
+
+        version = Article._get_sidebar_children_version(parents)
+        self.assertEqual(Article._get_sidebar_children_version(parents), version)
+
+        # new child
+        Article.article_create(title='New Child', parent_id=playground_root.id)
+        self.assertNotEqual(Article._get_sidebar_children_version(parents), version)
+        version = Article._get_sidebar_children_version(parents)
+
+        # new favorite
+        playground_children[0].action_toggle_favorite()
+        self.assertNotEqual(Article._get_sidebar_children_version(parents), version)
+        version = Article._get_sidebar_children_version(parents)
+
+        # lost access to a child
+        playground_children[1].sudo()._add_members(self.partner_employee, 'none')
+        self.assertNotEqual(Article._get_sidebar_children_version(parents), version)
+        version = Article._get_sidebar_children_version(parents)
+
+        # articles of the other users and sections are not part of the version
+        Article.with_user(self.user_employee2).article_create(title='Private', is_private=True)
+        self.assertEqual(Article._get_sidebar_children_version(parents), version)
+
     @mute_logger('odoo.addons.base.models.ir_rule', 'odoo.addons.mail.models.mail_mail', 'odoo.models.unlink', 'odoo.tests')
     @users('employee')
     def test_article_invite_members(self):
@@ -941,6 +1010,137 @@ class TestKnowledgeArticleCopy(KnowledgeCommonBusinessCase):
             "Check descendants name is also updated (not only direct children)"
         )
 
+    @mute_logger('odoo.addons.base.models.ir_model', 'odoo.addons.base.models.ir_rule')
+    @users('admin')
+    def test_article_duplicate_subtree(self):
+        """ Test the values of the duplicated subtrees: hierarchy, members,
+        item stages and references to the copied articles in the bodies. """
+        root = self.env['knowledge.article'].create({
+            'name': 'Project',
+            'internal_permission': 'none',
+            'article_member_ids': [
+                (0, 0, {'partner_id': self.env.user.partner_id.id, 'permission': 'write'}),
+                (0, 0, {'partner_id': self.partner_employee.id, 'permission': 'read'}),
+            ],
+            'article_properties_definition': [{'name': 'prop', 'type': 'char', 'string': 'Prop'}],
+        })
+        child = self.env['knowledge.article'].create({
+            'name': 'Specifications',
+            'parent_id': root.id,
+            'is_desynchronized': True,
+            'internal_permission': 'write',
+            'article_member_ids': [(0, 0, {'partner_id': self.partner_employee2.id, 'permission': 'none'})],
+        })
+        root.create_default_item_stages()
+        stages = self.env['knowledge.article.stage'].search([('parent_id', '=', root.id)])
+        item = self.env['knowledge.article'].create({
+            'name': 'Task',
+            'parent_id': root.id,
+            'is_article_item': True,
+            'stage_id': stages[-1].id,
+            'article_properties': {'prop': 'value'},
+        })
+        grandchild = self.env['knowledge.article'].create({'name': 'Details', 'parent_id': child.id})
+        grandchild.write({
+            'body': f'<p><a class="o_knowledge_article_link" href="/knowledge/article/{child.id}" '
+                    f'data-res_id="{child.id}">Specifications</a></p>',
+        })
+        root.action_toggle_favorite()
+
+        duplicate = root.copy_batch()
+        self.assertEqual(duplicate.name, 'Project (copy)')
+        self.assertEqual(duplicate.parent_path, f'{duplicate.id}/')
+        self.assertMembers(duplicate, 'none', {self.env.user.partner_id: 'write', self.partner_employee: 'read'})
+        self.assertFalse(duplicate.favorite_ids, 'Favorites should not be copied')
+        self.assertEqual(duplicate.category, root.category)
+
+        child_copy = duplicate.child_ids.filtered(lambda article: not article.is_article_item)
+        self.assertEqual(child_copy.name, 'Specifications')
+        self.assertTrue(child_copy.is_desynchronized)
+        self.assertMembers(child_copy, 'write', {self.partner_employee2: 'none'})
+        self.assertEqual(child_copy.root_article_id, duplicate)
+
+        item_copy = duplicate.child_ids.filtered('is_article_item')
+        stages_copy = self.env['knowledge.article.stage'].search([('parent_id', '=', duplicate.id)])
+        self.assertEqual(stages_copy.mapped('name'), stages.mapped('name'))
+        self.assertEqual(item_copy.stage_id, stages_copy[-1])
+        self.assertEqual(item_copy.article_properties, item.article_properties)
+
+        grandchild_copy = child_copy.child_ids
+        self.assertEqual(grandchild_copy.parent_path, f'{duplicate.id}/{child_copy.id}/{grandchild_copy.id}/')
+        self.assertEqual(grandchild_copy.inherited_permission, 'write')
+        self.assertEqual(grandchild_copy.inherited_permission_parent_id, child_copy)
+        link = html.fragment_fromstring(grandchild_copy.body).find('.//a')
+        self.assertEqual(link.get('data-res_id'), str(child_copy.id))
+        self.assertEqual(link.get('href'), f'/knowledge/article/{child_copy.id}')
+
+        # effective permissions of the copies match the ones of the originals
+        self.assertEqual(
+            grandchild_copy.with_user(self.user_employee2).user_has_access,
+            grandchild.with_user(self.user_employee2).user_has_access)
+        self.assertEqual(
+            child_copy.with_user(self.user_employee).user_permission,
+            child.with_user(self.user_employee).user_permission)
+
+    @users('employee')
+    def test_article_duplicate_subtree_overrides(self):
+        """ Overrides of ``create`` or ``copy_data`` in modules extending the
+        copied models make the duplication go through them. """
+        root = self.env['knowledge.article'].create({'name': 'Root'})
+        self.env['knowledge.article'].create({'name': 'Child', 'parent_id': root.id})
+        Article = self.env.registry['knowledge.article']
+        with patch.object(Article, '_copy_subtrees', side_effect=AssertionError), \
+             patch.object(Article, '_has_copy_overrides', return_value=True):
+            duplicate = root.copy_batch()
+        self.assertEqual(duplicate.name, 'Root (copy)')
+        self.assertEqual(duplicate.child_ids.name, 'Child')
+
+    @users('employee')
+    def test_article_duplicate_subtree_escaped_body(self):
+        """ Escaped markup at the start of a remapped body stays escaped. """
+        root = self.env['knowledge.article'].create({'name': 'Root'})
+        child = self.env['knowledge.article'].create({'name': 'Child', 'parent_id': root.id})
+        child.write({
+            'body': f'&lt;img src=x onerror=alert(1)&gt;<a class="o_knowledge_article_link" '
+                    f'href="/knowledge/article/{root.id}" data-res_id="{root.id}">Root</a>',
+        })
+
+        duplicate = root.copy_batch()
+        body = duplicate.child_ids.body
+        self.assertIn('&lt;img src=x onerror=alert(1)&gt;', body)
+        self.assertNotIn('<img', body)
+        self.assertEqual(html.fragment_fromstring(body, create_parent=True).find('.//a').get('data-res_id'), str(duplicate.id))
+
+    @mute_logger('odoo.addons.base.models.ir_model', 'odoo.addons.base.models.ir_rule')
+    @users('employee')
+    def test_article_duplicate_subtree_employee(self):
+        """ Employees cannot create members but duplicating their articles
+        copies the members, and copies moved to the workspace follow the rules
+        of ``create``. """
+        root = self.env['knowledge.article'].sudo().create({
+            'name': 'Team',
+            'internal_permission': 'none',
+            'article_member_ids': [
+                (0, 0, {'partner_id': self.partner_employee.id, 'permission': 'write'}),
+                (0, 0, {'partner_id': self.partner_employee2.id, 'permission': 'read'}),
+            ],
+        }).with_env(self.env)
+        child = self.env['knowledge.article'].create({'name': 'Notes', 'parent_id': root.id})
+
+        duplicate = root.copy_batch()
+        self.assertMembers(duplicate, 'none', {self.partner_employee: 'write', self.partner_employee2: 'read'})
+        self.assertEqual(duplicate.create_uid, self.env.user)
+        self.assertEqual(duplicate.last_edition_uid, self.env.user)
+
+        # a child copied to the workspace gets the permission forced by create
+        workspace_copy = child.copy_batch(default={'parent_id': False})
+        self.assertFalse(workspace_copy.parent_id)
+        self.assertEqual(workspace_copy.internal_permission, 'write')
+
+        # the target parent must be writable
+        with self.assertRaises(exceptions.AccessError):
+            child.copy_batch(default={'parent_id': self.article_shared.id})
+
     @mute_logger('odoo.addons.base.models.ir_model', 'odoo.addons.base.models.ir_rule')
     @users('employee')
     def test_article_make_private_copy(self):
@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+
+import io
+import json
+import logging
+import time
+import tracemalloc
+import zipfile
+
+from markupsafe import escape
+
+from odoo.addons.knowledge.models.knowledge_article_export import html_to_markdown
+from odoo.addons.knowledge.tests.common import KnowledgeCommon
+from odoo.tests.common import tagged, users
+
+_logger = logging.getLogger(__name__)
+
+
+@tagged('knowledge_internals')
+class TestKnowledgeArticleExport(KnowledgeCommon):
+    """ Check the archives of the exported article trees. """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        Article = cls.env['knowledge.article']
+        cls.root = Article.create({'internal_permission': 'write', 'name': 'Handbook'})
+        cls.child = Article.create({'name': 'Onboarding', 'parent_id': cls.root.id})
+        cls.grandchild = Article.create({'name': 'First Day', 'parent_id': cls.child.id})
+        cls.outside = Article.create({'internal_permission': 'write', 'name': 'Outside'})
+        cls.image = cls.env['ir.attachment'].create({
+            'name': 'diagram.png',
+            'raw': b'image content',
+            'res_model': 'knowledge.article',
+            'res_id': cls.child.id,
+        })
+        embedded_props = escape(json.dumps({'viewProps': {
+            'displayName': 'Tasks',
+            'context': {'active_id': cls.grandchild.id, 'default_is_article_item': True},
+        }}))
+        cls.root.write({
+            'body': f'<p>See <a class="o_knowledge_article_link" data-res_id="{cls.child.id}" '
+                    f'href="/knowledge/article/{cls.child.id}">Onboarding</a> and '
+                    f'<a class="o_knowledge_article_link" data-res_id="{cls.outside.id}" '
+                    f'href="/knowledge/article/{cls.outside.id}">Outside</a></p>'
+                    f'<div data-embedded="view" data-embedded-props="{embedded_props}"></div>',
+            'cover_image_id': cls._create_cover(cls).id,
+        })
+        cls.child.write({
+            'body': f'<h2>Welcome</h2><ul><li>Badge</li><li>Laptop</li></ul>'
+                    f'<p><img src="/web/image/{cls.image.id}?unique=1"/></p>'
+                    f'<table><tr><th>Who</th><th>When</th></tr><tr><td>HR</td><td>9:00</td></tr></table>',
+        })
+
+    def _export(self, articles, export_format, batch_size=2):
+        fileobj = io.BytesIO()
+        count = self.env['knowledge.article.export']._export_archive(
+            articles, fileobj, export_format, batch_size=batch_size)
+        return count, zipfile.ZipFile(fileobj)
+
+    @users('employee')
+    def test_export_html(self):
+        count, archive = self._export(self.root.with_env(self.env), 'html')
+        self.assertEqual(count, 3, 'Articles outside of the tree should not be exported')
+        root_file = f'articles/Handbook-{self.root.id}.html'
+        child_file = f'Onboarding-{self.child.id}.html'
+        image_file = f'files/{self.image.id}-diagram.png'
+        names = set(archive.namelist())
+        self.assertTrue({'index.html', root_file, f'articles/{child_file}', image_file} <= names)
+        self.assertEqual(archive.read(image_file), b'image content')
+
+        root_content = archive.read(root_file).decode()
+        self.assertIn(f'href="{child_file}"', root_content, 'Links to exported articles should be relative')
+        self.assertIn(f'/knowledge/article/{self.outside.id}', root_content)
+        self.assertIn(f'href="First_Day-{self.grandchild.id}.html">Tasks</a>', root_content,
+                      'Embedded views should be replaced by a link to their article')
+        self.assertNotIn('data-embedded-props', root_content)
+        self.assertIn('<img class="o_knowledge_cover" src="../files/', root_content)
+        self.assertIn(f'src="../{image_file}"', archive.read(f'articles/{child_file}').decode())
+
+        index = archive.read('index.html').decode()
+        self.assertLess(index.index('Handbook'), index.index('Onboarding'))
+        self.assertIn(f'<p style="margin-left: 4em"><a href="articles/First_Day-{self.grandchild.id}.html">', index)
+
+    @users('employee')
+    def test_export_html_escaped_text(self):
+        """ Escaped markup at the start of a body stays escaped in the file. """
+        grandchild = self.grandchild.with_env(self.env)
+        grandchild.body = '&lt;script&gt;alert(1)&lt;/script&gt;<p>Details</p>'
+        __, archive = self._export(grandchild, 'html')
+        content = archive.read(f'articles/First_Day-{grandchild.id}.html').decode()
+        self.assertIn('&lt;script&gt;alert(1)&lt;/script&gt;<p>Details</p>', content)
+        self.assertNotIn('<script>', content)
+
+    @users('employee')
+    def test_export_markdown(self):
+        count, archive = self._export(self.root.with_env(self.env), 'markdown')
+        self.assertEqual(count, 3)
+        self.assertEqual(archive.read(f'articles/Onboarding-{self.child.id}.md').decode(), (
+            '# Onboarding\n\n'
+            '## Welcome\n\n'
+            '- Badge\n'
+            '- Laptop\n\n'
+            f'![](../files/{self.image.id}-diagram.png)\n\n'
+            '| Who | When |\n'
+            '| --- | --- |\n'
+            '| HR | 9:00 |\n'
+        ))
+        self.assertEqual(archive.read('index.md').decode(), (
+            '# Handbook\n\n'
+            f'- [Handbook](articles/Handbook-{self.root.id}.md)\n'
+            f'    - [Onboarding](articles/Onboarding-{self.child.id}.md)\n'
+            f'        - [First Day](articles/First_Day-{self.grandchild.id}.md)\n'
+        ))
+
+    def test_html_to_markdown(self):
+        self.assertEqual(html_to_markdown(
+            '<p>Some <strong>bold</strong>, <em>italic</em> and <code>a_b</code> text_with_marks</p>'
+            '<ol><li>One<ul><li>Nested</li></ul></li><li>Two</li></ol>'
+            '<ul class="o_checklist"><li class="o_checked">Done</li><li>Todo</li></ul>'
+            '<blockquote>Quote<br/>on two lines</blockquote>'
+            '<pre>code\n  block</pre><hr/>'
+        ), (
+            'Some **bold**, *italic* and `a_b` text\\_with\\_marks\n\n'
+            '1. One\n'
+            '    - Nested\n'
+            '2. Two\n\n'
+            '- [x] Done\n'
+            '- [ ] Todo\n\n'
+            '> Quote  \n'
+            '> on two lines\n\n'
+            '```\ncode\n  block\n```\n\n'
+            '---\n'
+        ))
+
+
+@tagged('post_install', '-at_install', '-standard', 'knowledge_benchmark')
+class TestKnowledgeArticleExportBenchmark(KnowledgeCommon):
+    """ Time the export of a large tree (ROOTS chains of DEPTH articles) and
+    measure the peak memory used. Not run by default, use
+    ``--test-tags knowledge_benchmark``. """
+    ROOTS = 500
+    DEPTH = 100
+
+    def test_export_throughput(self):
+        Article = self.env['knowledge.article'].with_context(tracking_disable=True, mail_create_nolog=True)
+        workspace = Article.create({'internal_permission': 'write', 'name': 'Workspace'})
+        body = '<h2>Section</h2><p>%s</p><ul><li>One</li><li>Two</li></ul>' % ('lorem ipsum dolor sit amet ' * 40)
+        parents = Article.create([{'name': f'Root {index}', 'parent_id': workspace.id, 'body': body}
+                                  for index in range(self.ROOTS)])
+        for level in range(1, self.DEPTH):
+            parents = Article.create([{'name': f'Article {index}-{level}', 'parent_id': parent.id, 'body': body}
+                                      for index, parent in enumerate(parents)])
+        self.env.flush_all()
+        self.env.invalidate_all()
+
+        for export_format in ('html', 'markdown'):
+            fileobj = io.BytesIO()
+            tracemalloc.start()
+            start = time.perf_counter()
+            count = self.env['knowledge.article.export']._export_archive(workspace, fileobj, export_format)
+            duration = time.perf_counter() - start
+            __, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            _logger.info("Exported %d articles in %s in %.2fs (%.0f articles/s), %d bytes, peak memory %.1f MB "
+                         "(archive kept in memory)", count, export_format, duration, count / duration,
+                         fileobj.tell(), peak / 1024 / 1024)
+            self.assertEqual(count, self.ROOTS * self.DEPTH + 1)
@@ -387,3 +387,25 @@ class TestKnowledgeArticleFullTextSearch(KnowledgeCommon):
             'is_user_favorite': False,
             'root_article_id': (self.workspace_article_hidden.id, '📄 HR')
         }])
+
+    @users('employee')
+    def test_get_user_sorted_articles_updated_content(self):
+        """ Check that the search document of the articles is kept up to date
+            with their title and body, and that HTML tags are not searchable. """
+        article = self.private_article_user.with_env(self.env)
+        Article = self.env['knowledge.article']
+        self.assertEqual(Article.get_user_sorted_articles('reminder'), [])
+
+        article.write({
+            'name': 'Surprise party',
+            'body': Markup('<p class="reminder">Bring some balloons</p>'),
+        })
+        results = Article.get_user_sorted_articles('balloons')
+        self.assertEqual([result['id'] for result in results], [article.id])
+        self.assertIn('<strong>balloons</strong>', results[0]['headline'])
+        self.assertEqual(Article.get_user_sorted_articles('forget'), [])
+        self.assertEqual(Article.get_user_sorted_articles('reminder'), [])
+        # words of the title are matched even if not contiguous
+        self.assertEqual(
+            [result['id'] for result in Article.get_user_sorted_articles('party surprise')],
+            [article.id])
@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+
+import io
+import logging
+import os
+import tempfile
+import time
+import unittest
+import zipfile
+
+from odoo.addons.knowledge.models.knowledge_article_import import markdown
+from odoo.addons.knowledge.tests.common import KnowledgeCommon
+from odoo.tests.common import tagged, users
+
+_logger = logging.getLogger(__name__)
+
+
+@tagged('knowledge_internals')
+class TestKnowledgeArticleImport(KnowledgeCommon):
+    """ Check the articles created by the bulk import of file trees. """
+
+    def _make_archive(self, files):
+        fileobj = io.BytesIO()
+        with zipfile.ZipFile(fileobj, 'w') as archive:
+            for path, content in files.items():
+                archive.writestr(path, content)
+        fileobj.seek(0)
+        return fileobj
+
+    @users('employee')
+    def test_import_html_tree(self):
+        roots = self.env['knowledge.article.import']._import_tree(self._make_archive({
+            'Handbook.html': '<html><body><p>See <a href="Handbook/Onboarding.html">Onboarding</a></p>'
+                             '<p><img src="Handbook/logo.png"/></p></body></html>',
+            'Handbook/Onboarding.html': '<p>Back to <a href="../Handbook.html#top">the handbook</a> '
+                                        'or <a href="https://www.example.com">elsewhere</a></p>',
+            'Handbook/Policies/index.html': '<p>All policies</p>',
+            'Handbook/Policies/Leave_Policy.htm': '<p>Read <a href="../logo.png">the logo</a></p>',
+            'Handbook/logo.png': b'logo content',
+            '__MACOSX/Handbook/._logo.png': b'ignored',
+        }))
+        self.assertEqual(len(roots), 1)
+        handbook = roots
+        self.assertEqual(handbook.name, 'Handbook')
+        onboarding, policies = handbook.child_ids.sorted('sequence')
+        self.assertEqual((onboarding + policies).mapped('name'), ['Onboarding', 'Policies'])
+        self.assertEqual((onboarding + policies).mapped('sequence'), [0, 1])
+        leave = policies.child_ids
+        self.assertEqual(leave.name, 'Leave Policy')
+        self.assertEqual(leave.parent_path, f'{handbook.id}/{policies.id}/{leave.id}/')
+
+        # computed fields
+        articles = handbook + onboarding + policies + leave
+        self.assertEqual(set(articles.mapped('category')), {'workspace'})
+        self.assertEqual(handbook.internal_permission, 'write')
+        self.assertEqual(set((articles - handbook).mapped('internal_permission')), {False})
+        self.assertEqual(set(articles.mapped('inherited_permission')), {'write'})
+        self.assertTrue(all(articles.mapped('user_can_write')))
+        self.assertEqual(articles.root_article_id, handbook)
+        self.assertEqual(self.env['knowledge.article'].search([('id', 'child_of', handbook.id)]), articles)
+
+        # attachments and links
+        logo = self.env['ir.attachment'].search([('res_model', '=', 'knowledge.article'), ('res_id', '=', handbook.id)])
+        self.assertEqual(logo.name, 'logo.png')
+        self.assertEqual(logo.raw, b'logo content')
+        self.assertIn(f'data-res_id="{onboarding.id}"', handbook.body)
+        self.assertIn('o_knowledge_article_link', handbook.body)
+        self.assertIn(f'src="/web/image/{logo.id}"', handbook.body)
+        self.assertIn(f'href="/knowledge/article/{handbook.id}"', onboarding.body)
+        self.assertIn('href="https://www.example.com"', onboarding.body)
+        self.assertIn(f'href="/web/content/{logo.id}"', leave.body)
+        self.assertEqual(policies.body, '<p>All policies</p>')
+
+    @users('employee')
+    def test_import_under_parent(self):
+        parent = self.env['knowledge.article'].create({'internal_permission': 'read', 'name': 'Parent',
+            'article_member_ids': [(0, 0, {'partner_id': self.env.user.partner_id.id, 'permission': 'write'})]})
+        existing = self.env['knowledge.article'].create({'name': 'Existing', 'parent_id': parent.id})
+        with tempfile.TemporaryDirectory() as directory:
+            for name in ('Beta.html', 'Alpha.html'):
+                with open(os.path.join(directory, name), 'w') as file:
+                    file.write(f'<p>{name}</p>')
+            roots = self.env['knowledge.article.import']._import_tree(directory, parent=parent)
+        self.assertEqual(roots.mapped('name'), ['Alpha', 'Beta'])
+        self.assertEqual(roots.parent_id, parent)
+        self.assertEqual(roots.mapped('sequence'), [existing.sequence + 1, existing.sequence + 2])
+        self.assertEqual(set(roots.mapped('inherited_permission')), {'read'})
+        self.assertEqual(set(roots.mapped('user_permission')), {'write'}, 'Members of the parent should apply')
+
+    @users('employee')
+    def test_import_escaped_body(self):
+        """ Escaped markup at the start of a body stays escaped. """
+        roots = self.env['knowledge.article.import']._import_tree(self._make_archive({
+            'Page.html': '<html><body>&lt;img src=x onerror=alert(1)&gt;<a href="Page/Sub.html">Sub</a></body></html>',
+            'Page/Sub.html': '<p>Sub</p>',
+        }))
+        self.assertIn('&lt;img src=x onerror=alert(1)&gt;', roots.body)
+        self.assertNotIn('<img', roots.body)
+        self.assertIn(f'data-res_id="{roots.child_ids.id}"', roots.body)
+
+    @unittest.skipIf(markdown is None, "markdown2 is not installed")
+    @users('employee')
+    def test_import_markdown(self):
+        roots = self.env['knowledge.article.import']._import_tree(self._make_archive({
+            'Guide.md': '# Guide\n\n- [Setup](Guide/Setup.md)\n- **bold**\n',
+            'Guide/Setup.md': '```\ninstall\n```\n',
+        }))
+        setup = roots.child_ids
+        self.assertEqual(setup.name, 'Setup')
+        self.assertIn('<strong>bold</strong>', roots.body)
+        self.assertIn(f'data-res_id="{setup.id}"', roots.body)
+        self.assertIn('install', setup.body)
+
+
+@tagged('post_install', '-at_install', '-standard', 'knowledge_benchmark')
+class TestKnowledgeArticleImportBenchmark(KnowledgeCommon):
+    """ Time the import of a large tree of files (FOLDERS folders of PAGES
+    pages linking to each other). Not run by default, use
+    ``--test-tags knowledge_benchmark``. """
+    FOLDERS = 300
+    PAGES = 100
+
+    def test_import_throughput(self):
+        files = {}
+        for folder in range(self.FOLDERS):
+            for page in range(self.PAGES):
+                files[f'Space/Folder_{folder}/Page_{page}.html'] = (
+                    f'<h2>Page {page}</h2><p>{"lorem ipsum dolor sit amet " * 40}</p>'
+                    f'<p><a href="Page_{(page + 1) % self.PAGES}.html">Next</a></p>'
+                )
+        archive = self._make_archive(files)
+        start = time.perf_counter()
+        roots = self.env['knowledge.article.import']._import_tree(archive)
+        self.env.flush_all()
+        duration = time.perf_counter() - start
+        count = self.env['knowledge.article'].search_count([('id', 'child_of', roots.ids)])
+        _logger.info("Imported %d articles in %.2fs (%.0f articles/s)", count, duration, count / duration)
+        self.assertEqual(count, self.FOLDERS * self.PAGES + self.FOLDERS + 1)
@@ -103,10 +103,11 @@ class TestKnowledgeArticleFields(KnowledgeCommonWData):
                 article.with_user(self.user_employee2).flush_model()
             self.assertEqual(article.last_edition_uid, self.user_employee2)
             self.assertEqual(article.last_edition_date, _reference_dt + timedelta(days=1))
+            self.assertFalse(article.html_field_history, 'Revisions are kept in the revision store')
             if body_changes_count:
-                self.assertEqual(len(article.html_field_history["body"]), body_changes_count)
+                self.assertEqual(len(article.html_field_history_metadata["body"]), body_changes_count)
             else:
-                self.assertFalse(article.html_field_history)
+                self.assertFalse(article.html_field_history_metadata)
 
 
 @tagged('knowledge_internals')
@@ -0,0 +1,250 @@
+# -*- coding: utf-8 -*-
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+
+import logging
+import time
+
+from unittest.mock import patch
+
+from odoo.addons.knowledge.tests.common import KnowledgeArticlePermissionsCase
+from odoo.tests.common import TransactionCase, tagged, users
+from odoo.tools import mute_logger
+
+_logger = logging.getLogger(__name__)
+
+
+@tagged('knowledge_acl')
+class TestKnowledgeArticlePermissionTable(KnowledgeArticlePermissionsCase):
+    """ Check the materialized effective permissions against the recursive
+    computation of the members (see ``_get_article_member_permissions``). """
+
+    def assertPermissionTable(self):
+        Permission = self.env['knowledge.article.permission']
+        Permission._flush_permissions()
+        stored = {
+            (perm.article_id.id, perm.partner_id.id): (perm.permission, perm.member_id.id)
+            for perm in Permission.sudo().search([])
+        }
+        expected = {
+            (article_id, partner_id): (values['permission'], values['member_id'])
+            for article_id, members in self.env['knowledge.article']._get_article_member_permissions().items()
+            for partner_id, values in members.items()
+        }
+        self.assertEqual(stored, expected)
+
+    def test_permission_table_initial_values(self):
+        self.assertPermissionTable()
+        # full rebuild gives the same result as the incremental updates
+        self.env['knowledge.article.permission']._refresh_permissions()
+        self.assertPermissionTable()
+
+    @mute_logger('odoo.addons.base.models.ir_rule')
+    def test_permission_table_hierarchy_changes(self):
+        article_desync = self.article_write_desync[0]
+        # reconnect a desynchronized article: gets the members of its new parents
+        article_desync.write({'is_desynchronized': False, 'internal_permission': False})
+        self.assertPermissionTable()
+
+        # move a subtree with members and desynchronized articles under another root
+        self.article_read_contents[0].write({'parent_id': self.article_roots[2].id})
+        self.assertPermissionTable()
+        self.assertEqual(
+            self.article_read_contents[0].with_user(self.user_employee).user_permission, 'read',
+            'Permission: member permission of the new root should be inherited')
+
+        # move it back to the root level
+        self.article_read_contents[0].write({'internal_permission': 'write', 'parent_id': False})
+        self.assertPermissionTable()
+
+    @mute_logger('odoo.addons.base.models.ir_rule')
+    def test_permission_table_member_changes(self):
+        root = self.article_roots[0]
+        root._add_members(self.partner_employee2, 'read')
+        self.assertPermissionTable()
+
+        member = root.article_member_ids.filtered(lambda m: m.partner_id == self.partner_employee2)
+        member.write({'permission': 'none'})
+        self.assertPermissionTable()
+        self.assertFalse(self.article_write_contents[2].with_user(self.user_employee2).user_has_access)
+
+        member.unlink()
+        self.assertPermissionTable()
+        self.assertTrue(self.article_write_contents[2].with_user(self.user_employee2).user_has_access)
+
+        # removing the partner removes its effective permissions
+        partner = self.env['res.partner'].create({'name': 'Temporary Member'})
+        self.article_roots[3]._add_members(partner, 'read')
+        self.assertPermissionTable()
+        partner.unlink()
+        self.assertPermissionTable()
+
+    @mute_logger('odoo.addons.base.models.ir_rule')
+    def test_inherited_permission_subtree(self):
+        """ Changes of the permission chain are applied to the whole subtree,
+        and match the recursive computation (see ``_get_internal_permission``). """
+        Article = self.env['knowledge.article']
+        root = Article.create({
+            'name': 'Chain Root',
+            'internal_permission': 'write',
+            'article_member_ids': [(0, 0, {'partner_id': self.partner_employee2.id, 'permission': 'write'})],
+        })
+        chain = Article
+        parent = root
+        for level in range(10):
+            parent = Article.create({'name': f'Chain {level}', 'parent_id': parent.id})
+            chain += parent
+        desync = chain[6]
+        desync.write({
+            'is_desynchronized': True,
+            'internal_permission': 'read',
+            'article_member_ids': [(0, 0, {'partner_id': self.partner_employee2.id, 'permission': 'write'})],
+        })
+        chain[2]._add_members(self.partner_employee, 'write')
+        member = chain[2].article_member_ids
+
+        def assertChain(permissions_and_sources):
+            self.env.invalidate_all()
+            expected = Article._get_internal_permission()
+            for article, (permission, source) in zip(chain, permissions_and_sources):
+                self.assertEqual(article.inherited_permission, permission)
+                self.assertEqual(article.inherited_permission_parent_id, source)
+                self.assertEqual(article.inherited_permission, expected[article.id])
+
+        assertChain([('write', root)] * 6 + [('read', Article)] + [('read', desync)] * 3)
+        self.assertEqual(member.article_permission, 'write')
+
+        root.write({'internal_permission': 'none'})
+        assertChain([('none', root)] * 6 + [('read', Article)] + [('read', desync)] * 3)
+        self.assertEqual(member.article_permission, 'none', 'Related fields of the descendants should follow')
+
+        chain[3].write({'internal_permission': 'read'})
+        assertChain([('none', root)] * 3 + [('read', Article)] + [('read', chain[3])] * 2
+                    + [('read', Article)] + [('read', desync)] * 3)
+
+        # reconnect the desynchronized article and move the subtree to a new root
+        desync.write({'is_desynchronized': False, 'internal_permission': False})
+        new_root = Article.create({'name': 'New Root', 'internal_permission': 'write'})
+        chain[3].write({'internal_permission': False, 'parent_id': new_root.id})
+        assertChain([('none', root)] * 3 + [('write', new_root)] * 7)
+        self.assertEqual(
+            chain[-1].with_user(self.user_employee).user_has_access_parent_path,
+            chain[-1].with_user(self.user_employee).user_has_access)
+
+    @mute_logger('odoo.addons.base.models.ir_rule')
+    @users('employee', 'portal_test')
+    def test_user_has_access_parent_path(self):
+        """ The parent path access computed in one query should match the
+        access computed on each ancestor. """
+        articles = self.env['knowledge.article'].sudo().with_context(active_test=False).search([]).with_env(self.env)
+        for article in articles:
+            ancestors = article.browse(article._get_ancestor_ids()) if article.parent_id else article
+            self.assertEqual(
+                article.user_has_access_parent_path,
+                all(ancestor.user_has_access for ancestor in ancestors),
+                f'Parent path access of {article.name}')
+
+    @mute_logger('odoo.addons.base.models.ir_rule')
+    @users('employee')
+    def test_user_permission_materialized(self):
+        """ The permission of internal users is read from the materialized
+        data, matching the recursive computation. """
+        articles = self.env['knowledge.article'].sudo().with_context(active_test=False).search([]).with_env(self.env)
+        expected = articles._get_internal_permission()
+        member_permissions = articles._get_partner_member_permissions(self.env.user.partner_id)
+        self.env.invalidate_all()
+        with patch.object(type(articles), '_get_internal_permission', side_effect=AssertionError):
+            for article in articles:
+                self.assertEqual(
+                    article.user_permission,
+                    member_permissions.get(article.id) or expected[article.id],
+                    f'Permission of {article.name}')
+
+    @mute_logger('odoo.addons.base.models.ir_rule')
+    @users('employee', 'portal_test')
+    def test_search_user_has_access(self):
+        """ Search methods should match the computed access fields. """
+        articles = self.env['knowledge.article'].sudo().with_context(active_test=False).search([]).with_env(self.env)
+        self.assertEqual(
+            self.env['knowledge.article'].with_context(active_test=False).search([('user_has_access', '=', True)]),
+            articles.filtered('user_has_access'))
+        self.assertEqual(
+            self.env['knowledge.article'].sudo().with_context(active_test=False).search([('user_has_access', '=', False)]),
+            articles.filtered(lambda article: not article.user_has_access).sudo())
+        self.assertEqual(
+            self.env['knowledge.article'].sudo().with_context(active_test=False).search([('user_has_write_access', '=', True)]),
+            articles.filtered('user_has_write_access').sudo())
+        self.assertEqual(
+            self.env['knowledge.article'].sudo().with_context(active_test=False).search([('user_has_write_access', '=', False)]),
+            articles.filtered(lambda article: not article.user_has_write_access).sudo())
+
+
+@tagged('post_install', '-at_install', '-standard', 'knowledge_benchmark')
+class TestKnowledgeArticlePermissionBenchmark(TransactionCase):
+    """ Time the maintenance and the use of the effective permissions on a
+    large (ROOTS * DEPTH articles) and deep tree. Not run by default, use
+    ``--test-tags knowledge_benchmark``. """
+    ROOTS = 1000
+    DEPTH = 100
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user_employee = cls.env['res.users'].create({
+            'login': 'bench_employee',
+            'name': 'Bench Employee',
+            'group_ids': [(6, 0, cls.env.ref('base.group_user').ids)],
+        })
+        partner = cls.user_employee.partner_id
+        Article = cls.env['knowledge.article'].with_context(tracking_disable=True, mail_create_nolog=True)
+
+        # one chain of DEPTH articles per root: private roots (1/10), members
+        # without access half-way (1/10) and desynchronized articles at 3/4 (1/7)
+        start = time.perf_counter()
+        parents = Article.create([{
+            'name': f'Root {index}',
+            'internal_permission': 'none' if index % 10 == 0 else 'write',
+            'article_member_ids': [(0, 0, {'partner_id': partner.id, 'permission': 'write'})] if index % 10 == 0 else [],
+        } for index in range(cls.ROOTS)])
+        cls.roots = parents
+        for level in range(1, cls.DEPTH):
+            vals_list = []
+            for index, parent in enumerate(parents):
+                vals = {'name': f'Article {index}-{level}', 'parent_id': parent.id}
+                if level == cls.DEPTH // 2 and index % 10 == 5:
+                    vals['article_member_ids'] = [(0, 0, {'partner_id': partner.id, 'permission': 'none'})]
+                elif level == cls.DEPTH * 3 // 4 and index % 7 == 0:
+                    vals.update(
+                        is_desynchronized=True,
+                        internal_permission='read',
+                        article_member_ids=[(0, 0, {'partner_id': partner.id, 'permission': 'write'})],
+                    )
+                vals_list.append(vals)
+            parents = Article.create(vals_list)
+        cls.leaves = parents
+        Article.env['knowledge.article.permission']._flush_permissions()
+        _logger.info("Created %d articles in %.2fs", cls.ROOTS * cls.DEPTH, time.perf_counter() - start)
+
+    def _timeit(self, name, func):
+        start = time.perf_counter()
+        result = func()
+        _logger.info("%s: %.3fs", name, time.perf_counter() - start)
+        return result
+
+    def test_permission_table(self):
+        Permission = self.env['knowledge.article.permission']
+        self._timeit("Full rebuild", Permission._refresh_permissions)
+
+        # incremental maintenance on a whole chain
+        root = self.roots[1]
+        self._timeit("Add a member on a root", lambda: (
+            root._add_members(self.user_employee.partner_id, 'read'), Permission._flush_permissions()))
+        self._timeit("Move a chain under a leaf", lambda: (
+            root.write({'parent_id': self.leaves[2].id, 'internal_permission': False}), Permission._flush_permissions()))
+        self._timeit("Change the internal permission of a deep chain", lambda: (
+            self.roots[3].write({'internal_permission': 'read'}), self.env.flush_all()))
+
+        Article = self.env['knowledge.article'].with_user(self.user_employee)
+        readable = self._timeit("Search readable articles", lambda: Article.search_count([]))
+        writable = self._timeit("Search writable articles", lambda: Article.search_count([('user_has_write_access', '=', True)]))
+        self.assertLess(writable, readable)
+        self._timeit("Check access on the leaves", lambda: self.leaves.with_user(self.user_employee).mapped('user_has_access'))
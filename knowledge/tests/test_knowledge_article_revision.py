@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+
+import logging
+import random
+import time
+
+from datetime import timedelta
+from freezegun import freeze_time
+
+from odoo.addons.html_editor.models.diff_utils import generate_patch
+from odoo.addons.knowledge.tests.common import KnowledgeCommon
+from odoo.tests.common import tagged, users
+from odoo.tools import SQL
+
+_logger = logging.getLogger(__name__)
+
+
+@tagged('knowledge_internals')
+class TestKnowledgeArticleRevision(KnowledgeCommon):
+    """ Check the body revisions kept in the revision store. """
+
+    def _write_versions(self, article, count):
+        versions = [article.body]
+        for index in range(count):
+            article.write({'body': f'<p>Version {index}</p><p>Common content</p>'})
+            versions.append(article.body)
+        return versions
+
+    @users('employee')
+    def test_revision_content(self):
+        article = self.env['knowledge.article'].create({
+            'body': '<p>Initial</p>',
+            'internal_permission': 'write',
+            'name': 'History',
+        })
+        Revision = self.env['knowledge.article.revision'].sudo()
+        count = Revision.SNAPSHOT_INTERVAL * 2 + 5
+        versions = self._write_versions(article, count)
+
+        revisions = Revision.search([('article_id', '=', article.id)])
+        self.assertEqual(revisions.mapped('revision_id'), list(range(count, 0, -1)))
+        self.assertEqual(len(revisions.filtered('is_snapshot')), 2)
+        self.assertEqual(revisions.author_id, self.env.user)
+
+        metadata = article.html_field_history_metadata['body']
+        self.assertEqual([revision['revision_id'] for revision in metadata], revisions.mapped('revision_id'))
+        for revision_id in range(1, count + 1):
+            self.assertEqual(
+                article.html_field_history_get_content_at_revision('body', revision_id),
+                versions[revision_id - 1],
+                f'Revision {revision_id} should give the content before the edition')
+
+        # paginated metadata
+        page = article.get_revision_metadata(limit=10)
+        self.assertEqual([revision['revision_id'] for revision in page['revisions']], list(range(count, count - 10, -1)))
+        self.assertTrue(page['more'])
+        page = article.get_revision_metadata(before_revision_id=10, limit=10)
+        self.assertEqual([revision['revision_id'] for revision in page['revisions']], list(range(9, 0, -1)))
+        self.assertFalse(page['more'])
+
+    def test_revision_legacy_history(self):
+        """ Histories stored by the mixin are moved to the store, keeping
+        their revisions. """
+        article = self.env['knowledge.article'].create({
+            'body': '<p>Current</p>',
+            'internal_permission': 'write',
+            'name': 'Legacy',
+        })
+        versions = ['<p>First</p>', '<p>Second</p>', '<p>Current</p>']
+        article.write({'html_field_history': {'body': [{
+            'patch': generate_patch(versions[index + 1], versions[index]),
+            'revision_id': index + 1,
+            'create_date': self.env.cr.now().isoformat(),
+            'create_uid': self.env.uid,
+            'create_user_name': self.env.user.name,
+        } for index in (1, 0)]}})
+        self.assertEqual(article.html_field_history_get_content_at_revision('body', 1), versions[0])
+
+        article.write({'body': '<p>Next</p>'})
+        self.assertFalse(article.html_field_history)
+        self.assertEqual([revision['revision_id'] for revision in article.html_field_history_metadata['body']], [3, 2, 1])
+        for revision_id, content in enumerate(versions, start=1):
+            self.assertEqual(article.html_field_history_get_content_at_revision('body', revision_id), content)
+
+    def test_revision_compaction(self):
+        Revision = self.env['knowledge.article.revision']
+        article = self.env['knowledge.article'].create({
+            'body': '<p>Initial</p>',
+            'internal_permission': 'write',
+            'name': 'Compaction',
+        })
+        now = self.env.cr.now()
+        start = (now - timedelta(days=60)).replace(hour=8, minute=0, second=0, microsecond=0)
+        versions = [article.body]
+        # 3 edits per day during 20 days, two months ago
+        for day in range(20):
+            for edit in range(3):
+                edit_date = start + timedelta(days=day, hours=edit)
+                with freeze_time(edit_date):
+                    self.patch(self.env.cr, 'now', lambda edit_date=edit_date: edit_date)
+                    article.write({'body': f'<p>Day {day} edit {edit}</p>'})
+                versions.append(article.body)
+
+        self.patch(self.env.cr, 'now', lambda: now)
+        Revision._gc_compact_revisions()
+        revisions = Revision.search([('article_id', '=', article.id)])
+        self.assertEqual(len(revisions), 20, 'Old revisions should be thinned to one per day')
+        for revision in revisions:
+            self.assertEqual(
+                article.html_field_history_get_content_at_revision('body', revision.revision_id),
+                versions[revision.revision_id - 1])
+
+
+@tagged('post_install', '-at_install', '-standard', 'knowledge_benchmark')
+class TestKnowledgeArticleRevisionBenchmark(KnowledgeCommon):
+    """ Time the storage and the reconstruction of the revisions of a large
+    (1 MB) body edited REVISIONS times. Not run by default, use
+    ``--test-tags knowledge_benchmark``. """
+    REVISIONS = 500
+    PARAGRAPHS = 10000
+
+    def test_revision_storage(self):
+        rng = random.Random(42)
+        paragraphs = [f'<p>Paragraph {index}: {"lorem ipsum dolor sit amet " * 3}</p>' for index in range(self.PARAGRAPHS)]
+        article = self.env['knowledge.article'].create({
+            'body': ''.join(paragraphs),
+            'internal_permission': 'write',
+            'name': 'Large Article',
+        })
+        versions = [article.body]
+        start = time.perf_counter()
+        for index in range(self.REVISIONS):
+            for __ in range(5):
+                paragraphs[rng.randrange(self.PARAGRAPHS)] = f'<p>Edited in revision {index}</p>'
+            article.write({'body': ''.join(paragraphs)})
+            versions.append(article.body)
+        self.env.flush_all()
+        _logger.info("Stored %d revisions of %d bytes in %.2fs",
+                     self.REVISIONS, len(versions[0]), time.perf_counter() - start)
+
+        [(stored_size, snapshots)] = self.env.execute_query(SQL("""
+            SELECT sum(octet_length(data)), count(*) FILTER (WHERE is_snapshot)
+              FROM knowledge_article_revision
+             WHERE article_id = %s""", article.id))
+        _logger.info("Storage: %d bytes (%d snapshots), %d bytes for the full versions",
+                     stored_size, snapshots, sum(len(version) for version in versions[:-1]))
+
+        timings = []
+        for revision_id in rng.sample(range(1, self.REVISIONS + 1), 50):
+            start = time.perf_counter()
+            content = article.html_field_history_get_content_at_revision('body', revision_id)
+            timings.append(time.perf_counter() - start)
+            self.assertEqual(content, versions[revision_id - 1])
+        timings.sort()
+        _logger.info("Reconstruction: median %.3fs, max %.3fs", timings[len(timings) // 2], timings[-1])
@@ -160,6 +160,22 @@ class TestKnowledgeArticleSequence(KnowledgeCommon):
         self.assertEqual(article_private_child.sequence, 1)
         self.assertSortedSequence(article_private_child + article_root_noise + article_private + article_private2)
 
+    @users('employee')
+    def test_resequence_roots_siblings(self):
+        """ Moving a root article only reorders the root articles of its
+        section, and of its owner for private ones. """
+        article_private = self.article_private.with_env(self.env)
+        article_private2 = self.article_private2.with_env(self.env)
+        other_private = self._create_private_article('OtherPrivate', target_user=self.user_employee2)
+        (other_private + self.article_root_noise[1]).sudo().write({'sequence': 4})
+        self.env.flush_all()
+
+        article_private2.move_to(before_article_id=article_private.id)
+        self.assertEqual(article_private2.sequence, 4)
+        self.assertEqual(article_private.sequence, 5)
+        self.assertEqual(other_private.sudo().sequence, 4, 'Private articles of other users are not siblings')
+        self.assertEqual(self.article_root_noise[1].sequence, 4, 'Workspace articles are not siblings')
+
     @users('employee')
     def test_resequence_with_parent(self):
         """Checking the sequence of the articles"""
@@ -190,3 +206,46 @@ class TestKnowledgeArticleSequence(KnowledgeCommon):
         self.assertEqual(article_root_noise[0].sequence, 2)
         self.assertEqual(article_root_noise[1].sequence, 1)
         self.assertSortedSequence(article_root_noise[1] + article_root_noise[0])
+
+    @users('employee')
+    def test_resequence_gaps(self):
+        """ Moves in a crowded folder spread its children once, after which
+        moves only update the moved article. """
+        article_private = self.article_private.with_env(self.env)
+        children = self.env['knowledge.article'].create([
+            {'name': f'Crowded {index}', 'parent_id': article_private.id}
+            for index in range(15)
+        ])
+        self.env.flush_all()
+
+        # moving the last child first would shift all the other ones: rebalance
+        children[-1].move_to(parent_id=article_private.id, before_article_id=self.article_children[0].id)
+        expected = children[-1] + self.article_children.filtered(lambda a: a.parent_id == article_private) + children[:-1]
+        self.assertSortedSequence(expected)
+        self.assertEqual(
+            expected.mapped('sequence'),
+            [index * self.env['knowledge.article'].SEQUENCE_GAP for index in range(len(expected))])
+
+        # other moves take place in the gaps
+        sequences = {article: article.sequence for article in expected}
+        children[10].move_to(parent_id=article_private.id, before_article_id=children[2].id)
+        self.assertTrue(sequences[children[1]] < children[10].sequence < sequences[children[2]])
+        self.assertEqual(
+            {article: article.sequence for article in expected - children[10]},
+            {article: sequence for article, sequence in sequences.items() if article != children[10]},
+            'Only the moved article should be updated')
+
+    @users('employee')
+    def test_resequence_favorites(self):
+        articles = (self.article_private + self.article_children[0] + self.article_private2).with_env(self.env)
+        for article in articles:
+            article.action_toggle_favorite()
+        Favorite = self.env['knowledge.article.favorite']
+        self.assertEqual(Favorite.search([('user_id', '=', self.env.uid)]).article_id, articles)
+
+        Favorite.resequence_favorites(articles[::-1].ids)
+        favorites = Favorite.search([('user_id', '=', self.env.uid)])
+        self.assertEqual(favorites.article_id, articles[::-1])
+        self.assertEqual(favorites.mapped('sequence'), [0, 1, 2])
+        articles.invalidate_recordset(['user_favorite_sequence'])
+        self.assertEqual(articles.mapped('user_favorite_sequence'), [2, 1, 0])
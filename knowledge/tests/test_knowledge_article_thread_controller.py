@@ -13,6 +13,13 @@ class TestKnowledgeArticleThreadController(KnowledgeArticlePermissionsCase, Http
             'article_id': cls.readable_article.id
         })
 
+    def _get_threads_messages(self, article, threads, limit=30, etag=None):
+        return self.url_open(
+            f'/knowledge/threads/messages?article_id={article.id}'
+            f'&thread_ids={",".join(str(thread_id) for thread_id in threads.ids)}&limit={limit}',
+            headers={'If-None-Match': etag} if etag else None,
+        )
+
     def test_mail_threads_messages_as_portal(self):
         """
         Test that a portal user can properly access attachments through
@@ -39,11 +46,11 @@ class TestKnowledgeArticleThreadController(KnowledgeArticlePermissionsCase, Http
                 attachment_ids=portal_attachment.ids)
         )
         self.authenticate('portal_test', 'portal_test')
-        result = self.make_jsonrpc_request('/knowledge/threads/messages', {
-            "thread_model": 'knowledge.article.thread',
-            "thread_ids": [self.readable_article_thread.id]
-        })
-        result_thread_data = result[str(self.readable_article_thread.id)]['data']
+        result = self._get_threads_messages(self.readable_article, self.readable_article_thread).json()
+        self.assertEqual(
+            result['threads'][str(self.readable_article_thread.id)]['messages'],
+            [portal_message.id, employee_message.id])
+        result_thread_data = result['data']
         result_threads = result_thread_data['mail.thread']
         self.assertEqual(len(result_threads), 1)
         self.assertEqual(self.readable_article_thread.id, result_threads[0]['id'])
@@ -59,3 +66,37 @@ class TestKnowledgeArticleThreadController(KnowledgeArticlePermissionsCase, Http
         )
         self.assertTrue(result_attachments[0].get('access_token'))
         self.assertTrue(result_attachments[1].get('access_token'))
+
+    def test_mail_threads_messages_batch(self):
+        """ The last messages of each thread are loaded at once, and the
+        response is not sent again as long as the comments did not change. """
+        threads = self.readable_article_thread + self.Threads.create([
+            {'article_id': self.readable_article.id} for __ in range(2)
+        ])
+        messages = {
+            thread: [
+                thread.message_post(body=f'Comment {index}', author_id=self.partner_employee.id)
+                for index in range(4)
+            ]
+            for thread in threads[:2]
+        }
+        other_thread = self.Threads.create({'article_id': self.article_write_contents[0].id})
+
+        self.authenticate('employee', 'employee')
+        response = self._get_threads_messages(self.readable_article, threads + other_thread, limit=3)
+        result = response.json()
+        self.assertEqual(result['threads'], {
+            str(threads[0].id): {'messages': [message.id for message in messages[threads[0]][:0:-1]]},
+            str(threads[1].id): {'messages': [message.id for message in messages[threads[1]][:0:-1]]},
+            str(threads[2].id): {'messages': []},
+        }, 'Threads of other articles should be ignored')
+        self.assertEqual(len(result['data']['mail.message']), 6)
+
+        etag = response.headers['ETag']
+        response = self._get_threads_messages(self.readable_article, threads + other_thread, limit=3, etag=etag)
+        self.assertEqual(response.status_code, 304)
+
+        threads[2].message_post(body='New comment', author_id=self.partner_employee.id)
+        response = self._get_threads_messages(self.readable_article, threads + other_thread, limit=3, etag=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['threads'][str(threads[2].id)]['messages']), 1)
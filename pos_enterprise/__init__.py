@@ -5,3 +5,8 @@ from . import models
 from . import wizard
 from . import utils
 from . import report
+
+
+def _uninstall_pos_enterprise(env):
+    # the sequences numbering the messages of the displays are not dropped with the tables
+    env['pos.prep.display'].search([])._drop_notification_sequences()
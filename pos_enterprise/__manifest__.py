@@ -22,6 +22,7 @@ for IoT Box config.
     ],
     'depends': ['web_enterprise', 'point_of_sale'],
     'auto_install': True,
+    'uninstall_hook': '_uninstall_pos_enterprise',
     'author': 'Odoo S.A.',
     'license': 'OEEL-1',
     'assets': {
@@ -1,3 +1,7 @@
+import gzip
+
+from werkzeug.exceptions import NotFound
+
 from odoo import http
 from odoo.http import request
 
@@ -22,3 +26,25 @@ class PosPreparationDisplayController(http.Controller):
 
         response = request.render('pos_enterprise.prep_display_index', context)
         return response
+
+    @http.route('/pos_preparation_display/boot_snapshot', type='http', auth='user', methods=['GET'], readonly=True)
+    def boot_snapshot(self, display_id):
+        """ Return the data of the static models of a preparation display (see
+        ``_get_boot_snapshot``), gzip compressed when the client accepts it.
+
+        The response carries an ETag specific to the user and to the version
+        of the data: when the client sends it back in the ``If-None-Match``
+        header and nothing changed, an empty "304 Not Modified" response is
+        returned without reading the data. """
+        preparation_display = request.env['pos.prep.display'].search([('id', '=', int(display_id))])
+        if not preparation_display:
+            raise NotFound()
+        etag, data = preparation_display._get_boot_snapshot()
+        headers = [('ETag', f'"{etag}"'), ('Cache-Control', 'private, no-cache'), ('Vary', 'Accept-Encoding')]
+        if etag in request.httprequest.if_none_match:
+            return request.make_response('', headers=headers, status=304)
+        if 'gzip' in request.httprequest.accept_encodings:
+            headers.append(('Content-Encoding', 'gzip'))
+        else:
+            data = gzip.decompress(data)
+        return request.make_response(data, headers=[('Content-Type', 'application/json'), *headers])
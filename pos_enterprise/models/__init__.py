@@ -8,6 +8,8 @@ from . import pos_prep_stage
 from . import pos_session
 from . import pos_order
 from . import pos_prep_display
+from . import pos_prep_display_stat
+from . import pos_prep_display_archive
 from . import pos_category
 from . import pos_load_mixin
 from . import product_product
@@ -12,3 +12,8 @@ class PosCategory(models.Model):
     @api.model
     def _load_pos_preparation_data_fields(self):
         return ['display_name']
+
+    def unlink(self):
+        # categories are removed from the routing of the preparation displays
+        self.env.registry.clear_cache()
+        return super().unlink()
@@ -9,3 +9,13 @@ class PosConfig(models.Model):
 
     module_pos_iot = fields.Boolean('IoT Box', related="is_posbox")
     module_pos_urban_piper = fields.Boolean(string='Is an Urbanpiper')
+
+    def write(self, vals):
+        if 'active' in vals:
+            # archived points of sale are ignored by the routing of the preparation displays
+            self.env.registry.clear_cache()
+        return super().write(vals)
+
+    def unlink(self):
+        self.env.registry.clear_cache()
+        return super().unlink()
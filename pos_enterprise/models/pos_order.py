@@ -1,13 +1,14 @@
-import json
+from collections import defaultdict
 
 from odoo import models, api, fields
-from functools import reduce
 
 
 class PosOrder(models.Model):
     _inherit = 'pos.order'
     avg_preparation_time = fields.Float(string="Preparation Time", compute="_compute_avg_time", help="Average preparation time of the order")
     avg_service_time = fields.Float(string="Service Time", compute="_compute_avg_time", help="Average service time of the order")
+    # orders planned for a later day stay on the preparation displays
+    preset_time = fields.Datetime(index='btree_not_null')
 
     def _compute_avg_time(self):
         for rec in self:
@@ -58,11 +59,10 @@ class PosOrder(models.Model):
         quantity_data = {}
         category_ids = set()
 
-        unmerged_lines = reduce(
-            lambda acc, line: {**acc, line["uuid"]: line["order_id"]},
-            self.env["pos.order.line"].search_read([("uuid", "in", pdis_lines.mapped("pos_order_line_uuid"))], ["uuid", "order_id"], load=False),
-            {}
-        )
+        unmerged_lines = {
+            line["uuid"]: line["order_id"]
+            for line in self.env["pos.order.line"].search_read([("uuid", "in", pdis_lines.mapped("pos_order_line_uuid"))], ["uuid", "order_id"], load=False)
+        }
         # If cancelled flag, we flag all lines as cancelled
         if cancelled:
             for line in pdis_lines:
@@ -74,7 +74,7 @@ class PosOrder(models.Model):
         # create a dictionary with the key as a tuple of product_id, internal_note and attribute_value_ids
         skip_unmerged_lines = {}
         for pdis_line in pdis_lines:
-            key = (pdis_line.product_id.id, pdis_line.internal_note or '[]', json.dumps(pdis_line.attribute_value_ids.ids), pdis_line.pos_order_line_uuid)
+            key = (pdis_line.product_id.id, pdis_line.internal_note or '[]', tuple(pdis_line.attribute_value_ids.ids), pdis_line.pos_order_line_uuid)
             line_qty = pdis_line.quantity - pdis_line.cancelled
             # Ensure that when an orderline is merged to another table (e.g., from Table 1 to Table 2), sent to the kitchen,
             # and later unmerged back to its original table, it is not canceled if the order is sent to the kitchen again from Table 2.
@@ -99,7 +99,7 @@ class PosOrder(models.Model):
 
         for line in self.lines:
             line_note = line.note or "[]"
-            key = (line.product_id.id, line_note, json.dumps(line.attribute_value_ids.ids), line.uuid)
+            key = (line.product_id.id, line_note, tuple(line.attribute_value_ids.ids), line.uuid)
 
             # Prevents quantity increase when an orderline is transferred to another table but was originally ordered in a previous table.
             if not quantity_data.get(key):
@@ -115,13 +115,12 @@ class PosOrder(models.Model):
                 quantity_data[key]['order'] += line.qty
 
         # Try to merge the quantity of this line to existing quantity_data entries
+        data_keys = {}
+        for data_key in quantity_data:
+            data_keys.setdefault(data_key[:3], data_key)
         for skip_key, skip_qty in skip_unmerged_lines.items():
-            skip_product_id, skip_note, skip_attribute_value_ids = skip_key
-            for data_key, _data_value in quantity_data.items():
-                data_product_id, data_note, data_attribute_value_ids, _data_uuid = data_key
-                if skip_product_id == data_product_id and skip_note == data_note and skip_attribute_value_ids == data_attribute_value_ids:
-                    quantity_data[data_key]['display'] += skip_qty
-                    break
+            if skip_key in data_keys:
+                quantity_data[data_keys[skip_key]]['display'] += skip_qty
 
         # Update quantity_data with note_history
         if note_history:
@@ -134,8 +133,8 @@ class PosOrder(models.Model):
                         else:
                             note['used_qty'] += line.quantity
 
-                        key = (line.product_id.id, line.internal_note or '[]', json.dumps(line.attribute_value_ids.ids), line.pos_order_line_uuid)
-                        key_new = (line.product_id.id, note['new'] or '', json.dumps(line.attribute_value_ids.ids), line.pos_order_line_uuid)
+                        key = (line.product_id.id, line.internal_note or '[]', tuple(line.attribute_value_ids.ids), line.pos_order_line_uuid)
+                        key_new = (line.product_id.id, note['new'] or '', tuple(line.attribute_value_ids.ids), line.pos_order_line_uuid)
 
                         line.internal_note = note['new']
                         flag_change = True
@@ -167,14 +166,22 @@ class PosOrder(models.Model):
                 'pdis_internal_note': self.internal_note or '[]',
             })
 
-        product_ids = self.env['product.product'].browse([data['product_id'] for data in quantity_data.values()])
+        # index the records once, instead of filtering them for each quantity
+        products = {product.id: product for product in self.env['product.product'].browse([data['product_id'] for data in quantity_data.values()])}
+        order_lines_by_uuid = defaultdict(list)
+        for line in self.lines:
+            order_lines_by_uuid[line.uuid].append(line)
+        pdis_lines_by_key = defaultdict(list)
+        for line in pdis_lines:
+            pdis_lines_by_key[(line.product_id.id, line.internal_note, tuple(line.attribute_value_ids.ids))].append(line)
 
+        new_lines = []  # (pos order line, values of its preparation line)
         for data in quantity_data.values():
             product_id = data['product_id']
-            product = product_ids.filtered(lambda p: p.id == product_id)
+            product = products[product_id]
             if data['order'] > data['display']:
                 missing_qty = data['order'] - data['display']
-                filtered_lines = self.lines.filtered(lambda li: li.uuid == data['uuid'] and order_line_filter(li.uuid))
+                filtered_lines = order_lines_by_uuid[data['uuid']] if order_line_filter(data['uuid']) else []
                 line_qty = 0
 
                 for line in filtered_lines:
@@ -193,14 +200,7 @@ class PosOrder(models.Model):
                         flag_change = True
                         flag_order_added = True
                         category_ids.update(product.pos_categ_ids.ids)
-                        parent = False
-                        if line.combo_parent_id:
-                            parent_line = self.lines.filtered(lambda l: l.id == line.combo_parent_id.id)
-                            parent = self.env['pos.prep.line'].search([
-                                ('pos_order_line_uuid', '=', parent_line.uuid),
-                                ('prep_order_id', '=', pdis_ticket.id)
-                            ], limit=1)
-                        pline = self.env['pos.prep.line'].create({
+                        new_lines.append((line, {
                             'internal_note': line.note or "[]",
                             'customer_note': line.customer_note or "",
                             'attribute_value_ids': line.attribute_value_ids.ids,
@@ -208,21 +208,12 @@ class PosOrder(models.Model):
                             'quantity': line_qty,
                             'prep_order_id': pdis_ticket.id,
                             'pos_order_line_uuid': line.uuid,
-                            'combo_parent_id': parent.id if parent else False,
                             'pos_order_line_id': line.id,
-                        })
-                        if not line.combo_line_ids:
-                            pdis = self.env['pos.prep.display']._get_preparation_displays(self, pline.product_id.pos_categ_ids.ids)
-                            if pdis:
-                                for display in pdis:
-                                    self.env['pos.prep.state'].create({
-                                        'prep_line_id': pline.id,
-                                        'stage_id': display.stage_ids[0].id,
-                                    })
+                        }))
 
             elif data['order'] < data['display']:
                 qty_to_cancel = data['display'] - data['order']
-                for line in pdis_lines.filtered(lambda li: li.product_id.id == product_id and li.internal_note == data['note'] and li.attribute_value_ids.ids == data['attribute_value_ids']):
+                for line in pdis_lines_by_key[(product_id, data['note'], tuple(data['attribute_value_ids']))]:
                     flag_change = True
                     line_qty = 0
                     pdis_qty = line.quantity - line.cancelled
@@ -238,6 +229,9 @@ class PosOrder(models.Model):
                         qty_to_cancel -= pdis_qty
                     category_ids.update(line.product_id.pos_categ_ids.ids)
 
+        if new_lines:
+            self._create_preparation_lines(new_lines)
+
         if general_customer_note is not None:
             for order in pdis_order:
                 if order.pdis_general_customer_note != general_customer_note:
@@ -253,9 +247,48 @@ class PosOrder(models.Model):
 
         return {'change': flag_change, 'sound': sound, 'category_ids': category_ids, 'order_added': flag_order_added}
 
+    def _create_preparation_lines(self, new_lines):
+        """ Create the preparation lines of the given order lines, given as
+        a list of ``(pos order line, values)``, and their states on the
+        preparation displays showing their categories, in batches. """
+        self.ensure_one()
+        prep_lines = self.env['pos.prep.line'].create([vals for __, vals in new_lines])
+
+        # link the lines of combos to the line of their parent created with them
+        prep_lines_by_uuid = {}
+        for prep_line in prep_lines:
+            prep_lines_by_uuid.setdefault(prep_line.pos_order_line_uuid, prep_line)
+        combo_line_ids = defaultdict(list)
+        for (line, __), prep_line in zip(new_lines, prep_lines):
+            parent = line.combo_parent_id in self.lines and prep_lines_by_uuid.get(line.combo_parent_id.uuid)
+            if parent:
+                combo_line_ids[parent].append(prep_line.id)
+        for parent, line_ids in combo_line_ids.items():
+            self.env['pos.prep.line'].browse(line_ids).combo_parent_id = parent
+
+        # route the lines once per set of categories
+        displays_by_categories = {}
+        state_vals_list = []
+        for (line, __), prep_line in zip(new_lines, prep_lines):
+            if line.combo_line_ids:
+                continue
+            categ_ids = tuple(prep_line.product_id.pos_categ_ids.ids)
+            if categ_ids not in displays_by_categories:
+                displays_by_categories[categ_ids] = self.env['pos.prep.display']._get_preparation_displays(self, list(categ_ids))
+            state_vals_list += [{
+                'prep_line_id': prep_line.id,
+                'stage_id': display.stage_ids[0].id,
+            } for display in displays_by_categories[categ_ids]]
+        self.env['pos.prep.state'].create(state_vals_list)
+        return prep_lines
+
 
 class PosOrderLine(models.Model):
     _inherit = 'pos.order.line'
 
     preparation_time = fields.Integer("Preparation Time", help="Time to prepare the order line", default=-1, readonly=True)
     service_time = fields.Integer("Service Time", help="Time to serve the order line", default=-1, readonly=True)
+
+    # read by the refresh of the preparation time report
+    _write_date_idx = models.Index("(write_date)")
+    _create_date_idx = models.Index("(create_date)")
@@ -1,5 +1,19 @@
+import gzip
+import hashlib
+import json
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+
 from odoo import fields, models, api, _
 from odoo.exceptions import AccessError, ValidationError
+from odoo.fields import Domain
+from odoo.tools import SQL, json_default, ormcache
+from odoo.tools.lru import LRU
+
+# compressed boot snapshots by ETag, shared by the displays of the process
+boot_snapshot_cache = LRU(64)
+# versions of the records sent to the displays, comparable as strings
+VERSION_FORMAT = '%Y-%m-%d %H:%M:%S.%f'
 
 
 class PosPrepDisplay(models.Model):
@@ -32,13 +46,28 @@ class PosPrepDisplay(models.Model):
     def _load_preparation_data_models(self):
         return ['pos.category', 'pos.prep.order', 'pos.order', 'pos.prep.state', 'pos.prep.line', 'pos.prep.stage', 'product.product', 'pos.preset', 'product.attribute', 'product.template.attribute.value', 'resource.calendar.attendance', 'product.attribute.custom.value']
 
-    def load_preparation_data(self):
+    def _load_preparation_static_models(self):
+        """ Models of the boot snapshot: their data rarely changes, so it is
+        served from a cache revalidated by ETag (see ``_get_boot_snapshot``). """
+        return ['pos.category', 'pos.prep.stage', 'pos.preset', 'resource.calendar.attendance', 'product.attribute']
+
+    def load_preparation_data(self, with_static=True):
+        static_models = set(self._load_preparation_static_models())
+        return self._load_preparation_models_data([
+            model for model in self._load_preparation_data_models()
+            if with_static or model not in static_models
+        ])
+
+    def _load_preparation_models_data(self, models):
+        """ Return the data of the display and of the given models, loaded in
+        the given order (the domains of a model may depend on the data of the
+        previous ones). """
         # Init our first record, in case of self_order is pos_config
         pdis_fields = self._load_pos_preparation_data_fields()
         response = {
             'pos.prep.display': self.search_read([('id', '=', self.id)], pdis_fields, load=False),
         }
-        for model in self._load_preparation_data_models():
+        for model in models:
             try:
                 response[model] = self.env[model]._load_pos_preparation_data(response)
             except AccessError:
@@ -46,6 +75,39 @@ class PosPrepDisplay(models.Model):
 
         return response
 
+    def _get_boot_snapshot_version(self):
+        """ Return a key changing whenever the data of the boot snapshot may
+        have changed: created, modified or deleted records of its models, of
+        the displays and of the points of sale. """
+        models = [*self._load_preparation_static_models(), 'pos.prep.display', 'pos.config']
+        for model in models:
+            self.env[model].flush_model()
+        rows = self.env.execute_query(SQL(" UNION ALL ").join(
+            SQL("SELECT %s, count(*), max(write_date) FROM %s", model, SQL.identifier(self.env[model]._table))
+            for model in models
+        ))
+        return ','.join(f'{model}:{count}:{write_date}' for model, count, write_date in rows)
+
+    def _get_boot_snapshot(self):
+        """ Return ``(etag, data)``, the gzip compressed JSON data of the
+        static models of the display, for the current user and language. The
+        data is only serialized once per version. """
+        self.ensure_one()
+        etag = hashlib.sha1(
+            f'{self.env.cr.dbname}:{self.id}:{self.env.uid}:{self.env.lang}:{self.env.companies.ids}:'
+            f'{self._get_boot_snapshot_version()}'.encode()
+        ).hexdigest()
+        data = boot_snapshot_cache.get(etag)
+        if data is None:
+            # only the static models, not the orders of the display
+            static_models = set(self._load_preparation_static_models())
+            response = self._load_preparation_models_data([
+                model for model in self._load_preparation_data_models() if model in static_models
+            ])
+            snapshot = {model: response[model] for model in static_models if model in response}
+            data = boot_snapshot_cache[etag] = gzip.compress(json.dumps(snapshot, default=json_default).encode())
+        return etag, data
+
     def load_data_params(self):
         response = {}
         fields = self._load_pos_preparation_data_fields()
@@ -72,40 +134,61 @@ class PosPrepDisplay(models.Model):
 
     @api.model
     def _get_preparation_displays(self, posOrder, pos_categ_ids):
-        config_id = posOrder.config_id.id
-        return self.env['pos.prep.display'].search([
-            '&',
-            '|', ('pos_config_ids', '=', False),
-            ('pos_config_ids', 'in', config_id),
-            '|', ('category_ids', 'in', pos_categ_ids),
-            ('category_ids', '=', False)])
-
-    def _get_open_orderlines_in_display(self):
-        self.ensure_one()
-        last_stage_id = self.stage_ids.ids[-1] if self.stage_ids.ids else 0
-        pdis_orderlines = self.env['pos.prep.state'].search([
+        routing = self._get_routing_map()
+        display_ids = set()
+        for config_id in (posOrder.config_id.id, False):
+            for categ_id in [*pos_categ_ids, False]:
+                display_ids.update(routing['displays'].get((config_id, categ_id), ()))
+        # the map holds the displays of all companies
+        company_ids = self.env.companies.ids
+        return self.browse(sorted(
+            display_id for display_id in display_ids
+            if routing['companies'][display_id] in company_ids
+        ))
+
+    @api.model
+    @ormcache()
+    def _get_routing_map(self):
+        """ Return the displays showing the lines of each point of sale and
+        category, as ``{(config_id, categ_id): display_ids}``, where ``False``
+        stands for the displays not restricted to some points of sale or
+        categories, and the displays of each point of sale, as
+        ``{config_id: display_ids}``. The map is cached until the displays,
+        points of sale or categories change, it must not be modified. """
+        routing = {'displays': defaultdict(set), 'configs': defaultdict(set), 'companies': {}}
+        displays = self.sudo().with_context(active_test=True).search_fetch([], ['company_id', 'pos_config_ids', 'category_ids'])
+        for display in displays:
+            routing['companies'][display.id] = display.company_id.id
+            for config_id in display.pos_config_ids.ids or [False]:
+                routing['configs'][config_id].add(display.id)
+                for categ_id in display.category_ids.ids or [False]:
+                    routing['displays'][config_id, categ_id].add(display.id)
+        routing['displays'] = {key: frozenset(ids) for key, ids in routing['displays'].items()}
+        routing['configs'] = {key: frozenset(ids) for key, ids in routing['configs'].items()}
+        return routing
+
+    def _get_open_orderlines_in_display(self, pos_order_ids=None):
+        """ Return the preparation states shown on the displays: those not
+        cleared from their last stage, of orders whose session is still open or
+        planned for a later day. Give ``pos_order_ids`` to only get the states
+        of these orders. """
+        last_stage_ids = [display.stage_ids[-1].id for display in self if display.stage_ids]
+        tomorrow = datetime.combine(fields.Date.today() + timedelta(days=1), time.min)
+        domain = Domain([
             ('stage_id', 'in', self.stage_ids.ids),
-            '!', '&', ('todo', '=', False), ('stage_id', '=', last_stage_id)])
-        pdis_orderlines = pdis_orderlines.filtered(lambda s: s.prep_line_id.prep_order_id.pos_order_id.session_id.state not in ['closed', 'closing_control'] or (s.prep_line_id.prep_order_id.pos_order_id.preset_time and s.prep_line_id.prep_order_id.pos_order_id.preset_time.date() > fields.Date.today()))
-        return pdis_orderlines
+            '!', '&', ('todo', '=', False), ('stage_id', 'in', last_stage_ids),
+        ]) & Domain([
+            '|', ('prep_line_id.prep_order_id.pos_order_id.session_id.state', 'not in', ['closed', 'closing_control']),
+            ('prep_line_id.prep_order_id.pos_order_id.preset_time', '>=', tomorrow),
+        ])
+        if pos_order_ids is not None:
+            domain &= Domain('prep_line_id.prep_order_id.pos_order_id', 'in', pos_order_ids)
+        return self.env['pos.prep.state'].search(domain)
 
     @api.model
     def _load_pos_data_domain(self, data, config):
-        return [
-            (
-                "id",
-                "in",
-                [
-                    display.id
-                    for display in self.env["pos.prep.display"]
-                    .search([])
-                    .filtered(
-                        lambda d: not d.pos_config_ids
-                        or config.id in d.pos_config_ids.ids
-                    )
-                ],
-            )
-        ]
+        configs = self._get_routing_map()['configs']
+        return [("id", "in", sorted(configs.get(config.id, frozenset()) | configs.get(False, frozenset())))]
 
     @api.model
     def _load_pos_data_fields(self, config_id):
@@ -113,19 +196,34 @@ class PosPrepDisplay(models.Model):
 
     @api.depends('stage_ids', 'pos_config_ids', 'category_ids')
     def _compute_order_count(self):
+        stats = self.env['pos.prep.display.stat']._read_display_stats(self._origin.ids)
         for preparation_display in self:
-            open_pdis_lines = preparation_display._get_open_orderlines_in_display()
-            progress_orders = open_pdis_lines.filtered(lambda sate: sate.stage_id.id != preparation_display.stage_ids[-1].id).prep_line_id.prep_order_id
-            preparation_display.order_count = len(progress_orders)
+            order_count, average_seconds = stats.get(preparation_display._origin.id, (0, 0))
+            preparation_display.order_count = order_count
+            preparation_display.average_time = round(average_seconds / 60)
 
-            completed_order_times = []
-            done_orders = self.env['pos.prep.order'].search([]) - open_pdis_lines.prep_line_id.prep_order_id
-            for order in done_orders:
-                order_lines = self.env['pos.prep.state'].search([('prep_line_id.prep_order_id', '=', order.id), ('stage_id.id', 'in', preparation_display.stage_ids.ids)])
-                if order_lines:
-                    completed_order_times.append((max(state.write_date for state in order_lines) - order.pos_order_id.create_date).total_seconds())
+    def init(self):
+        super().init()
+        # displays created before their messages were numbered by a sequence
+        self.env.cr.execute(SQL("SELECT id FROM pos_prep_display"))
+        self.browse([id_ for [id_] in self.env.cr.fetchall()])._create_notification_sequences()
 
-            preparation_display.average_time = round(sum(completed_order_times) / len(completed_order_times) / 60) if completed_order_times else 0
+    @api.model_create_multi
+    def create(self, vals_list):
+        self.env.registry.clear_cache()
+        preparation_displays = super().create(vals_list)
+        preparation_displays._create_notification_sequences()
+        return preparation_displays
+
+    def write(self, vals):
+        if {'company_id', 'pos_config_ids', 'category_ids'} & vals.keys():
+            self.env.registry.clear_cache()
+        res = super().write(vals)
+        if 'stage_ids' in vals:
+            # the last stage may have changed, which finishes or reopens orders
+            stats = self.env['pos.prep.display.stat'].search([('display_id', 'in', self.ids)])
+            self.env['pos.prep.display.stat']._refresh_stats(stats.prep_order_id.ids)
+        return res
 
     # if needed the user can instantly reset a preparation display and archive all the orders.
     def reset(self):
@@ -135,8 +233,97 @@ class PosPrepDisplay(models.Model):
             preparation_display._send_load_orders_message()
 
     def _send_load_orders_message(self, sound=False, notification=None, orderId=None):
+        if orderId:
+            self._send_order_changes([orderId], sound, notification)
+            return
+        sequences = self._next_notification_sequences()
+        for preparation_display in self:
+            preparation_display._notify('LOAD_ORDERS', {
+                'sequence': sequences[preparation_display.id],
+                'sound': sound,
+                'notification': notification,
+            })
+
+    def _send_order_changes(self, pos_order_ids, sound=False, notification=None):
+        """ Send the current lines of the given orders to the displays, so
+        that they update them without reloading them. The records are read once
+        for all the displays, each one receiving its own lines. """
+        if not self:
+            return
+        prep_states = self._get_open_orderlines_in_display(pos_order_ids)
+        combo_lines = self.env['pos.prep.line'].search([('combo_line_ids', 'in', prep_states.prep_line_id.ids)])
+        sequences = self._next_notification_sequences()
+        for preparation_display in self:
+            # records are prefetched for all the displays when reading the first one
+            display_states = prep_states.filtered(lambda state: state.stage_id.prep_display_id == preparation_display)
+            prep_lines = display_states.prep_line_id + combo_lines.filtered(
+                lambda line: line.combo_line_ids & display_states.prep_line_id)
+            preparation_display._notify('ORDER_CHANGES', {
+                'sequence': sequences[preparation_display.id],
+                'orderIds': pos_order_ids,
+                'sound': sound,
+                'notification': notification,
+                'data': preparation_display._get_preparation_display_order_additional_info(
+                    display_states, prep_lines, prep_lines.prep_order_id),
+                'versions': self._get_record_versions(
+                    display_states, prep_lines, prep_lines.prep_order_id, prep_lines.prep_order_id.pos_order_id),
+            })
+
+    @api.model
+    def _get_record_versions(self, *records_list):
+        """ Return the write dates of the given records, with their microseconds,
+        as ``{model: {id: version}}``. Messages may be received out of order:
+        the displays only apply the records newer than the ones they have. """
+        versions = defaultdict(dict)
+        for records in records_list:
+            for record in records:
+                versions[records._name][record.id] = record.write_date.strftime(VERSION_FORMAT)
+        return dict(versions)
+
+    def _get_notification_sequence_name(self):
         self.ensure_one()
-        self._notify('LOAD_ORDERS', {'sound': sound, 'notification': notification, 'orderId': orderId})
+        return f'pos_prep_display_notification_{self.id}'
+
+    def _create_notification_sequences(self):
+        for preparation_display in self:
+            self.env.cr.execute(SQL(
+                "CREATE SEQUENCE IF NOT EXISTS %s",
+                SQL.identifier(preparation_display._get_notification_sequence_name()),
+            ))
+
+    def _drop_notification_sequences(self):
+        for preparation_display in self:
+            self.env.cr.execute(SQL(
+                "DROP SEQUENCE IF EXISTS %s",
+                SQL.identifier(preparation_display._get_notification_sequence_name()),
+            ))
+
+    def _next_notification_sequences(self):
+        """ Number the next message sent to each display, so that the displays
+        can detect the messages they missed and reload.
+
+        The numbers come from a sequence per display, which takes no lock:
+        messages sent concurrently may be received out of order, which the
+        displays apply anyway (see ``_get_record_versions``), and numbers of
+        rolled back transactions are lost, the displays reloading when a gap
+        is not filled after a while. """
+        if not self:
+            return {}
+        rows = self.env.execute_query(SQL("""
+            SELECT display.id, nextval(display.sequence_name::regclass)
+              FROM unnest(%s::int[], %s::varchar[]) AS display(id, sequence_name)""",
+            self.ids, [preparation_display._get_notification_sequence_name() for preparation_display in self],
+        ))
+        return dict(rows)
+
+    def _get_last_notification_sequence(self):
+        """ Return the number of the last message sent to the display, whose
+        transaction may still be running. """
+        [[last_sequence]] = self.env.execute_query(SQL(
+            "SELECT CASE WHEN is_called THEN last_value ELSE 0 END FROM %s",
+            SQL.identifier(self._get_notification_sequence_name()),
+        ))
+        return last_sequence
 
     def open_ui(self):
         return {
@@ -173,11 +360,19 @@ class PosPrepDisplay(models.Model):
 
     def get_preparation_display_order(self, orderId):
         self.ensure_one()
-        prep_states = self._get_open_orderlines_in_display()
-        if orderId:
-            prep_states = prep_states.filtered(lambda l: l.prep_line_id.prep_order_id.pos_order_id.id == orderId)
+        prep_states = self._get_open_orderlines_in_display([orderId] if orderId else None)
         prep_lines = prep_states.prep_line_id + self.env['pos.prep.line'].search([('combo_line_ids', 'in', prep_states.prep_line_id.ids)])
-        return self._get_preparation_display_order_additional_info(prep_states, prep_lines, prep_lines.prep_order_id)
+        data = self._get_preparation_display_order_additional_info(prep_states, prep_lines, prep_lines.prep_order_id)
+        data['versions'] = self._get_record_versions(
+            prep_states, prep_lines, prep_lines.prep_order_id, prep_lines.prep_order_id.pos_order_id)
+        # messages up to this one are included in the data, or still being sent
+        data['sequence'] = self._get_last_notification_sequence()
+        return data
+
+    def unlink(self):
+        self.env.registry.clear_cache()
+        self._drop_notification_sequences()
+        return super().unlink()
 
     @api.constrains('stage_ids')
     def _check_stage_ids(self):
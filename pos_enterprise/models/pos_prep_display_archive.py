@@ -0,0 +1,57 @@
+from odoo import api, fields, models
+from odoo.tools import SQL
+
+
+class PosPrepDisplayArchive(models.Model):
+    """ Daily summary of the orders prepared on each preparation display,
+    kept when their preparation data is purged. """
+    _name = 'pos.prep.display.archive'
+    _description = 'Pos Preparation Display Archive'
+    _order = 'date desc, id desc'
+    _log_access = False
+
+    date = fields.Date("Date", required=True, readonly=True)
+    display_id = fields.Many2one('pos.prep.display', required=True, ondelete='cascade', readonly=True)
+    pos_config_id = fields.Many2one('pos.config', string='POS Config', required=True, ondelete='cascade', index=True, readonly=True)
+    order_count = fields.Integer("Orders", readonly=True)
+    total_completion_time = fields.Float("Total Completion Time", readonly=True, help="Sum of the completion times of the orders, in seconds")
+    max_completion_time = fields.Float("Longest Completion Time", readonly=True, help="Longest completion time of the orders, in seconds")
+    average_completion_time = fields.Float("Average Completion Time", compute='_compute_average_completion_time', help="Average completion time of the orders, in seconds")
+
+    _display_config_date_unique = models.Constraint(
+        'UNIQUE(display_id, pos_config_id, date)',
+        "A preparation display can only have one summary per point of sale and per day.",
+    )
+
+    @api.depends('order_count', 'total_completion_time')
+    def _compute_average_completion_time(self):
+        for archive in self:
+            archive.average_completion_time = archive.total_completion_time / archive.order_count if archive.order_count else 0
+
+    @api.model
+    def _archive_prep_orders(self, prep_order_ids):
+        """ Add the completion times of the given preparation orders to the
+        summaries of their displays, in a single query. """
+        if not prep_order_ids:
+            return
+        self.env['pos.prep.display.stat']._refresh_stats(prep_order_ids)
+        self.env.cr.execute(SQL("""
+            INSERT INTO pos_prep_display_archive AS archive (display_id, pos_config_id, date, order_count, total_completion_time, max_completion_time)
+                 SELECT stat.display_id,
+                        pos_order.config_id,
+                        prep_order.create_date::date,
+                        count(*),
+                        COALESCE(sum(stat.completion_time), 0),
+                        COALESCE(max(stat.completion_time), 0)
+                   FROM pos_prep_display_stat stat
+                   JOIN pos_prep_order prep_order ON prep_order.id = stat.prep_order_id
+                   JOIN pos_order ON pos_order.id = prep_order.pos_order_id
+                  WHERE stat.prep_order_id IN %s
+               GROUP BY stat.display_id, pos_order.config_id, prep_order.create_date::date
+            ON CONFLICT (display_id, pos_config_id, date) DO UPDATE
+                    SET order_count = archive.order_count + EXCLUDED.order_count,
+                        total_completion_time = archive.total_completion_time + EXCLUDED.total_completion_time,
+                        max_completion_time = GREATEST(archive.max_completion_time, EXCLUDED.max_completion_time)""",
+            tuple(prep_order_ids),
+        ))
+        self.invalidate_model()
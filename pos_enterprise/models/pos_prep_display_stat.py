@@ -0,0 +1,114 @@
+from odoo import api, fields, models
+from odoo.tools import SQL
+
+
+class PosPrepDisplayStat(models.Model):
+    """ Progress of each preparation order on each preparation display.
+
+    Rows are refreshed from the preparation states of the orders whenever
+    their states are created, moved or removed, so that the statistics of the
+    displays are aggregated from one row per order instead of being rebuilt
+    from all the preparation states. """
+    _name = 'pos.prep.display.stat'
+    _description = 'Pos Preparation Display Statistics'
+    _log_access = False
+
+    display_id = fields.Many2one('pos.prep.display', required=True, ondelete='cascade', readonly=True)
+    prep_order_id = fields.Many2one('pos.prep.order', required=True, ondelete='cascade', index=True, readonly=True)
+    state = fields.Selection([
+        ('progress', 'In Progress'),
+        ('ready', 'Ready'),
+        ('done', 'Done'),
+    ], required=True, readonly=True, help="In progress until all the lines reach the last stage, then done once they are all cleared from it.")
+    completion_time = fields.Float("Completion Time", readonly=True, help="Seconds from the creation of the order to the last change of its lines")
+
+    _display_order_unique = models.Constraint(
+        'UNIQUE(display_id, prep_order_id)',
+        "An order can only have one progress per preparation display.",
+    )
+
+    def init(self):
+        # backfill the statistics of the orders prepared before their introduction
+        self.env.cr.execute(SQL("SELECT 1 FROM %s LIMIT 1", SQL.identifier(self._table)))
+        if not self.env.cr.rowcount:
+            self._refresh_stats()
+
+    @api.model
+    def _refresh_stats(self, prep_order_ids=None):
+        """ Recompute the rows of the given preparation orders (of all orders
+        if not given) from their preparation states, in a single query. """
+        if prep_order_ids is not None and not prep_order_ids:
+            return
+        for model in ('pos.prep.state', 'pos.prep.line', 'pos.prep.stage', 'pos.prep.order', 'pos.order'):
+            self.env[model].flush_model()
+        order_filter = SQL("line.prep_order_id IN %s", tuple(prep_order_ids)) if prep_order_ids else SQL("TRUE")
+        stat_filter = SQL("stat.prep_order_id IN %s", tuple(prep_order_ids)) if prep_order_ids else SQL("TRUE")
+        self.env.cr.execute(SQL("""
+            WITH last_stage AS (
+                SELECT DISTINCT ON (prep_display_id) prep_display_id AS display_id, id AS stage_id
+                  FROM pos_prep_stage
+                 WHERE prep_display_id IS NOT NULL
+              ORDER BY prep_display_id, sequence DESC, id DESC
+            ), progress AS (
+                SELECT last_stage.display_id,
+                       line.prep_order_id,
+                       CASE WHEN bool_or(state.stage_id != last_stage.stage_id) THEN 'progress'
+                            WHEN bool_or(state.todo) THEN 'ready'
+                            ELSE 'done' END AS state,
+                       EXTRACT(EPOCH FROM max(state.write_date) - min(pos_order.create_date)) AS completion_time
+                  FROM pos_prep_state state
+                  JOIN pos_prep_stage stage ON stage.id = state.stage_id
+                  JOIN last_stage ON last_stage.display_id = stage.prep_display_id
+                  JOIN pos_prep_line line ON line.id = state.prep_line_id
+                  JOIN pos_prep_order prep_order ON prep_order.id = line.prep_order_id
+             LEFT JOIN pos_order ON pos_order.id = prep_order.pos_order_id
+                 WHERE %(order_filter)s
+              GROUP BY last_stage.display_id, line.prep_order_id
+            ), upserted AS (
+                INSERT INTO pos_prep_display_stat (display_id, prep_order_id, state, completion_time)
+                     SELECT display_id, prep_order_id, state, completion_time
+                       FROM progress
+                ON CONFLICT (display_id, prep_order_id) DO UPDATE
+                        SET state = EXCLUDED.state, completion_time = EXCLUDED.completion_time
+                  RETURNING display_id, prep_order_id
+            )
+            DELETE FROM pos_prep_display_stat stat
+             WHERE %(stat_filter)s
+               AND NOT EXISTS (
+                       SELECT 1
+                         FROM upserted
+                        WHERE upserted.display_id = stat.display_id
+                          AND upserted.prep_order_id = stat.prep_order_id
+                   )""",
+            order_filter=order_filter,
+            stat_filter=stat_filter,
+        ))
+        self.invalidate_model()
+
+    @api.model
+    def _read_display_stats(self, display_ids):
+        """ Return ``{display_id: (order_count, average_seconds)}``: the number of
+        orders in progress on the display and the average completion time of
+        the orders that left it. Orders of closed sessions are considered as
+        left, unless they are planned for a later day. """
+        if not display_ids:
+            return {}
+        self.env['pos.order'].flush_model(['session_id', 'preset_time'])
+        self.env['pos.session'].flush_model(['state'])
+        rows = self.env.execute_query(SQL("""
+            SELECT stat.display_id,
+                   count(*) FILTER (WHERE stat.state = 'progress' AND %(is_open)s),
+                   avg(stat.completion_time) FILTER (WHERE stat.state = 'done' OR NOT %(is_open)s)
+              FROM pos_prep_display_stat stat
+              JOIN pos_prep_order prep_order ON prep_order.id = stat.prep_order_id
+         LEFT JOIN pos_order ON pos_order.id = prep_order.pos_order_id
+         LEFT JOIN pos_session session ON session.id = pos_order.session_id
+             WHERE stat.display_id IN %(display_ids)s
+          GROUP BY stat.display_id""",
+            is_open=SQL(
+                "(COALESCE(session.state, '') NOT IN ('closed', 'closing_control') OR COALESCE(pos_order.preset_time::date > %s, FALSE))",
+                fields.Date.today(),
+            ),
+            display_ids=tuple(display_ids),
+        ))
+        return {display_id: (order_count, average or 0) for display_id, order_count, average in rows}
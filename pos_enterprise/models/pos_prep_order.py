@@ -1,4 +1,5 @@
 from odoo import fields, models, api
+from odoo.tools import SQL, str2bool
 from datetime import timedelta
 
 
@@ -7,13 +8,15 @@ class PosPrepOrder(models.Model):
     _description = 'Pos Preparation Order'
     _inherit = ['pos.load.mixin']
 
-    pos_order_id = fields.Many2one('pos.order', string='Order', ondelete='cascade')
+    pos_order_id = fields.Many2one('pos.order', string='Order', ondelete='cascade', index=True)
     prep_line_ids = fields.One2many('pos.prep.line', 'prep_order_id', string='Preparation Lines')
     order_name = fields.Char(compute='_compute_order_name')
     pdis_general_customer_note = fields.Text("General Customer Note", help="Current general-customer-note displayed on preparation display")
     pdis_internal_note = fields.Text("General Note", help="Current general-note displayed on preparation display")
     completion_time = fields.Integer("Completion Time", help="Time in minutes to complete the order (preparation + service time)")
 
+    _write_date_idx = models.Index("(write_date)")
+
     @api.depends('pos_order_id.floating_order_name')
     def _compute_order_name(self):
         for order in self:
@@ -29,13 +32,43 @@ class PosPrepOrder(models.Model):
         if not data['change']:
             return
 
-        for p_dis in self.env['pos.prep.display']._get_preparation_displays(order, data['category_ids']):
-            p_dis._send_load_orders_message(data['sound'], data.get('notification'), order_id)
+        p_dis = self.env['pos.prep.display']._get_preparation_displays(order, data['category_ids'])
+        p_dis._send_load_orders_message(data['sound'], data.get('notification'), order_id)
 
         return True
 
     @api.model
-    def _clean_preparation_data(self):
-        orders = self.env['pos.prep.order'].search([('write_date', '<=', fields.Datetime.now() - timedelta(days=1))])
-        orders.unlink()
+    def _clean_preparation_data(self, batch_size=1000):
+        """ Delete the preparation orders that were not modified for the
+        retention period, with their lines and states, by batches committed
+        one after the other so that the kitchen tables are only locked for
+        short periods. Orders locked by a running transaction are left for
+        the next run. """
+        ICP = self.env['ir.config_parameter'].sudo()
+        retention_days = int(ICP.get_param('pos_enterprise.prep_data_retention_days', 1))
+        archive = str2bool(ICP.get_param('pos_enterprise.prep_data_archive', 'False'))
+        cutoff = fields.Datetime.now() - timedelta(days=max(retention_days, 0))
+
+        self.env.flush_all()
+        remaining = self.search_count([('write_date', '<=', cutoff)])
+        while remaining > 0:
+            prep_order_ids = [prep_order_id for prep_order_id, in self.env.execute_query(SQL("""
+                SELECT id
+                  FROM pos_prep_order
+                 WHERE write_date <= %s
+              ORDER BY write_date, id
+                 LIMIT %s
+                   FOR UPDATE SKIP LOCKED""",
+                cutoff, batch_size,
+            ))]
+            if not prep_order_ids:
+                break
+            if archive:
+                self.env['pos.prep.display.archive']._archive_prep_orders(prep_order_ids)
+            # lines, states, attributes and statistics follow by cascade
+            self.env.cr.execute(SQL("DELETE FROM pos_prep_order WHERE id IN %s", tuple(prep_order_ids)))
+            self.env.invalidate_all()
+            remaining -= len(prep_order_ids)
+            if not self.env['ir.cron']._commit_progress(len(prep_order_ids), remaining=max(remaining, 0)):
+                break
         return True
@@ -1,5 +1,8 @@
-from odoo import fields, models
+from collections import defaultdict
+
+from odoo import api, fields, models
 from odoo.addons.pos_enterprise.utils.date_utils import compute_seconds_since
+from odoo.tools import SQL
 
 
 class PosPreparationState(models.Model):
@@ -7,84 +10,147 @@ class PosPreparationState(models.Model):
     _description = 'Pos Preparation State'
     _inherit = ['pos.load.mixin']
 
-    prep_line_id = fields.Many2one('pos.prep.line', string='Preparation Orderline', required=True, ondelete='cascade')
+    prep_line_id = fields.Many2one('pos.prep.line', string='Preparation Orderline', required=True, ondelete='cascade', index=True)
     todo = fields.Boolean("Status of the orderline", help="The status of a command line, todo or not", default=True)
-    stage_id = fields.Many2one('pos.prep.stage', ondelete='cascade', index=True)
+    stage_id = fields.Many2one('pos.prep.stage', ondelete='cascade')
     last_stage_change = fields.Datetime(default=fields.Datetime.now)
 
-    def change_state_status(self, todos, prep_display_id):
-        pdis_state_todos = []
+    _stage_todo_idx = models.Index("(stage_id, todo)")
 
-        for pdis_state in self:
-            pdis_state.todo = todos[str(pdis_state.id)]
-            pdis_state_todos.append({
-                'id': pdis_state.id,
-                'todo': pdis_state.todo
-            })
-            self._record_status_change_prep_time(pdis_state)
+    @api.model_create_multi
+    def create(self, vals_list):
+        states = super().create(vals_list)
+        self.env['pos.prep.display.stat']._refresh_stats(states.prep_line_id.prep_order_id.ids)
+        return states
+
+    def unlink(self):
+        prep_orders = self.prep_line_id.prep_order_id
+        res = super().unlink()
+        self.env['pos.prep.display.stat']._refresh_stats(prep_orders.exists().ids)
+        return res
+
+    def change_state_status(self, todos, prep_display_id):
+        todo_states = self.filtered(lambda state: todos[str(state.id)])
+        todo_states.write({'todo': True})
+        (self - todo_states).write({'todo': False})
+        self._record_status_change_prep_time()
+        self.env['pos.prep.display.stat']._refresh_stats(self.prep_line_id.prep_order_id.ids)
 
         p_dis = self.env['pos.prep.display'].browse(int(prep_display_id))
-        p_dis._notify('CHANGE_STATE_STATUS', pdis_state_todos)
+        p_dis._notify('CHANGE_STATE_STATUS', {
+            'sequence': p_dis._next_notification_sequences()[p_dis.id],
+            'pdis_state_todos': [{'id': pdis_state.id, 'todo': pdis_state.todo} for pdis_state in self],
+            'versions': p_dis._get_record_versions(self),
+        })
 
         return True
 
-    def _record_status_change_prep_time(self, pdis_state):
-        # If first stage & line is done, write the preparation_time
-        if not pdis_state.todo and pdis_state.stage_id.is_stage_position(0) and pdis_state.prep_line_id.pos_order_line_id.preparation_time == -1:
-            pdis_state.prep_line_id.pos_order_line_id.preparation_time = compute_seconds_since(pdis_state.last_stage_change)
-        elif pdis_state.todo and pdis_state.stage_id.is_stage_position(0) and pdis_state.prep_line_id.pos_order_line_id.preparation_time != -1:
-            pdis_state.prep_line_id.pos_order_line_id.preparation_time = -1
-        # If second last stage & line is done, write the service_time
-        if len(pdis_state.stage_id) > 1:
-            if not pdis_state.todo and pdis_state.stage_id.is_stage_position(-2) and pdis_state.prep_line_id.pos_order_line_id.service_time == -1:
-                pdis_state.prep_line_id.pos_order_line_id.service_time = compute_seconds_since(pdis_state.last_stage_change)
-            elif pdis_state.todo and pdis_state.stage_id.is_stage_position(-2) and pdis_state.prep_line_id.pos_order_line_id.service_time != -1:
-                pdis_state.prep_line_id.pos_order_line_id.service_time = -1
+    def _record_status_change_prep_time(self):
+        positions = self._get_stage_positions()
+        preparation_times = {}
+        for pdis_state in self:
+            order_line = pdis_state.prep_line_id.pos_order_line_id
+            if not order_line or positions.get(pdis_state.stage_id.id, (None,))[0] != 0:
+                continue
+            preparation_time = preparation_times.get(order_line.id, order_line.preparation_time)
+            # If first stage & line is done, write the preparation_time
+            if not pdis_state.todo and preparation_time == -1:
+                preparation_times[order_line.id] = int(compute_seconds_since(pdis_state.last_stage_change))
+            elif pdis_state.todo and preparation_time != -1:
+                preparation_times[order_line.id] = -1
+        self._write_order_line_times('preparation_time', preparation_times)
 
     def change_state_stage(self, stages, prep_display_id):
-        pdis_state_stages = []
-        prep_order_completion_time = {}
-
+        old_last_stage_changes = {pdis_state.id: pdis_state.last_stage_change for pdis_state in self}
+        state_ids_by_stage = defaultdict(list)
         for pdis_state in self:
-            old_last_stage_change = pdis_state.last_stage_change
-            pdis_state.todo = True
-            pdis_state.stage_id = stages[str(pdis_state.id)]
-            pdis_state.last_stage_change = pdis_state.write_date
-            pdis_state_stages.append({
-                'id': pdis_state.id,
-                'stage_id': pdis_state.stage_id.id,
-                'last_stage_change': pdis_state.last_stage_change
-            })
-            self._record_stage_change_prep_time(pdis_state, old_last_stage_change, prep_order_completion_time)
+            state_ids_by_stage[int(stages[str(pdis_state.id)])].append(pdis_state.id)
+        now = self.env.cr.now()
+        for stage_id, state_ids in state_ids_by_stage.items():
+            self.browse(state_ids).write({'todo': True, 'stage_id': stage_id, 'last_stage_change': now})
+        prep_order_completion_time = self._record_stage_change_prep_time(old_last_stage_changes)
+        self.env['pos.prep.display.stat']._refresh_stats(self.prep_line_id.prep_order_id.ids)
 
         p_dis = self.env['pos.prep.display'].browse(int(prep_display_id))
-        p_dis._notify('CHANGE_STATE_STAGE', {'pdis_state_stages': pdis_state_stages, 'prep_order_completion_time': prep_order_completion_time})
+        p_dis._notify('CHANGE_STATE_STAGE', {
+            'sequence': p_dis._next_notification_sequences()[p_dis.id],
+            'pdis_state_stages': [{
+                'id': pdis_state.id,
+                'stage_id': pdis_state.stage_id.id,
+                'last_stage_change': pdis_state.last_stage_change,
+            } for pdis_state in self],
+            'prep_order_completion_time': prep_order_completion_time,
+            'versions': p_dis._get_record_versions(self, self.env['pos.prep.order'].browse(prep_order_completion_time)),
+        })
 
         return True
 
-    def _record_stage_change_prep_time(self, pdis_state, old_last_stage_change, prep_order_completion_time):
-        # If new stage is the first one & line is not done, it means the order has been reset
-        if pdis_state.stage_id.is_stage_position(0):
-            if pdis_state.prep_line_id.pos_order_line_id.preparation_time != -1:
-                pdis_state.prep_line_id.pos_order_line_id.preparation_time = -1
-            if pdis_state.prep_line_id.pos_order_line_id.service_time != -1:
-                pdis_state.prep_line_id.pos_order_line_id.service_time = -1
-        # If new stage is the second last one & line is done, write the preparation_time
-        if len(pdis_state.stage_id) > 1:
-            if pdis_state.prep_line_id.pos_order_line_id.preparation_time == -1 and pdis_state.stage_id.is_stage_position(-2):
-                pdis_state.prep_line_id.pos_order_line_id.preparation_time = compute_seconds_since(old_last_stage_change)
-        # If new stage is the last one & line is done, write the service_time
-        if pdis_state.prep_line_id.pos_order_line_id.service_time == -1 and pdis_state.stage_id.is_stage_position(-1):
-            pdis_state.prep_line_id.pos_order_line_id.service_time = compute_seconds_since(old_last_stage_change)
-
-        # If the order is done, write the completion_time
+    def _record_stage_change_prep_time(self, old_last_stage_changes):
+        """ Write the timings of the order lines of the states moved to a new
+        stage, and the completion time of the orders reaching the last stage,
+        returned as ``{prep_order_id: minutes}``. """
+        positions = self._get_stage_positions()
+        preparation_times, service_times = {}, {}
+        done_prep_order_ids = []
+        for pdis_state in self:
+            position, stage_count = positions.get(pdis_state.stage_id.id, (None, 0))
+            is_last_stage = position is not None and position == stage_count - 1
+            order_line = pdis_state.prep_line_id.pos_order_line_id
+            if order_line:
+                # If new stage is the first one & line is not done, it means the order has been reset
+                if position == 0:
+                    if preparation_times.get(order_line.id, order_line.preparation_time) != -1:
+                        preparation_times[order_line.id] = -1
+                    if service_times.get(order_line.id, order_line.service_time) != -1:
+                        service_times[order_line.id] = -1
+                # If new stage is the last one & line is done, write the service_time
+                if is_last_stage and service_times.get(order_line.id, order_line.service_time) == -1:
+                    service_times[order_line.id] = int(compute_seconds_since(old_last_stage_changes[pdis_state.id]))
+            if is_last_stage:
+                done_prep_order_ids.append(pdis_state.prep_line_id.prep_order_id.id)
+        self._write_order_line_times('preparation_time', preparation_times)
+        self._write_order_line_times('service_time', service_times)
+
+        # If the order is done, write the completion_time, once the timings of all its lines are written
         # Also, if all the quantities are cancelled (don't have pos_order_line_id in that case), no need to update the completion_time
-        if pdis_state.stage_id.is_stage_position(-1) and pdis_state.prep_line_id.prep_order_id.id not in prep_order_completion_time and pdis_state.prep_line_id.prep_order_id.prep_line_ids.pos_order_line_id:
-            order_completion_seconds = max(
-                pdis_state.prep_line_id.prep_order_id.prep_line_ids.pos_order_line_id.mapped(
-                    lambda line: line.service_time + line.preparation_time
-                )
-            )
-            order_completion_minutes = int(order_completion_seconds / 60)
-            pdis_state.prep_line_id.prep_order_id.completion_time = order_completion_minutes
-            prep_order_completion_time[pdis_state.prep_line_id.prep_order_id.id] = order_completion_minutes
+        prep_order_completion_time = {}
+        for prep_order in self.env['pos.prep.order'].browse(dict.fromkeys(done_prep_order_ids)):
+            order_lines = prep_order.prep_line_ids.pos_order_line_id
+            if order_lines:
+                order_completion_seconds = max(order_lines.mapped(lambda line: line.service_time + line.preparation_time))
+                prep_order.completion_time = int(order_completion_seconds / 60)
+                prep_order_completion_time[prep_order.id] = prep_order.completion_time
+        return prep_order_completion_time
+
+    def _get_stage_positions(self):
+        """ Return the position of the stages of the states in their display and
+        the number of stages of the display, as ``{stage_id: (position, count)}``. """
+        positions = {}
+        for display in self.stage_id.prep_display_id:
+            stage_ids = display.stage_ids.ids
+            for position, stage_id in enumerate(stage_ids):
+                positions[stage_id] = (position, len(stage_ids))
+        return positions
+
+    def _write_order_line_times(self, field_name, times):
+        """ Write the given timings ``{order_line_id: seconds}`` of the order
+        lines in a single query. """
+        if not times:
+            return
+        order_lines = self.env['pos.order.line'].browse(times)
+        order_lines.flush_recordset([field_name])
+        self.env.cr.execute(SQL("""
+            UPDATE pos_order_line
+               SET %(field)s = timing.value,
+                   write_uid = %(uid)s,
+                   write_date = %(now)s
+              FROM unnest(%(ids)s::int[], %(values)s::int[]) AS timing(id, value)
+             WHERE pos_order_line.id = timing.id""",
+            field=SQL.identifier(field_name),
+            uid=self.env.uid,
+            now=self.env.cr.now(),
+            ids=list(times),
+            values=list(times.values()),
+        ))
+        order_lines.invalidate_recordset([field_name, 'write_uid', 'write_date'])
+        order_lines.modified([field_name])
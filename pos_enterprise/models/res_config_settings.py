@@ -6,3 +6,9 @@ class ResConfigSettings(models.TransientModel):
 
     pos_module_pos_urban_piper = fields.Boolean(related='pos_config_id.module_pos_urban_piper', string="Urban Piper", help="Manage your online orders with Urban Piper.", readonly=False)
     module_pos_tyro = fields.Boolean(string="Tyro Payment Terminal", help="The transactions are processed by Tyro. Set your Tyro credentials on the related payment method.")
+    pos_prep_data_retention_days = fields.Integer(
+        string="Preparation Data Retention", config_parameter='pos_enterprise.prep_data_retention_days', default=1,
+        help="Number of days the orders are kept on the preparation displays after their last change.")
+    pos_prep_data_archive = fields.Boolean(
+        string="Archive Preparation Times", config_parameter='pos_enterprise.prep_data_archive',
+        help="Keep a daily summary of the preparation times of each display when their orders are deleted.")
@@ -1,63 +1,156 @@
-from odoo import models, fields
-from odoo.tools import SQL
+from datetime import timedelta
+
+import pytz
+
+from odoo import api, fields, models
+from odoo.tools import SQL, sql
+
+WATERMARK_PARAM = 'pos_enterprise.preparation_time_report_watermark'
+# changes of transactions still running when the report is refreshed are
+# caught by the next refresh
+WATERMARK_OVERLAP = timedelta(hours=1)
 
 
 class PreparationTimeReport(models.Model):
+    """ Preparation times of the order lines, summed per point of sale, product
+    and hour in the timezone of the point of sale.
+
+    The rows are refreshed by a cron: the days of the lines changed since the
+    last refresh are recomputed, so the report only reads the aggregated rows. """
     _name = "preparation.time.report"
-    _auto = False
     _description = "POS Preparation Time Report"
+    _order = 'date desc, order_hour, id'
+    _log_access = False
+
+    date = fields.Date("Date", required=True, readonly=True)
+    order_hour = fields.Char("Hour", required=True, readonly=True)
+    pos_config_id = fields.Many2one('pos.config', string='POS Config', required=True, ondelete='cascade', readonly=True)
+    product_id = fields.Many2one('product.product', string='Product', required=True, ondelete='cascade', readonly=True)
+    line_count = fields.Integer("Lines", readonly=True)
+    qty = fields.Float('Quantity', readonly=True)
+    total_preparation_time = fields.Float("Total Preparation Time", readonly=True)
+    max_preparation_time = fields.Float("Longest Preparation Time", aggregator='max', readonly=True)
+    avg_preparation_time = fields.Float("Average Preparation Time", aggregator='avg', readonly=True)
+
+    _config_product_date_idx = models.Index("(pos_config_id, product_id, date)")
+    _date_idx = models.Index("(date, pos_config_id)")
+
+    def _auto_init(self):
+        # the report used to be a view
+        if sql.table_kind(self.env.cr, self._table) == sql.TableKind.View:
+            self.env.cr.execute(SQL("DROP VIEW %s", SQL.identifier(self._table)))
+        return super()._auto_init()
+
+    def init(self):
+        if not self.env['ir.config_parameter'].sudo().get_param(WATERMARK_PARAM):
+            self._refresh_report()
 
-    preparation_time = fields.Float("Preparation Time")
-    avg_preparation_time = fields.Float("Average Preparation Time")
-    order_hour = fields.Char("Hour")
-    create_date = fields.Datetime("Order Date")
-    pos_config_id = fields.Many2one('pos.config', string='POS Config', readonly=True)
-    product_id = fields.Many2one('product.product', string='Product', readonly=True)
-    order_id = fields.Many2one('pos.order', string='Order', readonly=True)
-    qty = fields.Float('Quantity')
-
-    def _select(self):
-        """Returns the full SQL statement to create or replace the view."""
-        user_tz = self.env.user.tz or 'UTC'
-        return SQL(
-            """
-            CREATE OR REPLACE VIEW %(table_name)s AS
-            WITH base AS (
-                SELECT
-                    line.id,
-                    line.preparation_time,
-                    line.create_date AS create_date,
-                    line.product_id AS product_id,
-                    line.order_id AS order_id,
-                    line.qty AS qty,
-                    TO_CHAR(line.create_date AT TIME ZONE 'UTC' AT TIME ZONE %(user_tz)s, 'HH24:00') AS order_hour,
-                    pc.id AS pos_config_id
-                FROM pos_order_line line
-                JOIN pos_order po ON line.order_id = po.id
-                JOIN pos_config pc ON po.config_id = pc.id
-                WHERE line.preparation_time >= 0
+    def _read_group_select(self, aggregate_spec, query):
+        # average of the lines, not of the rows
+        if aggregate_spec == 'avg_preparation_time:avg':
+            return SQL(
+                "SUM(%s) / NULLIF(SUM(%s), 0)",
+                self._field_to_sql(self._table, 'total_preparation_time', query),
+                self._field_to_sql(self._table, 'line_count', query),
             )
-            SELECT
-                id,
-                preparation_time,
-                AVG(preparation_time) OVER (
-                    PARTITION BY order_hour, pos_config_id
-                ) /
-                COUNT(*) OVER (
-                    PARTITION BY order_hour, pos_config_id
-                ) AS avg_preparation_time,
-                create_date,
-                order_hour,
-                product_id,
-                order_id,
-                qty,
-                pos_config_id
-            FROM base
-            """,
-            table_name=SQL.identifier(self._table),
-            user_tz=user_tz
+        return super()._read_group_select(aggregate_spec, query)
+
+    @api.model
+    def _get_config_timezones(self):
+        """ Return ``{config_id: tz}``, the timezone of the company of each point
+        of sale, in which its lines are bucketed (UTC when not set). """
+        configs = self.env['pos.config'].sudo().with_context(active_test=False).search([])
+        return {
+            config.id: config.company_id.partner_id.tz if config.company_id.partner_id.tz in pytz.all_timezones_set else 'UTC'
+            for config in configs
+        }
+
+    @api.model
+    def _refresh_report(self):
+        """ Recompute the rows of the days having order lines changed since the
+        last refresh, or all the rows on the first refresh. """
+        ICP = self.env['ir.config_parameter'].sudo()
+        watermark = fields.Datetime.to_datetime(ICP.get_param(WATERMARK_PARAM))
+        refresh_date = self.env.cr.now()
+        self.env['pos.order.line'].flush_model(['order_id', 'product_id', 'qty', 'preparation_time'])
+        self.env['pos.order'].flush_model(['config_id'])
+        timezones = self._get_config_timezones()
+
+        days = None
+        if watermark:
+            days = self.env.execute_query(SQL("""
+                SELECT DISTINCT pos_order.config_id, (%(local_date)s)::date
+                  %(from_lines)s
+                 WHERE line.write_date > %(since)s""",
+                local_date=self._local_date_sql(),
+                from_lines=self._from_lines_sql(timezones),
+                since=watermark - WATERMARK_OVERLAP,
+            ))
+        self._refresh_days(days, timezones)
+        ICP.set_param(WATERMARK_PARAM, fields.Datetime.to_string(refresh_date))
+
+    @api.model
+    def _refresh_days(self, days, timezones):
+        """ Replace the rows of the given days ``[(config_id, date)]`` (of all
+        the days if None) by the aggregation of their order lines. """
+        if days is not None and not days:
+            return
+        if days is None:
+            self.env.cr.execute(SQL("DELETE FROM %s", SQL.identifier(self._table)))
+            day_join, line_filter = SQL(), SQL("TRUE")
+        else:
+            config_ids, dates = zip(*days)
+            day_join = SQL("""
+                JOIN unnest(%s::int[], %s::date[]) AS day(config_id, date)
+                  ON day.config_id = line.config_id AND day.date = line.date""",
+                list(config_ids), list(dates),
+            )
+            # bounds of the days in any timezone, to read the lines by index
+            line_filter = SQL(
+                "line.create_date >= %s AND line.create_date < %s",
+                min(dates) - timedelta(days=1), max(dates) + timedelta(days=2),
+            )
+            self.env.cr.execute(SQL("""
+                DELETE FROM %s report
+                      USING unnest(%s::int[], %s::date[]) AS day(config_id, date)
+                      WHERE report.pos_config_id = day.config_id AND report.date = day.date""",
+                SQL.identifier(self._table), list(config_ids), list(dates),
+            ))
+        self.env.cr.execute(SQL("""
+            INSERT INTO %(table)s (date, order_hour, pos_config_id, product_id, line_count, qty,
+                                   total_preparation_time, max_preparation_time, avg_preparation_time)
+                 SELECT line.date, line.order_hour, line.config_id, line.product_id, count(*), sum(line.qty),
+                        sum(line.preparation_time), max(line.preparation_time), avg(line.preparation_time)
+                   FROM (
+                       SELECT pos_order.config_id,
+                              line.product_id,
+                              line.qty,
+                              line.preparation_time,
+                              (%(local_date)s)::date AS date,
+                              TO_CHAR(%(local_date)s, 'HH24:00') AS order_hour
+                         %(from_lines)s
+                        WHERE line.preparation_time >= 0
+                          AND %(line_filter)s
+                   ) line
+                   %(day_join)s
+               GROUP BY line.date, line.order_hour, line.config_id, line.product_id""",
+            table=SQL.identifier(self._table),
+            local_date=self._local_date_sql(),
+            from_lines=self._from_lines_sql(timezones),
+            line_filter=line_filter,
+            day_join=day_join,
+        ))
+        self.invalidate_model()
+
+    @api.model
+    def _from_lines_sql(self, timezones):
+        return SQL("""
+            FROM pos_order_line line
+            JOIN pos_order ON pos_order.id = line.order_id
+       LEFT JOIN unnest(%s::int[], %s::varchar[]) AS config_tz(config_id, tz) ON config_tz.config_id = pos_order.config_id""",
+            list(timezones), list(timezones.values()),
         )
 
-    def init(self):
-        """Initialize the SQL View for the report."""
-        self.env.cr.execute(self._select())
+    @api.model
+    def _local_date_sql(self):
+        return SQL("line.create_date AT TIME ZONE 'UTC' AT TIME ZONE COALESCE(config_tz.tz, 'UTC')")
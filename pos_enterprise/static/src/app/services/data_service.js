@@ -1,10 +1,28 @@
 import { PosData } from "@point_of_sale/app/services/data_service";
+import { browser } from "@web/core/browser/browser";
 import { patch } from "@web/core/utils/patch";
 
 patch(PosData.prototype, {
     async loadInitialData() {
-        const pdisId = odoo.preparation_display.id;
-        return await this.orm.call("pos.prep.display", "load_preparation_data", [parseInt(pdisId)]);
+        const pdisId = parseInt(odoo.preparation_display.id);
+        const [snapshot, data] = await Promise.all([
+            this.loadBootSnapshot(pdisId),
+            this.orm.call("pos.prep.display", "load_preparation_data", [pdisId], {
+                with_static: false,
+            }),
+        ]);
+        return { ...snapshot, ...data };
+    },
+    async loadBootSnapshot(pdisId) {
+        // GET request: the browser revalidates its cached snapshot with the
+        // ETag, the server answering 304 if the static data did not change
+        const response = await browser.fetch(
+            `/pos_preparation_display/boot_snapshot?display_id=${pdisId}`
+        );
+        if (!response.ok) {
+            throw new Error(response.statusText);
+        }
+        return await response.json();
     },
     async loadFieldsAndRelations() {
         const pdisId = odoo.preparation_display.id;
@@ -10,6 +10,9 @@ import { debounce } from "@web/core/utils/timing";
 
 const { DateTime } = luxon;
 
+// delay after which a missed message that was not received late is reloaded
+const GAP_RELOAD_DELAY = 3000;
+
 export class PrepDisplay extends WithLazyGetterTrap {
     static DEPENDENCIES = ["orm", "bus_service", "notification", "pos_data"];
 
@@ -38,63 +41,68 @@ export class PrepDisplay extends WithLazyGetterTrap {
         }, 1000);
 
         this.restoreFilterFromLocalStorage();
-        this.getPreparationDisplayOrder(null);
-
-        this.onNotified = getOnNotified(this.bus, odoo.preparation_display.access_token);
-        this.onNotified("LOAD_ORDERS", async (data) => {
-            await this.getPreparationDisplayOrder(data.orderId);
 
-            const orderToDisplay = this.data.models["pos.prep.state"].filter(
-                (state) => state.prep_line_id.prep_order_id.pos_order_id.id === data.orderId
-            );
-            const minDuration = Math.min(...orderToDisplay.map((state) => state.timeToShow));
+        // Messages are numbered per display and applied one after the other,
+        // see receiveMessage.
+        this.sequence = 0;
+        this.receivedSequences = new Set();
+        this.gapTimeout = null;
+        this.recordVersions = new Map();
+        this.messageQueue = Promise.resolve();
+        this.resync();
 
-            if (data.sound) {
-                if (minDuration) {
-                    setTimeout(() => {
-                        this.ringTheBell();
-                    }, minDuration);
-                } else {
-                    this.ringTheBell();
-                }
-            }
-            if (data.notification) {
-                this.notification.add(data.notification);
-            }
-        });
-        this.onNotified("CHANGE_STATE_STAGE", (data) => {
-            for (const stage of data["pdis_state_stages"]) {
-                const state = this.data.models["pos.prep.state"].get(stage.id);
-                if (!state) {
-                    continue;
-                }
-                this.filterHistory(state);
-                state.stage_id = this.data.models["pos.prep.stage"].get(stage.stage_id);
-                state.todo = true;
-                state.write_date = stage.last_stage_change;
-            }
-            for (const [orderId, completion_time] of Object.entries(
-                data["prep_order_completion_time"]
-            )) {
-                const order = this.data.models["pos.prep.order"].get(orderId);
-                if (!order) {
-                    continue;
+        this.onNotified = getOnNotified(this.bus, odoo.preparation_display.access_token);
+        this.onNotified("LOAD_ORDERS", (data) =>
+            this.receiveMessage(data.sequence, async () => {
+                await this.getPreparationDisplayOrder(null);
+                this.alertOrders(data, []);
+            })
+        );
+        this.onNotified("ORDER_CHANGES", (data) =>
+            this.receiveMessage(data.sequence, async () => {
+                await this.loadOrders(data.data, data.versions);
+                this.alertOrders(data, data.orderIds);
+            })
+        );
+        this.onNotified("CHANGE_STATE_STAGE", (data) =>
+            this.receiveMessage(data.sequence, () => {
+                const versions = data.versions || {};
+                for (const stage of data["pdis_state_stages"]) {
+                    const state = this.data.models["pos.prep.state"].get(stage.id);
+                    if (!state || !this.acceptVersion("pos.prep.state", stage.id, versions)) {
+                        continue;
+                    }
+                    this.filterHistory(state);
+                    state.stage_id = this.data.models["pos.prep.stage"].get(stage.stage_id);
+                    state.todo = true;
+                    state.write_date = stage.last_stage_change;
                 }
-                order.completion_time = completion_time;
-            }
-        });
-        this.onNotified("CHANGE_STATE_STATUS", (lineStatus) => {
-            for (const status of lineStatus) {
-                const state = this.data.models["pos.prep.state"].get(status.id);
-                if (!state) {
-                    continue;
+                for (const [orderId, completion_time] of Object.entries(
+                    data["prep_order_completion_time"]
+                )) {
+                    const order = this.data.models["pos.prep.order"].get(orderId);
+                    if (!order || !this.acceptVersion("pos.prep.order", orderId, versions)) {
+                        continue;
+                    }
+                    order.completion_time = completion_time;
                 }
-                state.todo = status.todo;
-                if (state.stage_id.id === this.lastStage.id && state.todo === false) {
-                    this.filterHistory(state);
+            })
+        );
+        this.onNotified("CHANGE_STATE_STATUS", (data) =>
+            this.receiveMessage(data.sequence, () => {
+                const versions = data.versions || {};
+                for (const status of data["pdis_state_todos"]) {
+                    const state = this.data.models["pos.prep.state"].get(status.id);
+                    if (!state || !this.acceptVersion("pos.prep.state", status.id, versions)) {
+                        continue;
+                    }
+                    state.todo = status.todo;
+                    if (state.stage_id.id === this.lastStage.id && state.todo === false) {
+                        this.filterHistory(state);
+                    }
                 }
-            }
-        });
+            })
+        );
         this.onNotified("NOTIFICATION", async (data) => {
             if (data.sound) {
                 this.ringTheBell();
@@ -105,9 +113,91 @@ export class PrepDisplay extends WithLazyGetterTrap {
         });
         this.bus.addEventListener("BUS:RECONNECT", () => {
             this.ringTheBell();
-            this.getPreparationDisplayOrder(null);
+            this.resync();
         });
     }
+    /**
+     * Apply the messages of the display one after the other. Messages sent
+     * concurrently are received in the order of their commit, not of their
+     * sequence: they are applied as they come, only the records newer than
+     * the loaded ones being kept (see acceptVersion). All the orders are
+     * loaded again only when a missed message did not arrive after a while.
+     */
+    receiveMessage(sequence, apply) {
+        const process = async () => {
+            await apply();
+            this.markReceived(sequence);
+        };
+        this.messageQueue = this.messageQueue.then(process, process);
+        return this.messageQueue;
+    }
+    markReceived(sequence) {
+        if (sequence > this.sequence) {
+            this.receivedSequences.add(sequence);
+        }
+        while (this.receivedSequences.delete(this.sequence + 1)) {
+            this.sequence++;
+        }
+        for (const received of this.receivedSequences) {
+            if (received <= this.sequence) {
+                this.receivedSequences.delete(received);
+            }
+        }
+        if (this.receivedSequences.size && !this.gapTimeout) {
+            const expected = Math.max(...this.receivedSequences);
+            this.gapTimeout = setTimeout(() => {
+                this.gapTimeout = null;
+                if (this.sequence < expected) {
+                    this.resync();
+                } else {
+                    this.markReceived(this.sequence);
+                }
+            }, GAP_RELOAD_DELAY);
+        }
+    }
+    /**
+     * Return whether the version of the record received in a message is not
+     * older than the loaded one, remembering it if so.
+     */
+    acceptVersion(model, id, versions) {
+        const version = versions[model]?.[id];
+        if (!version) {
+            return true;
+        }
+        const key = `${model},${id}`;
+        const current = this.recordVersions.get(key);
+        if (current && version < current) {
+            return false;
+        }
+        this.recordVersions.set(key, version);
+        return true;
+    }
+    resync() {
+        const reload = () => this.getPreparationDisplayOrder(null);
+        this.messageQueue = this.messageQueue.then(reload, reload);
+        return this.messageQueue;
+    }
+    alertOrders(data, orderIds) {
+        const orderToDisplay = this.data.models["pos.prep.state"].filter((state) =>
+            orderIds.includes(state.prep_line_id.prep_order_id.pos_order_id.id)
+        );
+        const minDuration = orderToDisplay.length
+            ? Math.min(...orderToDisplay.map((state) => state.timeToShow))
+            : 0;
+
+        if (data.sound) {
+            if (minDuration) {
+                setTimeout(() => {
+                    this.ringTheBell();
+                }, minDuration);
+            } else {
+                this.ringTheBell();
+            }
+        }
+        if (data.notification) {
+            this.notification.add(data.notification);
+        }
+    }
     get lastStage() {
         return this.data.models["pos.prep.stage"].getAll()[
             this.data.models["pos.prep.stage"].getAll().length - 1
@@ -361,12 +451,26 @@ export class PrepDisplay extends WithLazyGetterTrap {
         }
     }
     async getPreparationDisplayOrder(orderId) {
-        const orders = await this.orm.call(
+        const { sequence, versions, ...orders } = await this.orm.call(
             "pos.prep.display",
             "get_preparation_display_order",
             [this.id, orderId],
             {}
         );
+        await this.loadOrders(orders, versions);
+        if (!orderId) {
+            this.sequence = sequence;
+            this.markReceived(sequence);
+        }
+    }
+    async loadOrders(orders, versions = {}) {
+        for (const model of Object.keys(versions)) {
+            if (orders[model]) {
+                orders[model] = orders[model].filter((record) =>
+                    this.acceptVersion(model, record.id, versions)
+                );
+            }
+        }
         const missingRecords = await this.data.missingRecursive(orders);
         this.data.models.loadConnectedData(missingRecords);
     }
@@ -1,4 +1,5 @@
 # Part of Odoo. See LICENSE file for full copyright and licensing details.
 from . import test_frontend
 from . import test_pos_preparation_display
+from . import test_pos_preparation_display_benchmark
 from . import test_res_config_settings
@@ -0,0 +1,47 @@
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+
+from odoo import Command
+from odoo.addons.point_of_sale.tests.common import TestPoSCommon
+
+
+class TestPreparationDisplayCommon(TestPoSCommon):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.config = cls.basic_config
+        cls.env['pos.prep.display'].search([]).unlink()
+        cls.pdis = cls.env['pos.prep.display'].create({
+            'name': 'Preparation Display',
+            'pos_config_ids': [Command.link(cls.config.id)],
+        })
+
+    def _create_pos_order(self, product_quantities):
+        """ Create an order in the current session and send it to the
+        preparation displays. """
+        lines = [Command.create({
+            'product_id': product.id,
+            'qty': qty,
+            'price_unit': product.lst_price,
+            'price_subtotal': product.lst_price * qty,
+            'price_subtotal_incl': product.lst_price * qty,
+        }) for product, qty in product_quantities]
+        amount = sum(product.lst_price * qty for product, qty in product_quantities)
+        order = self.env['pos.order'].create({
+            'session_id': self.pos_session.id,
+            'company_id': self.config.company_id.id,
+            'lines': lines,
+            'amount_tax': 0,
+            'amount_total': amount,
+            'amount_paid': 0,
+            'amount_return': 0,
+        })
+        self.env['pos.prep.order'].process_order(order.id)
+        return order
+
+    def _get_prep_states(self, order, pdis=None):
+        pdis = pdis or self.pdis
+        return self.env['pos.prep.state'].search([
+            ('prep_line_id.prep_order_id.pos_order_id', '=', order.id),
+            ('stage_id', 'in', pdis.stage_ids.ids),
+        ])
@@ -1,8 +1,14 @@
 # Part of Odoo. See LICENSE file for full copyright and licensing details.
 
+import gzip
+import json
+from datetime import timedelta
+from unittest.mock import patch
+
 from odoo.addons.point_of_sale.tests.common import TestPoSCommon
-from odoo.tests import tagged
-from odoo import Command
+from odoo.addons.pos_enterprise.tests.common import TestPreparationDisplayCommon
+from odoo.tests import HttpCase, tagged
+from odoo import Command, fields
 
 
 @tagged('post_install', '-at_install')
@@ -57,3 +63,288 @@ class TestPosPreparationDisplay(TestPoSCommon):
                          {display1.id, display3.id, display4.id})
         self.assertEqual({d['id'] for d in config4.current_session_id.load_data([])['pos.prep.display']},
                          {display1.id, display3.id})
+
+
+@tagged('post_install', '-at_install')
+class TestPosPreparationDisplayStats(TestPreparationDisplayCommon):
+
+    def test_display_stats(self):
+        self.open_new_session()
+        order1 = self._create_pos_order([(self.product1, 2), (self.product2, 1)])
+        order2 = self._create_pos_order([(self.product3, 1)])
+        Stat = self.env['pos.prep.display.stat']
+        self.assertEqual(Stat.search([('display_id', '=', self.pdis.id)]).mapped('state'), ['progress', 'progress'])
+        self.assertEqual(self.pdis.order_count, 2)
+        self.assertEqual(self.pdis.average_time, 0)
+
+        # bump the first order to the last stage, it stays displayed until cleared
+        states = self._get_prep_states(order1)
+        last_stage = self.pdis.stage_ids[-1]
+        states.change_state_stage({str(state.id): last_stage.id for state in states}, self.pdis.id)
+        stat1 = Stat.search([('prep_order_id.pos_order_id', '=', order1.id)])
+        self.assertEqual(stat1.state, 'ready')
+        self.pdis.invalidate_recordset(['order_count'])
+        self.assertEqual(self.pdis.order_count, 1)
+
+        states.change_state_status({str(state.id): False for state in states}, self.pdis.id)
+        self.assertEqual(stat1.state, 'done')
+        self.assertGreaterEqual(stat1.completion_time, 0)
+
+        # resetting the display removes the statistics of its remaining orders
+        self.pdis.reset()
+        self.assertFalse(Stat.search([('prep_order_id.pos_order_id', '=', order2.id)]))
+        self.pdis.invalidate_recordset(['order_count'])
+        self.assertEqual(self.pdis.order_count, 0)
+
+        # the backfill gives the same statistics as the incremental updates
+        expected = Stat.search([]).read(['display_id', 'prep_order_id', 'state'])
+        Stat._refresh_stats()
+        self.assertEqual(Stat.search([]).read(['display_id', 'prep_order_id', 'state']), expected)
+
+    def test_open_orderlines_in_display(self):
+        self.open_new_session()
+        order1 = self._create_pos_order([(self.product1, 2), (self.product2, 1)])
+        order2 = self._create_pos_order([(self.product3, 1)])
+        states1, states2 = self._get_prep_states(order1), self._get_prep_states(order2)
+        self.assertEqual(len(states1), 2)
+        self.assertEqual(self.pdis._get_open_orderlines_in_display(), states1 + states2)
+        self.assertEqual(self.pdis._get_open_orderlines_in_display([order1.id]), states1)
+
+        # states cleared from the last stage leave the display
+        last_stage = self.pdis.stage_ids[-1]
+        states1.change_state_stage({str(state.id): last_stage.id for state in states1}, self.pdis.id)
+        self.assertEqual(self.pdis._get_open_orderlines_in_display(), states1 + states2)
+        states1.change_state_status({str(state.id): False for state in states1}, self.pdis.id)
+        self.assertEqual(self.pdis._get_open_orderlines_in_display(), states2)
+        data = self.pdis.get_preparation_display_order(order2.id)
+        self.assertEqual({state['id'] for state in data['pos.prep.state']}, set(states2.ids))
+        self.assertFalse(self.pdis.get_preparation_display_order(order1.id)['pos.prep.state'])
+
+        # orders of closed sessions only stay when planned for a later day
+        order2.preset_time = fields.Datetime.now() + timedelta(days=2)
+        self.pos_session.state = 'closed'
+        self.assertEqual(self.pdis._get_open_orderlines_in_display(), states2)
+        order2.preset_time = False
+        self.assertFalse(self.pdis._get_open_orderlines_in_display())
+
+    def test_order_changes_messages(self):
+        bar = self.env['pos.prep.display'].create({
+            'name': 'Bar',
+            'pos_config_ids': [Command.link(self.config.id)],
+        })
+        self.open_new_session()
+        messages = []
+
+        def _notify(display, name, message, **kwargs):
+            messages.append((display.id, name, message))
+
+        with patch.object(self.env.registry['pos.prep.display'], '_notify', _notify):
+            order = self._create_pos_order([(self.product1, 2), (self.product2, 1)])
+            self.assertEqual(len(messages), 2, "The changes should be sent once to each display")
+            for display in (self.pdis, bar):
+                display_id, name, message = next(message for message in messages if message[0] == display.id)
+                self.assertEqual(name, 'ORDER_CHANGES')
+                self.assertEqual(message['sequence'], 1)
+                self.assertEqual(message['orderIds'], [order.id])
+                self.assertEqual({state['id'] for state in message['data']['pos.prep.state']},
+                                 set(self._get_prep_states(order, display).ids))
+                self.assertEqual(len(message['data']['pos.prep.line']), 2)
+                # the displays only apply the records newer than theirs
+                self.assertEqual(set(message['versions']['pos.prep.state']), {state['id'] for state in message['data']['pos.prep.state']})
+                self.assertEqual(set(message['versions']['pos.order']), {order.id})
+
+            messages.clear()
+            states = self._get_prep_states(order)
+            states.change_state_stage({str(state.id): self.pdis.stage_ids[1].id for state in states}, self.pdis.id)
+            self.assertEqual([(display_id, name, message['sequence']) for display_id, name, message in messages],
+                             [(self.pdis.id, 'CHANGE_STATE_STAGE', 2)])
+            self.assertEqual(messages[0][2]['versions']['pos.prep.state'], {
+                state.id: state.write_date.strftime('%Y-%m-%d %H:%M:%S.%f') for state in states
+            })
+
+        self.assertEqual(self.pdis.get_preparation_display_order(None)['sequence'], 2)
+        self.assertEqual(bar.get_preparation_display_order(None)['sequence'], 1)
+
+        # the sequence of the messages goes with the display
+        sequence_name = bar._get_notification_sequence_name()
+        bar.unlink()
+        self.env.cr.execute("SELECT to_regclass(%s)", [sequence_name])
+        self.assertIsNone(self.env.cr.fetchone()[0])
+
+    def test_process_preparation_changes(self):
+        food, drinks = self.env['pos.category'].create([{'name': 'Food'}, {'name': 'Drinks'}])
+        self.product1.pos_categ_ids = food
+        self.product2.pos_categ_ids = drinks
+        self.pdis.category_ids = food
+        bar = self.env['pos.prep.display'].create({
+            'name': 'Bar',
+            'pos_config_ids': [Command.link(self.config.id)],
+            'category_ids': [Command.link(drinks.id)],
+        })
+        self.open_new_session()
+        order = self._create_pos_order([(self.product1, 2), (self.product2, 1)])
+        prep_order = self.env['pos.prep.order'].search([('pos_order_id', '=', order.id)])
+        self.assertEqual(prep_order.prep_line_ids.mapped('quantity'), [2, 1])
+        self.assertEqual(self._get_prep_states(order).prep_line_id.product_id, self.product1)
+        self.assertEqual(self._get_prep_states(order, bar).prep_line_id.product_id, self.product2)
+        self.assertEqual(self._get_prep_states(order).stage_id, self.pdis.stage_ids[0])
+
+        # less food is cancelled, more drinks are sent on a new ticket
+        order.lines.filtered(lambda line: line.product_id == self.product1).qty = 1
+        order.lines.filtered(lambda line: line.product_id == self.product2).qty = 3
+        self.env['pos.prep.order'].process_order(order.id)
+        self.assertEqual(prep_order.prep_line_ids.mapped('cancelled'), [1, 0])
+        new_prep_order = self.env['pos.prep.order'].search([('pos_order_id', '=', order.id)]) - prep_order
+        self.assertEqual(new_prep_order.prep_line_ids.product_id, self.product2)
+        self.assertEqual(new_prep_order.prep_line_ids.quantity, 2)
+        self.assertEqual(len(self._get_prep_states(order, bar)), 2)
+
+    def test_preparation_displays_routing(self):
+        Display = self.env['pos.prep.display']
+        food, drinks = self.env['pos.category'].create([{'name': 'Food'}, {'name': 'Drinks'}])
+        other_config = self.env['pos.config'].create({'name': 'Other'})
+        kitchen = self.pdis
+        kitchen.category_ids = food
+        bar, everywhere = Display.create([
+            {'name': 'Bar', 'category_ids': [Command.link(drinks.id)]},
+            {'name': 'Everywhere'},
+        ])
+        self.open_new_session()
+        other_session = self.env['pos.session'].new({'config_id': other_config.id})
+
+        self.assertEqual(Display._get_preparation_displays(self.pos_session, food.ids), kitchen + everywhere)
+        with self.assertQueryCount(0):
+            self.assertEqual(Display._get_preparation_displays(self.pos_session, drinks.ids), bar + everywhere)
+        self.assertEqual(Display._get_preparation_displays(self.pos_session, []), everywhere)
+        self.assertEqual(Display._get_preparation_displays(other_session, (food + drinks).ids), bar + everywhere)
+
+        # the routing follows the changes of the displays
+        kitchen.pos_config_ids = [Command.link(other_config.id)]
+        self.assertEqual(Display._get_preparation_displays(other_session, food.ids), kitchen + everywhere)
+        bar.unlink()
+        self.assertEqual(Display._get_preparation_displays(self.pos_session, drinks.ids), everywhere)
+        self.assertEqual(Display._load_pos_data_domain({}, other_config), [('id', 'in', [kitchen.id, everywhere.id])])
+
+    def test_batched_state_transitions(self):
+        self.open_new_session()
+        first_stage, __, last_stage = self.pdis.stage_ids
+        order = self._create_pos_order([(self.product1, 1)] * 20 + [(self.product2, 2)] * 20)
+        prep_order = self.env['pos.prep.order'].search([('pos_order_id', '=', order.id)])
+        states = self._get_prep_states(order)
+        self.assertEqual(len(states), 40)
+
+        states.change_state_status({str(state.id): False for state in states}, self.pdis.id)
+        self.assertFalse(any(states.mapped('todo')))
+        self.assertTrue(all(time >= 0 for time in order.lines.mapped('preparation_time')))
+        states.change_state_status({str(state.id): True for state in states}, self.pdis.id)
+        self.assertEqual(set(order.lines.mapped('preparation_time')), {-1})
+
+        states.change_state_stage({str(state.id): last_stage.id for state in states}, self.pdis.id)
+        self.assertEqual(states.stage_id, last_stage)
+        self.assertTrue(all(states.mapped('todo')))
+        self.assertTrue(all(time >= 0 for time in order.lines.mapped('service_time')))
+        self.assertEqual(prep_order.completion_time, int((max(order.lines.mapped('service_time')) - 1) / 60))
+
+        states.change_state_stage({str(state.id): first_stage.id for state in states}, self.pdis.id)
+        self.assertEqual(set(order.lines.mapped('service_time')), {-1})
+
+        # the number of queries does not depend on the number of states
+        small_order = self._create_pos_order([(self.product1, 1), (self.product2, 1)])
+        query_counts = []
+        for order_states in (self._get_prep_states(small_order), states):
+            self.env.flush_all()
+            self.env.invalidate_all()
+            query_count = self.env.cr.sql_log_count
+            order_states.change_state_stage({str(state.id): last_stage.id for state in order_states}, self.pdis.id)
+            self.env.flush_all()
+            query_counts.append(self.env.cr.sql_log_count - query_count)
+        self.assertEqual(query_counts[0], query_counts[1])
+
+    def test_clean_preparation_data(self):
+        self.open_new_session()
+        old_orders = [self._create_pos_order([(self.product1, 1), (self.product2, 1)]) for __ in range(3)]
+        recent_order = self._create_pos_order([(self.product3, 1)])
+        PrepOrder = self.env['pos.prep.order']
+        old_prep_orders = PrepOrder.search([('pos_order_id', 'in', [order.id for order in old_orders])])
+        states = self._get_prep_states(old_orders[0])
+        states.change_state_stage({str(state.id): self.pdis.stage_ids[-1].id for state in states}, self.pdis.id)
+        self.env.flush_all()
+        self.env.cr.execute(
+            "UPDATE pos_prep_order SET write_date = write_date - interval '3 days' WHERE id IN %s",
+            [tuple(old_prep_orders.ids)],
+        )
+        self.env['ir.config_parameter'].set_param('pos_enterprise.prep_data_retention_days', 2)
+        self.env['ir.config_parameter'].set_param('pos_enterprise.prep_data_archive', True)
+
+        PrepOrder._clean_preparation_data(batch_size=2)
+        self.assertFalse(old_prep_orders.exists())
+        self.assertFalse(self.env['pos.prep.line'].search([('prep_order_id', 'in', old_prep_orders.ids)]))
+        self.assertFalse(self.env['pos.prep.display.stat'].search([('prep_order_id', 'in', old_prep_orders.ids)]))
+        self.assertEqual(len(self._get_prep_states(recent_order)), 1)
+
+        archive = self.env['pos.prep.display.archive'].search([('display_id', '=', self.pdis.id)])
+        self.assertEqual(archive.pos_config_id, self.config)
+        self.assertEqual(archive.order_count, 3)
+        self.assertGreaterEqual(archive.max_completion_time, 0)
+
+    def test_preparation_time_report(self):
+        self.env['ir.config_parameter'].set_param('pos_enterprise.preparation_time_report_watermark', False)
+        self.config.company_id.partner_id.tz = 'Asia/Kolkata'
+        self.open_new_session()
+        order = self._create_pos_order([(self.product1, 2), (self.product2, 1), (self.product1, 1)])
+        line1, line2, line3 = order.lines
+        self.env['pos.prep.state']._write_order_line_times('preparation_time', {line1.id: 60, line2.id: 30, line3.id: 120})
+        Report = self.env['preparation.time.report']
+        Report._refresh_report()
+
+        row1 = Report.search([('pos_config_id', '=', self.config.id), ('product_id', '=', self.product1.id)])
+        local_time = fields.Datetime.context_timestamp(self.env['res.partner'].with_context(tz='Asia/Kolkata'), line1.create_date)
+        self.assertEqual((row1.date, row1.order_hour), (local_time.date(), local_time.strftime('%H:00')))
+        self.assertRecordValues(row1, [{'line_count': 2, 'qty': 3, 'total_preparation_time': 180, 'max_preparation_time': 120, 'avg_preparation_time': 90}])
+        # the average of the report is the one of the lines, not of the rows
+        [(average,)] = Report._read_group([('pos_config_id', '=', self.config.id)], [], ['avg_preparation_time:avg'])
+        self.assertAlmostEqual(average, 70)
+
+        # only the days of the changed lines are refreshed
+        self.env['pos.prep.state']._write_order_line_times('preparation_time', {line1.id: -1, line2.id: 90})
+        Report._refresh_report()
+        rows = Report.search([('pos_config_id', '=', self.config.id)])
+        self.assertEqual(sorted(rows.mapped('line_count')), [1, 1])
+        self.assertEqual(sorted(rows.mapped('avg_preparation_time')), [90, 120])
+
+
+@tagged('post_install', '-at_install')
+class TestPosPreparationDisplayBootSnapshot(TestPreparationDisplayCommon, HttpCase):
+
+    def _get_boot_snapshot(self, etag=None):
+        return self.url_open(
+            f'/pos_preparation_display/boot_snapshot?display_id={self.pdis.id}',
+            headers={'If-None-Match': etag} if etag else None,
+        )
+
+    def test_boot_snapshot(self):
+        static_models = self.pdis._load_preparation_static_models()
+        data = self.pdis.load_preparation_data()
+        # building the snapshot doesn't load the orders of the display
+        self.env['pos.category'].create({'name': 'Starters'})
+        with patch.object(self.env.registry['pos.prep.order'], '_load_pos_preparation_data', side_effect=AssertionError):
+            etag, snapshot = self.pdis._get_boot_snapshot()
+        data['pos.category'] = self.pdis.load_preparation_data()['pos.category']
+        self.assertEqual(json.loads(gzip.decompress(snapshot)), {model: data[model] for model in static_models})
+        self.assertEqual(self.pdis._get_boot_snapshot(), (etag, snapshot))
+        volatile_data = self.pdis.load_preparation_data(with_static=False)
+        self.assertFalse(set(static_models) & set(volatile_data))
+        self.assertIn('pos.prep.display', volatile_data)
+
+        self.authenticate('admin', 'admin')
+        response = self._get_boot_snapshot()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['pos.prep.stage'], data['pos.prep.stage'])
+        etag = response.headers['ETag']
+        self.assertEqual(self._get_boot_snapshot(etag).status_code, 304)
+
+        # changes of the static data give a new version
+        self.env['pos.category'].create({'name': 'Desserts'})
+        response = self._get_boot_snapshot(etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Desserts', [category['display_name'] for category in response.json()['pos.category']])
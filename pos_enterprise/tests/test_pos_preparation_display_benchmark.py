@@ -0,0 +1,456 @@
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+
+import json
+import logging
+import os
+import random
+import time
+
+from collections import defaultdict
+from datetime import timedelta
+from unittest.mock import patch
+
+from odoo import Command, fields
+
+from odoo.addons.pos_enterprise.tests.common import TestPreparationDisplayCommon
+from odoo.tests import tagged
+from odoo.tools import SQL, json_default
+
+_logger = logging.getLogger(__name__)
+
+
+@tagged('post_install', '-at_install', '-standard', 'pos_enterprise_benchmark')
+class TestPreparationDisplayBenchmark(TestPreparationDisplayCommon):
+    """ Time the kitchen paths on large volumes of preparation data. Not run
+    by default, use ``--test-tags pos_enterprise_benchmark``. """
+    PREP_ORDERS = 100000
+    LINES_PER_ORDER = 10
+    # an hour of rush on a large kitchen
+    DISPLAYS = 20
+    ORDERS = 500
+    # a banquet table
+    BANQUET_LINES = 200
+    # a year of sales
+    REPORT_LINES = 3000000
+
+    def _insert_prep_data(self, pos_order):
+        """ Insert PREP_ORDERS preparation orders of LINES_PER_ORDER lines for
+        the given order, with their states spread over the stages of the
+        display, and return the ids of the preparation orders. """
+        stage_ids = self.pdis.stage_ids.ids
+        prep_order_ids = [prep_order_id for prep_order_id, in self.env.execute_query(SQL("""
+            INSERT INTO pos_prep_order (pos_order_id, create_uid, write_uid, create_date, write_date)
+                 SELECT %(pos_order_id)s, %(uid)s, %(uid)s, now() at time zone 'UTC', now() at time zone 'UTC'
+                   FROM generate_series(1, %(count)s)
+              RETURNING id""",
+            pos_order_id=pos_order.id, uid=self.env.uid, count=self.PREP_ORDERS,
+        ))]
+        self.env.cr.execute(SQL("""
+            WITH line AS (
+                INSERT INTO pos_prep_line (prep_order_id, quantity, cancelled, product_id, create_uid, write_uid, create_date, write_date)
+                     SELECT prep_order_id, 1, 0, %(product_id)s, %(uid)s, %(uid)s, now() at time zone 'UTC', now() at time zone 'UTC'
+                       FROM unnest(%(prep_order_ids)s::int[]) AS prep_order_id, generate_series(1, %(lines)s)
+                  RETURNING id, prep_order_id
+            )
+            INSERT INTO pos_prep_state (prep_line_id, stage_id, todo, last_stage_change, create_uid, write_uid, create_date, write_date)
+                 SELECT line.id, (%(stage_ids)s::int[])[1 + mod(line.prep_order_id, %(stage_count)s)], mod(line.id, 2) = 0,
+                        now() at time zone 'UTC', %(uid)s, %(uid)s, now() at time zone 'UTC', now() at time zone 'UTC'
+                   FROM line""",
+            product_id=self.product1.id, uid=self.env.uid, prep_order_ids=prep_order_ids,
+            lines=self.LINES_PER_ORDER, stage_ids=stage_ids, stage_count=len(stage_ids),
+        ))
+        self.env.cr.execute("ANALYZE pos_prep_order, pos_prep_line, pos_prep_state")
+        return prep_order_ids
+
+    def test_display_stats_throughput(self):
+        self.open_new_session()
+        pos_order = self._create_pos_order([(self.product1, 1)])
+        prep_order_ids = self._insert_prep_data(pos_order)
+        Stat = self.env['pos.prep.display.stat']
+
+        start = time.perf_counter()
+        Stat._refresh_stats()
+        backfill_duration = time.perf_counter() - start
+        self.assertEqual(Stat.search_count([('display_id', '=', self.pdis.id)]), self.PREP_ORDERS + 1)
+
+        states = self.env['pos.prep.state'].search([('prep_line_id.prep_order_id', '=', prep_order_ids[0])])
+        start = time.perf_counter()
+        states.change_state_stage({str(state.id): self.pdis.stage_ids[-1].id for state in states}, self.pdis.id)
+        transition_duration = time.perf_counter() - start
+
+        start = time.perf_counter()
+        self.pdis.invalidate_recordset(['order_count', 'average_time'])
+        with self.assertQueryCount(1):
+            self.pdis.order_count
+        read_duration = time.perf_counter() - start
+
+        _logger.info(
+            "Display statistics over %d states: backfill %.2fs, transition of one order %.3fs, read %.3fs",
+            self.PREP_ORDERS * self.LINES_PER_ORDER, backfill_duration, transition_duration, read_duration,
+        )
+
+    def test_order_changes_throughput(self):
+        """ Send DISPLAYS x ORDERS orders to the displays, as pushed changes,
+        compared with each display reloading the order. """
+        displays = self.pdis + self.env['pos.prep.display'].create([{
+            'name': f'Display {index}',
+            'pos_config_ids': [Command.link(self.config.id)],
+        } for index in range(self.DISPLAYS - 1)])
+        self.open_new_session()
+        payload_sizes = []
+
+        def _notify(display, name, message, **kwargs):
+            payload_sizes.append(len(json.dumps(message, default=json_default)))
+
+        push_queries = push_duration = reload_queries = reload_duration = 0
+        with patch.object(self.env.registry['pos.prep.display'], '_notify', _notify):
+            for __ in range(self.ORDERS):
+                queries = self.env.cr.sql_log_count
+                start = time.perf_counter()
+                order = self._create_pos_order([(self.product1, 2), (self.product2, 1), (self.product3, 1)])
+                self.env.flush_all()
+                push_duration += time.perf_counter() - start
+                push_queries += self.env.cr.sql_log_count - queries
+
+                # what each display did when only notified of the order
+                self.env.invalidate_all()
+                queries = self.env.cr.sql_log_count
+                start = time.perf_counter()
+                for display in displays:
+                    display.get_preparation_display_order(order.id)
+                reload_duration += time.perf_counter() - start
+                reload_queries += self.env.cr.sql_log_count - queries
+
+        _logger.info(
+            "%d orders on %d displays: pushed changes %.1fms and %.1f queries per order (order processing "
+            "included), %d bytes per message on average; reloads by the displays %.1fms and %.1f queries per order",
+            self.ORDERS, self.DISPLAYS, push_duration * 1000 / self.ORDERS, push_queries / self.ORDERS,
+            sum(payload_sizes) / len(payload_sizes), reload_duration * 1000 / self.ORDERS, reload_queries / self.ORDERS,
+        )
+        self.assertEqual(len(payload_sizes), self.ORDERS * self.DISPLAYS)
+
+    def test_process_preparation_changes_banquet(self):
+        """ Send an order of BANQUET_LINES lines to the kitchen, then send it
+        again after changing half of the lines. """
+        categories = self.env['pos.category'].create([{'name': f'Category {index}'} for index in range(5)])
+        products = self.env['product.product'].create([{
+            'name': f'Dish {index}',
+            'list_price': 10,
+            'available_in_pos': True,
+            'pos_categ_ids': [Command.link(categories[index % len(categories)].id)],
+        } for index in range(self.BANQUET_LINES)])
+        self.env['pos.prep.display'].create([{
+            'name': f'Station {category.name}',
+            'pos_config_ids': [Command.link(self.config.id)],
+            'category_ids': [Command.link(category.id)],
+        } for category in categories])
+        self.open_new_session()
+        order = self._create_pos_order([(product, 1) for product in products[:1]])
+        order.write({'lines': [Command.create({
+            'product_id': product.id,
+            'qty': 2,
+            'price_unit': 10,
+            'price_subtotal': 20,
+            'price_subtotal_incl': 20,
+        }) for product in products[1:]]})
+
+        for step in ('send', 'update'):
+            if step == 'update':
+                for line in order.lines[::2]:
+                    line.qty += 1
+            self.env.flush_all()
+            self.env.invalidate_all()
+            queries = self.env.cr.sql_log_count
+            start = time.perf_counter()
+            data = order._process_preparation_changes({})
+            self.env.flush_all()
+            duration = time.perf_counter() - start
+            _logger.info("Preparation changes of a %d lines order (%s): %.1fms, %d queries",
+                         self.BANQUET_LINES, step, duration * 1000, self.env.cr.sql_log_count - queries)
+            self.assertTrue(data['change'])
+        self.assertEqual(len(self.env['pos.prep.order'].search([('pos_order_id', '=', order.id)]).prep_line_ids),
+                         self.BANQUET_LINES + self.BANQUET_LINES // 2)
+
+    def test_clean_preparation_data_locks(self):
+        """ Purge PREP_ORDERS x LINES_PER_ORDER lines by batches, archiving
+        their timings, and report how long each batch keeps the rows locked
+        compared with the deletion in a single transaction. """
+        self.open_new_session()
+        pos_order = self._create_pos_order([(self.product1, 1)])
+        self.env['ir.config_parameter'].set_param('pos_enterprise.prep_data_archive', True)
+        PrepOrder = self.env['pos.prep.order']
+
+        def backdate(prep_order_ids):
+            self.env.cr.execute(SQL(
+                "UPDATE pos_prep_order SET write_date = write_date - interval '2 days' WHERE id IN %s",
+                tuple(prep_order_ids),
+            ))
+
+        batch_durations = []
+        batch_start = [0]
+
+        def _commit_progress(cron, processed=0, *, remaining=None, deactivate=False):
+            batch_durations.append(time.perf_counter() - batch_start[0])
+            batch_start[0] = time.perf_counter()
+            return 1
+
+        backdate(self._insert_prep_data(pos_order))
+        self.env['pos.prep.display.stat']._refresh_stats()
+        with patch.object(self.env.registry['ir.cron'], '_commit_progress', _commit_progress):
+            start = batch_start[0] = time.perf_counter()
+            PrepOrder._clean_preparation_data()
+            batched_duration = time.perf_counter() - start
+        self.assertEqual(self.env['pos.prep.display.archive'].search([]).order_count, self.PREP_ORDERS)
+
+        backdate(self._insert_prep_data(pos_order))
+        start = time.perf_counter()
+        PrepOrder.search([('write_date', '<=', fields.Datetime.now() - timedelta(days=1))]).unlink()
+        single_duration = time.perf_counter() - start
+
+        _logger.info(
+            "Purge of %d preparation lines: %.2fs in %d batches locking the rows for %.3fs at most "
+            "(%.3fs on average), %.2fs when locked in a single transaction",
+            self.PREP_ORDERS * self.LINES_PER_ORDER, batched_duration, len(batch_durations),
+            max(batch_durations), sum(batch_durations) / len(batch_durations), single_duration,
+        )
+        self.assertFalse(PrepOrder.search_count([('write_date', '<=', fields.Datetime.now() - timedelta(days=1))]))
+
+    def test_preparation_time_report_refresh(self):
+        """ Build the preparation time report over REPORT_LINES order lines
+        spread over a year, then refresh it after the changes of a service. """
+        self.open_new_session()
+        order = self._create_pos_order([(self.product1, 1), (self.product2, 1), (self.product3, 1)])
+        columns = [column for column, in self.env.execute_query(SQL(
+            "SELECT column_name FROM information_schema.columns WHERE table_name = 'pos_order_line' AND column_name NOT IN %s",
+            ('id', 'uuid', 'create_date', 'write_date', 'preparation_time'),
+        ))]
+        self.env.flush_all()
+        self.env.cr.execute(SQL("""
+            INSERT INTO pos_order_line (%(columns)s, create_date, write_date, preparation_time)
+                 SELECT %(columns)s,
+                        now() at time zone 'UTC' - mod(serie, 365) * interval '1 day' - mod(serie, 24) * interval '1 hour',
+                        now() at time zone 'UTC' - mod(serie, 365) * interval '1 day',
+                        mod(serie, 900)
+                   FROM pos_order_line, generate_series(1, %(count)s) AS serie
+                  WHERE order_id = %(order_id)s""",
+            columns=SQL(", ").join(SQL.identifier(column) for column in columns),
+            count=self.REPORT_LINES // len(order.lines),
+            order_id=order.id,
+        ))
+        self.env.cr.execute("ANALYZE pos_order_line")
+        Report = self.env['preparation.time.report']
+        self.env['ir.config_parameter'].set_param('pos_enterprise.preparation_time_report_watermark', False)
+
+        start = time.perf_counter()
+        Report._refresh_report()
+        full_duration = time.perf_counter() - start
+
+        self.env['pos.prep.state']._write_order_line_times('preparation_time', {line.id: 300 for line in order.lines})
+        start = time.perf_counter()
+        Report._refresh_report()
+        incremental_duration = time.perf_counter() - start
+
+        start = time.perf_counter()
+        groups = Report.formatted_read_group(
+            [('date', '>', fields.Date.today() - timedelta(days=30))], ['order_hour', 'pos_config_id'], ['avg_preparation_time:avg'],
+        )
+        read_duration = time.perf_counter() - start
+        _logger.info(
+            "Preparation time report over %d order lines: %d rows built in %.2fs, refreshed in %.3fs "
+            "after the changes of a service, graph of the last 30 days read in %.3fs",
+            self.REPORT_LINES, Report.search_count([]), full_duration, incremental_duration, read_duration,
+        )
+        self.assertTrue(groups)
+
+
+@tagged('post_install', '-at_install', '-standard', 'pos_enterprise_benchmark')
+class TestPreparationDisplayReplay(TestPreparationDisplayCommon):
+    """ Replay a service day against several preparation displays and report,
+    for each step of the kitchen path, its latency percentiles, its number of
+    queries and the size of the bus messages it sends.
+
+    The day is synthetic, unless ``POS_PREP_REPLAY_FILE`` gives the path of a
+    recorded one: a JSON list of the events built by ``_generate_service_day``.
+    The results are written to ``POS_PREP_BENCHMARK_OUTPUT`` when set, and
+    compared with the results of ``POS_PREP_BENCHMARK_BASELINE`` when set, the
+    test failing on a regression. Not run by default, use ``--test-tags
+    pos_enterprise_benchmark``. """
+    SERVICE_ORDERS = 300
+    CATEGORIES = 4
+    PRODUCTS = 40
+    # one display per category, the other ones showing everything
+    REPLAY_DISPLAYS = 8
+    # latencies may grow by 25% over the baseline, queries may not grow
+    LATENCY_TOLERANCE = 0.25
+    # probability of each event happening after an order, on one of the
+    # orders still in the kitchen
+    EVENT_RATES = {'modify': 0.5, 'cancel': 0.05, 'merge': 0.05, 'bump': 2.5, 'reload': 0.2}
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        categories = cls.env['pos.category'].create([{'name': f'Station {index}'} for index in range(cls.CATEGORIES)])
+        cls.products = cls.env['product.product'].create([{
+            'name': f'Dish {index}',
+            'list_price': 10,
+            'available_in_pos': True,
+            'pos_categ_ids': [Command.link(categories[index % cls.CATEGORIES].id)],
+        } for index in range(cls.PRODUCTS)])
+        cls.displays = cls.pdis + cls.env['pos.prep.display'].create([{
+            'name': f'Display {index}',
+            'pos_config_ids': [Command.link(cls.config.id)],
+            'category_ids': [Command.link(categories[index].id)] if index < cls.CATEGORIES else [],
+        } for index in range(cls.REPLAY_DISPLAYS - 1)])
+
+    def _generate_service_day(self, seed=42):
+        """ Return the events of a synthetic service day: orders of a few
+        dishes, followed by the changes of the orders still in the kitchen
+        (dishes added, orders cancelled or merged into another one, stages
+        bumped on a display) and by the reloads of the displays. Orders and
+        products are referred to by their index. """
+        rng = random.Random(seed)
+        events, open_orders = [], []
+        for order in range(self.SERVICE_ORDERS):
+            events.append({'step': 'order', 'order': order, 'lines': [
+                [rng.randrange(self.PRODUCTS), rng.randint(1, 3)] for __ in range(rng.randint(1, 6))
+            ]})
+            open_orders.append(order)
+            for step, rate in self.EVENT_RATES.items():
+                for __ in range(int(rate) + (rng.random() < rate % 1)):
+                    if step == 'reload':
+                        events.append({'step': step, 'display': rng.randrange(self.REPLAY_DISPLAYS)})
+                        continue
+                    target = rng.choice(open_orders)
+                    if step == 'modify':
+                        events.append({'step': step, 'order': target, 'lines': [[rng.randrange(self.PRODUCTS), 1]]})
+                    elif step == 'bump':
+                        events.append({'step': step, 'order': target, 'display': rng.randrange(self.REPLAY_DISPLAYS)})
+                    elif len(open_orders) > 1:
+                        open_orders.remove(target)
+                        if step == 'merge':
+                            events.append({'step': step, 'order': target, 'into': rng.choice(open_orders)})
+                        else:
+                            events.append({'step': step, 'order': target})
+            # orders leave the kitchen after a while
+            if len(open_orders) > 30:
+                open_orders.pop(0)
+        return events
+
+    def _replay(self, events):
+        """ Replay the events and return the measures of each step, as
+        ``{step: [(seconds, queries, bus_bytes)]}``. """
+        PrepOrder = self.env['pos.prep.order']
+        can_merge = hasattr(PrepOrder, 'merge_orders')
+        orders, measures, bus_bytes = {}, defaultdict(list), [0]
+
+        def _notify(display, name, message, **kwargs):
+            bus_bytes[0] += len(json.dumps(message, default=json_default))
+
+        with patch.object(self.env.registry['pos.prep.display'], '_notify', _notify):
+            for event in events:
+                step = event['step']
+                if step == 'merge' and not can_merge:
+                    continue
+                # what the display sends to the server, not measured
+                if step == 'bump':
+                    display = self.displays[event['display']]
+                    states = self._get_prep_states(orders[event['order']], display).filtered('todo')
+                    if not states:
+                        continue
+                    stage_ids = display.stage_ids.ids
+                elif step == 'modify':
+                    order = orders[event['order']]
+                    order.write({'lines': [Command.create({
+                        'product_id': self.products[product].id,
+                        'qty': qty,
+                        'price_unit': 10,
+                        'price_subtotal': 10 * qty,
+                        'price_subtotal_incl': 10 * qty,
+                    }) for product, qty in event['lines']]})
+                self.env.flush_all()
+                self.env.invalidate_all()
+
+                bus_bytes[0] = 0
+                queries = self.env.cr.sql_log_count
+                start = time.perf_counter()
+                if step == 'order':
+                    order_data = self.create_ui_order_data([(self.products[product], qty) for product, qty in event['lines']])
+                    order_data.update(state='draft', payment_ids=[], amount_paid=0)
+                    data = self.env['pos.order'].with_context(
+                        preparation={'process_order_options': {}},
+                    ).sync_from_ui([order_data])
+                    orders[event['order']] = self.env['pos.order'].browse(data['pos.order'][0]['id'])
+                elif step == 'modify':
+                    PrepOrder.process_order(order.id)
+                elif step == 'cancel':
+                    PrepOrder.process_order(orders[event['order']].id, {'cancelled': True})
+                elif step == 'merge':
+                    PrepOrder.merge_orders(orders[event['order']].id, orders[event['into']].id)
+                    orders[event['order']] = orders[event['into']]
+                elif step == 'bump':
+                    # move the lines to the next stage, clear them once all are in the last one
+                    to_move = states.filtered(lambda state: state.stage_id.id != stage_ids[-1])
+                    if to_move:
+                        next_stages = dict(zip(stage_ids, stage_ids[1:]))
+                        to_move.change_state_stage({str(state.id): next_stages[state.stage_id.id] for state in to_move}, display.id)
+                    else:
+                        states.change_state_status({str(state.id): False for state in states}, display.id)
+                elif step == 'reload':
+                    self.displays[event['display']].get_preparation_display_order(None)
+                self.env.flush_all()
+                measures[step].append((time.perf_counter() - start, self.env.cr.sql_log_count - queries, bus_bytes[0]))
+        return measures
+
+    def _percentile(self, values, percentile):
+        values = sorted(values)
+        return values[min(len(values) - 1, int(len(values) * percentile))]
+
+    def test_replay_service_day(self):
+        replay_file = os.getenv('POS_PREP_REPLAY_FILE')
+        if replay_file:
+            with open(replay_file) as file:
+                events = json.load(file)
+        else:
+            events = self._generate_service_day()
+        self.open_new_session()
+        measures = self._replay(events)
+
+        results = {}
+        for step, step_measures in sorted(measures.items()):
+            durations, queries, payloads = zip(*step_measures)
+            results[step] = {
+                'count': len(step_measures),
+                'p50_ms': self._percentile(durations, 0.5) * 1000,
+                'p95_ms': self._percentile(durations, 0.95) * 1000,
+                'p99_ms': self._percentile(durations, 0.99) * 1000,
+                'queries': self._percentile(queries, 0.5),
+                'max_queries': max(queries),
+                'bus_bytes': sum(payloads) / len(payloads),
+            }
+            _logger.info(
+                "%-7s x%-4d latency p50 %.1fms p95 %.1fms p99 %.1fms, %d queries (%d at most), %.0f bus bytes",
+                step, *(results[step][key] for key in ('count', 'p50_ms', 'p95_ms', 'p99_ms', 'queries', 'max_queries', 'bus_bytes')),
+            )
+        if output := os.getenv('POS_PREP_BENCHMARK_OUTPUT'):
+            with open(output, 'w') as file:
+                json.dump(results, file, indent=2)
+
+        # the number of queries of a step does not grow along the day
+        for step, step_measures in measures.items():
+            quarter = len(step_measures) // 4
+            if quarter:
+                first = self._percentile([queries for __, queries, __ in step_measures[:quarter]], 0.5)
+                last = self._percentile([queries for __, queries, __ in step_measures[-quarter:]], 0.5)
+                self.assertLessEqual(last, first + 2, f"The queries of the {step} step grow with the orders of the day")
+
+        if baseline_file := os.getenv('POS_PREP_BENCHMARK_BASELINE'):
+            with open(baseline_file) as file:
+                baseline = json.load(file)
+            for step, expected in baseline.items():
+                if step not in results:
+                    continue
+                self.assertLessEqual(results[step]['queries'], expected['queries'], f"Queries of the {step} step regressed")
+                self.assertLessEqual(
+                    results[step]['p95_ms'], expected['p95_ms'] * (1 + self.LATENCY_TOLERANCE),
+                    f"Latency of the {step} step regressed",
+                )
@@ -51,8 +51,7 @@ class PosPrepOrder(models.Model):
             course = self.env['restaurant.order.course'].browse(fired_course_id)
             category_ids += course.line_ids.product_id.pos_categ_ids.ids
             preparation_display = self.env['pos.prep.display']._get_preparation_displays(order, category_ids)
-            for display in preparation_display:
-                display._send_load_orders_message(sound=True, orderId=order.id)
+            preparation_display._send_load_orders_message(sound=True, orderId=order.id)
 
         if fired_course_id and any(c.id == fired_course_id for c in order.course_ids):
             course = self.env['restaurant.order.course'].browse(fired_course_id)
@@ -124,6 +123,6 @@ class PosPrepOrder(models.Model):
         for pos_order_id in pos_order_ids:
             pos_order = self.env['pos.order'].browse(pos_order_id)
             category_ids = set(pos_order.lines.mapped('product_id.pos_categ_ids.id'))
-            for p_dis in self.env['pos.prep.display']._get_preparation_displays(pos_order, category_ids):
-                p_dis._send_load_orders_message(True, False, pos_order_id)
+            p_dis = self.env['pos.prep.display']._get_preparation_displays(pos_order, category_ids)
+            p_dis._send_load_orders_message(True, False, pos_order_id)
         return True